@@ -0,0 +1,82 @@
+# TEST FIXTURES
+""" Fixtures shared by the tests. The app is run from a copy in a temporary directory, next to a
+copy of the committed database, so tests never change the original.
+"""
+
+##############################################################################################################
+# IMPORT LIBRARIES
+
+import glob
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+from contextlib import closing
+
+import pytest
+
+
+##############################################################################################################
+# FIXTURES
+
+app_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def app(tmp_path):
+    """ Directory holding a copy of the app's modules and database. """
+
+    for path in glob.glob(os.path.join(app_dir, "tracker_*.py")) + [os.path.join(app_dir, "tracker_db")]:
+        shutil.copy(path, tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def run_app(app):
+    """ Runs the copied app's command line, answering its prompts from 'stdin', and returns what it
+    printed. 'env' adds environment variables, e.g. TRACKER_CONCURRENT, and 'status' is the exit
+    status expected.
+    """
+
+    def run(*args, stdin="", env=None, status=0):
+        result = subprocess.run([sys.executable, str(app / "tracker_app.py"), *args], cwd=app, input=stdin,
+                                env=dict(os.environ, **(env or {})), capture_output=True, text=True, timeout=120)
+        assert result.returncode == status, result.stdout + result.stderr
+        return result.stdout
+
+    return run
+
+
+@pytest.fixture
+def tracker_app(app, monkeypatch):
+    """ The copied app's module, imported fresh. Its default database is the copy next to it. """
+
+    monkeypatch.syspath_prepend(str(app))
+    monkeypatch.delitem(sys.modules, "tracker_app", raising=False)
+    import tracker_app
+    yield tracker_app
+    sys.modules.pop("tracker_app", None)
+
+
+@pytest.fixture
+def tracker(app, tracker_app):
+    """ Tracker on the copied database, closed after the test. """
+
+    with tracker_app.Tracker(str(app / "tracker_db")) as tracker:
+        yield tracker
+
+
+@pytest.fixture
+def query(app):
+    """ Reads rows from the copied database, on a new connection each time. """
+
+    def read(sql, params=()):
+        with closing(sqlite3.connect(app / "tracker_db")) as db:
+            return db.execute(sql, params).fetchall()
+
+    return read
+
+
+##############################################################################################################
+# END OF CODE
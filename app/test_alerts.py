@@ -0,0 +1,144 @@
+# TESTS: BUDGET ALERTS
+""" Budget alerts: threshold rules evaluated by triggers as actuals and budgets change, the alerts
+outbox read and acknowledged by id, on_alert() callbacks and the alerts menu.
+
+Usage:
+    python -m pytest app/test_alerts.py
+"""
+
+##############################################################################################################
+# IMPORT LIBRARIES
+
+import sqlite3
+
+import pytest
+
+
+##############################################################################################################
+# FIXTURES
+
+def raised(tracker, after=0):
+    """ (category, percent) of each alert in the outbox, in the order raised. """
+
+    return [(alert["category"], alert["percent"]) for alert in tracker.get_alerts(after)]
+
+
+##############################################################################################################
+# TESTS
+
+def test_default_rules(tracker):
+    assert tracker.get_alert_rules() == [(1, "expenses", "every", None, 80), (2, "expenses", "every", None, 100),
+                                         (3, "expenses", "total", None, 80), (4, "expenses", "total", None, 100)]
+    # Categories already over a threshold when the rules were added raise nothing until they cross one
+    assert tracker.get_alerts() == []
+
+
+def test_crossing_a_threshold_alerts_once(tracker, tracker_app):
+    tracker.update_actual("expenses", "Food", 4100)
+
+    # The total's alert comes from the trigger on alert_totals, which runs first
+    assert raised(tracker) == [(None, 100), ("Food", 80)]
+    alert = tracker.get_alerts()[1]
+    assert alert["table"] == "expenses" and alert["actual"] == tracker_app.Money.parse(4100)
+    assert alert["budget"] == tracker_app.Money.parse(5000)
+
+    # Rising further inside the same band raises nothing
+    tracker.add_transaction("expenses", "Food", 100, "2024-03-01")
+    assert len(tracker.get_alerts()) == 2
+
+    # Two thresholds crossed by one change raise both
+    tracker.update_actual("expenses", "Personal care", 2200)
+    assert raised(tracker, 2) == [("Personal care", 80), ("Personal care", 100)]
+
+
+def test_lowering_a_budget_can_cross_a_threshold(tracker):
+    tracker.update_goal("expenses", "Personal care", 1250)
+    assert raised(tracker) == [(None, 100), ("Personal care", 80)]
+
+    # Raising the budget again only lowers the percent
+    tracker.update_goal("expenses", "Personal care", 5000)
+    assert len(tracker.get_alerts()) == 2
+
+
+def test_category_and_income_rules(tracker):
+    assert tracker.add_alert_rule("incomes", 50, category="Salary")
+    tracker.add_alert_rule("expenses", 120, category="Food")
+    with pytest.raises(sqlite3.IntegrityError):
+        tracker.add_alert_rule("incomes", 50, category="Salary")
+    with pytest.raises(LookupError):
+        tracker.add_alert_rule("expenses", 50, category="Holidays")
+    for percent in (0, -5, 12.5, True):
+        with pytest.raises(ValueError):
+            tracker.add_alert_rule("expenses", percent)
+
+    tracker.update_goal("incomes", "Salary", 50000)
+    tracker.update_actual("incomes", "Salary", 30000)
+    tracker.update_actual("expenses", "Food", 6100)
+
+    assert raised(tracker) == [("Salary", 50), (None, 100), ("Food", 80), ("Food", 100), ("Food", 120)]
+
+
+def test_removed_rules_and_categories(tracker):
+    rule_id = tracker.add_alert_rule("expenses", 90, category="Food")
+    assert tracker.remove_alert_rule(1) and tracker.remove_alert_rule(2)
+    assert not tracker.remove_alert_rule(999)
+
+    # A removed category takes its own rules with it
+    tracker.remove_category("expenses", "Food")
+    assert rule_id not in [rule[0] for rule in tracker.get_alert_rules()]
+
+
+def test_outbox_is_read_and_acknowledged_by_id(tracker):
+    tracker.update_actual("expenses", "Food", 4100)
+    tracker.update_actual("expenses", "Personal care", 2200)
+    alerts = tracker.get_alerts()
+    assert [alert["id"] for alert in alerts] == [1, 2, 3, 4]
+    assert [alert["id"] for alert in tracker.get_alerts(after=2, limit=1)] == [3]
+
+    assert tracker.acknowledge_alerts(2) == 2
+    assert [alert["id"] for alert in tracker.get_alerts()] == [3, 4]
+
+    # Ids are not handed out again once acknowledged
+    tracker.acknowledge_alerts(4)
+    tracker.update_goal("expenses", "Dog food", 100)
+    assert tracker.update_actual("expenses", "Dog food", 10) is not None
+    tracker.update_actual("expenses", "Dog food", 90)
+    assert [alert["id"] for alert in tracker.get_alerts()] == [5]
+
+
+def test_callbacks_run_after_the_commit(tracker):
+    delivered = []
+    tracker.update_actual("expenses", "Food", 4100)
+    tracker.on_alert(delivered.append)
+
+    tracker.update_actual("expenses", "Personal care", 2200)
+
+    assert [(alert["category"], alert["percent"]) for alert in delivered] == [("Personal care", 80), ("Personal care", 100)]
+
+
+def test_imports_and_undo_are_evaluated_too(tracker, app):
+    statement = app / "statement.csv"
+    statement.write_text("Date,Description,Amount,Category\n2024-03-01,Spar,-1100,Food\n", encoding="utf-8")
+
+    tracker.import_statement(str(statement))
+    assert raised(tracker) == [(None, 100), ("Food", 80)]
+
+    # Undoing the import lowers the actual again, so the same crossing alerts once more on redo
+    tracker.undo()
+    tracker.redo()
+    assert raised(tracker, 2) == [(None, 100), ("Food", 80)]
+
+
+def test_menu(run_app, query):
+    output = run_app(stdin="e\nu\nFood\n4100\nq\na\na\ni\n50\nSalary\na\n\nq\n")
+
+    assert "Alert: Food has reached 80% of the budget (R4100.00 of R5000.00)." in output
+    assert "Alert: Total expenses have reached 100% of the budget" in output
+    assert "Added an alert at 50% of the budget." in output
+    assert "There are no new alerts." in output
+    assert query("SELECT count(*) FROM alerts") == [(0,)]
+    assert query("SELECT table_name, scope, percent FROM alert_rules WHERE table_name = 'incomes'") == [("incomes", "category", 50)]
+
+
+##############################################################################################################
+# END OF CODE
@@ -0,0 +1,90 @@
+# TESTS: TRACKER BENCHMARKS
+""" The benchmark suite at a small size: the synthetic data generator, the timings of each
+operation and the JSON results file with its comparison against an earlier run.
+
+Usage:
+    python -m pytest app/test_bench.py
+"""
+
+##############################################################################################################
+# IMPORT LIBRARIES
+
+import json
+import sqlite3
+from contextlib import closing
+
+import tracker_bench
+from tracker_app import Tracker
+
+
+##############################################################################################################
+# FIXTURES
+
+operations = ["view_tables", "view_tables_cached", "budget_summary", "add_category", "update_actual"]
+
+
+##############################################################################################################
+# TESTS
+
+def test_generated_database(app):
+    generated_db = app / "generated_db"
+    tracker_bench.generate_database(str(generated_db), 200, str(app / "tracker_db"))
+
+    with closing(sqlite3.connect(generated_db)) as db:
+        assert db.execute("SELECT count(*) FROM expenses WHERE category LIKE 'Bench %'").fetchone()[0] == 180
+        assert db.execute("SELECT count(*) FROM incomes WHERE category LIKE 'Bench %'").fetchone()[0] == 20
+        assert db.execute("SELECT count(*) FROM expenses_ledger WHERE description LIKE 'Synthetic %'").fetchone()[0] == 180
+        # The ledger triggers filled in the synthetic actuals
+        assert db.execute('''SELECT count(*) FROM expenses t WHERE round(t.actual, 2) !=
+                             round((SELECT Total(amount) FROM expenses_ledger WHERE category_id = t.id), 2)''').fetchone()[0] == 0
+        # The alert rules were set aside while writing and put back, with no alerts raised
+        assert db.execute("SELECT count(*) FROM alert_rules").fetchone()[0] == 4
+        assert db.execute("SELECT count(*) FROM alerts").fetchone()[0] == 0
+
+    # The generator is seeded, so every run benchmarks the same data
+    second_db = app / "second_db"
+    tracker_bench.generate_database(str(second_db), 200, str(app / "tracker_db"))
+    read = "SELECT category_id, amount FROM expenses_ledger ORDER BY id"
+    with closing(sqlite3.connect(generated_db)) as first, closing(sqlite3.connect(second_db)) as second:
+        assert first.execute(read).fetchall() == second.execute(read).fetchall()
+
+
+def test_view_benchmark_renders_every_page(app, capsys, monkeypatch):
+    generated_db = app / "generated_db"
+    tracker_bench.generate_database(str(generated_db), 200, str(app / "tracker_db"))
+    monkeypatch.setattr(tracker_bench, "page_size", 50)
+
+    with Tracker(str(generated_db)) as tracker:
+        tracker_bench.view_every_page("expenses", tracker)
+
+    # 185 expenses in four pages of 50, each with its own header and total
+    output = capsys.readouterr().out
+    assert output.count("Bench ") == 180 and output.count("TOTAL") == 4
+
+
+def test_results_file_and_comparison(app, capsys):
+    output = app / "results.json"
+    arguments = ["--sizes", "50,100", "--repeat", "3", "--money-rows", "2000", "--db", str(app / "tracker_db"),
+                 "--data-dir", str(app / "data")]
+
+    assert tracker_bench.main(arguments + ["--output", str(output)]) == 0
+    report = json.loads(output.read_text())
+
+    assert set(report["generate_seconds"]) == {"50", "100"}
+    assert [(result["size"], result["operation"]) for result in report["results"]] == [
+        (size, operation) for size in (50, 100) for operation in operations]
+    assert all(0 < result["runs"] <= 3 and result["min_ms"] <= result["median_ms"] <= result["p95_ms"]
+               for result in report["results"])
+
+    # Integer cents total exactly
+    assert [result["operation"] for result in report["money"]] == ["sum_real", "sum_integer_cents"]
+    assert report["money"][1]["exact"] and report["money"][1]["error"] == "0.00"
+
+    # The second run reuses the generated databases and compares against the first
+    assert tracker_bench.main(arguments + ["--output", str(app / "again.json"), "--compare", str(output)]) == 0
+    assert json.loads((app / "again.json").read_text())["generate_seconds"] == {}
+    assert "BEFORE (MS)" in capsys.readouterr().out
+
+
+##############################################################################################################
+# END OF CODE
@@ -0,0 +1,69 @@
+# TESTS: CONCURRENT ACCESS
+""" Several processes on one database: WAL journaling, writes that wait for another process's
+lock, and the multi-process stress test.
+
+Usage:
+    python -m pytest app/test_concurrency.py
+"""
+
+##############################################################################################################
+# IMPORT LIBRARIES
+
+import hashlib
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+from contextlib import closing
+
+
+##############################################################################################################
+# FIXTURES
+
+def file_digest(path):
+    with open(path, "rb") as db_file:
+        return hashlib.sha256(db_file.read()).hexdigest()
+
+
+##############################################################################################################
+# TESTS
+
+def test_concurrent_mode_switches_to_wal(run_app, query):
+    run_app(stdin="q\n", env={"TRACKER_CONCURRENT": "1"})
+
+    assert query("PRAGMA journal_mode") == [("wal",)]
+
+
+def test_write_waits_for_another_process(app, run_app):
+    statement = app / "statement.csv"
+    statement.write_text("Date,Description,Amount,Category\n2024-03-01,Spar,-100,Food\n", encoding="utf-8")
+    run_app(stdin="q\n", env={"TRACKER_CONCURRENT": "1"})
+
+    with closing(sqlite3.connect(app / "tracker_db", isolation_level=None)) as db:
+        db.execute("BEGIN IMMEDIATE")
+        process = subprocess.Popen([sys.executable, str(app / "tracker_app.py"), "import", str(statement)], cwd=app,
+                                   env=dict(os.environ, TRACKER_CONCURRENT="1"), stdin=subprocess.DEVNULL,
+                                   stdout=subprocess.PIPE, text=True)
+        time.sleep(1)
+        assert process.poll() is None
+        db.execute("COMMIT")
+
+        output = process.communicate(timeout=60)[0]
+        assert "Imported 1 rows" in output
+        assert db.execute("SELECT actual FROM expenses WHERE category = 'Food'").fetchone() == (310400,)
+
+
+def test_stress_test_finds_no_lost_writes(app, run_app):
+    digest = file_digest(app / "tracker_db")
+
+    output = run_app("stress", "3", "30")
+
+    assert "3 workers made 90 writes" in output and "0 failed" in output
+    assert "Categories added: 45, found in database: 45." in output
+    # The stress test uses its own temporary database
+    assert file_digest(app / "tracker_db") == digest
+
+
+##############################################################################################################
+# END OF CODE
@@ -0,0 +1,101 @@
+# TESTS: STREAMING EXPORT
+""" Streaming export to CSV, JSON Lines and the columnar format, and reading columnar exports back.
+
+Usage:
+    python -m pytest app/test_export.py
+"""
+
+##############################################################################################################
+# IMPORT LIBRARIES
+
+import csv
+import io
+import json
+
+import pytest
+
+import tracker_export
+from tracker_app import Money
+
+
+##############################################################################################################
+# FIXTURES
+
+columns = [("id", "int"), ("name", "text"), ("amount", "real"), ("cents", "money")]
+rows = [(1, "Food", 12.5, 1250), (2, None, None, None), (None, "Café ☕", -0.01, -1), (4, "", 1e12, 10 ** 14)]
+
+
+##############################################################################################################
+# TESTS
+
+@pytest.mark.parametrize("block_size", [1, 3, 100])
+def test_columnar_round_trip(block_size):
+    output = io.BytesIO()
+    assert tracker_export.write_columnar(columns, iter(rows), output, block_size) == len(rows)
+
+    output.seek(0)
+    read_columns, read_rows = tracker_export.read_columnar(output)
+
+    assert read_columns == columns
+    # Money columns hold cents and are read back as Money
+    assert list(read_rows) == [row[:3] + (None if row[3] is None else Money(row[3]),) for row in rows]
+
+
+def test_columnar_rejects_other_files():
+    with pytest.raises(ValueError):
+        tracker_export.read_columnar(io.BytesIO(b"id,name\n1,Food\n"))
+
+
+def test_exports_match_the_database(app, tracker, query):
+    tracker.add_transaction("expenses", "Food", 120.5, "2024-03-01", "Spar, Main Road")
+    # Amounts are stored as cents and exported as Money
+    expected = [row[:4] + (Money(row[4]),) + row[5:]
+                for row in query("SELECT l.id, l.category_id, t.category, l.date, l.amount, l.description "
+                                 "FROM expenses_ledger l JOIN expenses t ON t.id = l.category_id ORDER BY l.id")]
+
+    for export_format in tracker_export.export_formats:
+        output_file = str(app / f"ledger.{export_format}")
+        assert tracker_export.export(tracker, "expenses_ledger", export_format, output_file) == len(expected)
+
+    with open(app / "ledger.columnar", "rb") as source:
+        assert list(tracker_export.read_columnar(source)[1]) == expected
+
+    with open(app / "ledger.csv", newline="", encoding="utf-8") as source:
+        csv_rows = list(csv.reader(source))
+    assert csv_rows[0] == ["id", "category_id", "category", "date", "amount", "description"]
+    assert csv_rows[1:] == [[str(value) for value in row] for row in expected]
+
+    with open(app / "ledger.jsonl", encoding="utf-8") as source:
+        assert [tuple(json.loads(line).values()) for line in source] == expected
+
+
+def test_period_filters(tracker):
+    tracker.add_transaction("expenses", "Food", 120, "2024-03-01")
+    tracker.add_transaction("expenses", "Food", 80, "2024-03-31")
+    tracker.add_transaction("expenses", "Food", 40, "2024-04-01")
+
+    columns, ledger = tracker_export.export_rows(tracker, "expenses_ledger", "2024-03")
+    assert [row[4] for row in ledger] == [12000, 8000]
+
+    columns, summary = tracker_export.export_rows(tracker, "monthly_summary", "2024-03:2024-04")
+    assert [(row[0], row[3]) for row in summary] == [("2024-03", 20000), ("2024-04", 4000)]
+
+    columns, summary = tracker_export.export_rows(tracker, "summary", "2024-04")
+    assert dict(zip([name for name, kind in columns], next(summary)))["total_expenses"] == 4000
+
+
+def test_command_line(app, capsys):
+    db = str(app / "tracker_db")
+
+    assert tracker_export.main(["expenses", "jsonl", "--db", db]) == 0
+    captured = capsys.readouterr()
+    assert json.loads(captured.out.splitlines()[0]) == {"id": 1, "category": "Food", "parent_id": None, "actual": 3004, "budget": 5000}
+    assert "Exported 5 rows from expenses." in captured.err
+
+    assert tracker_export.main(["nothing", "csv", "--db", db]) == 1
+    assert "Unknown export source nothing" in capsys.readouterr().err
+    assert tracker_export.main(["expenses_ledger", "csv", "--period", "2024-13", "--db", db]) == 1
+
+
+##############################################################################################################
+# END OF CODE
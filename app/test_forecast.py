@@ -0,0 +1,120 @@
+# TESTS: SAVINGS FORECAST
+""" What-if forecast: projecting batches of scenarios, ranking them by savings, the chunked
+forecast() run and its validation, and the command line and menu option.
+
+Usage:
+    python -m pytest app/test_forecast.py
+"""
+
+##############################################################################################################
+# IMPORT LIBRARIES
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import tracker_forecast
+
+
+##############################################################################################################
+# FIXTURES
+
+@pytest.fixture
+def engine():
+    """ Engine with one salary of 1000 (target 1200) and two expenses spending 300 and 200
+    against budgets of 250 and 200. """
+
+    return tracker_forecast.ForecastEngine(["Salary"], [1000], [1200], ["Food", "Rent"], [300, 200], [250, 200])
+
+
+##############################################################################################################
+# TESTS
+
+def test_evaluate_projects_every_scenario(engine):
+    scenarios = engine.random_scenarios(50, seed=1)
+    projection = engine.evaluate(scenarios, months=6)
+
+    assert {key: value.shape for key, value in projection.items()} == dict.fromkeys(
+        ["income", "expenses", "savings", "savings_variance", "cumulative_savings"], (50, 6))
+    # Scenario 0 is the baseline: the run rates unchanged every month
+    assert np.allclose(projection["savings"][0], 500)
+    assert np.allclose(projection["savings_variance"][0], 500 - 750)
+    assert np.allclose(projection["cumulative_savings"][0], np.arange(1, 7) * 500)
+
+
+def test_scenario_by_name(engine):
+    scenarios = engine.scenario({"Food": 0.5}, income_growth=0.1)
+    projection = engine.evaluate(scenarios, months=2)
+
+    assert np.allclose(projection["income"][0], [1100, 1210])
+    assert np.allclose(projection["expenses"][0], [350, 350])
+    assert engine.describe(scenarios, 0) == "Food -50%, income +10.00%/month"
+    with pytest.raises(KeyError):
+        engine.scenario({"Holidays": 0.5})
+
+
+def test_rank_orders_by_final_savings(engine):
+    scenarios = engine.baseline_scenarios(3)
+    scenarios["spend_factors"][1] = 0.5
+    scenarios["spend_factors"][2] = 2
+    projection = engine.evaluate(scenarios, months=4)
+
+    results = engine.rank(scenarios, projection, top=2, goal=2000)
+
+    assert [result["scenario"] for result in results] == [1, 0]
+    assert [result["rank"] for result in results] == [1, 2]
+    assert results[0]["final_savings"] == 3000 and results[0]["goal_month"] == 3
+    assert results[1]["label"] == "baseline" and results[1]["goal_month"] == 4
+    # A goal that is never reached
+    assert engine.rank(scenarios, projection, top=1, goal=10 ** 6)[0]["goal_month"] == -1
+
+
+def test_forecast_in_chunks(tracker, monkeypatch):
+    monkeypatch.setattr(tracker_forecast, "max_chunk_cells", 50)
+
+    results, elapsed, scenario_count = tracker_forecast.forecast(tracker, 105, months=3, top=5, seed=7)
+    again = tracker_forecast.forecast(tracker, 105, months=3, top=5, seed=7)[0]
+
+    assert scenario_count == 105 and elapsed >= 0
+    assert results == again
+    assert [result["rank"] for result in results] == [1, 2, 3, 4, 5]
+    assert [result["final_savings"] for result in results] == sorted(
+        (result["final_savings"] for result in results), reverse=True)
+    assert len({result["scenario"] for result in results}) == 5
+    assert all(0 <= result["scenario"] < 105 for result in results)
+
+
+@pytest.mark.parametrize("arguments", [{"months": 0}, {"months": -1}, {"scenario_count": 0}, {"top": 0}])
+def test_forecast_rejects_empty_forecasts(tracker, arguments):
+    with pytest.raises(ValueError):
+        tracker_forecast.forecast(tracker, **arguments)
+
+
+@pytest.mark.parametrize("option", ["--months", "--scenarios", "--top"])
+@pytest.mark.parametrize("value", ["0", "-3", "two"])
+def test_command_line_rejects_counts_below_one(option, value, capsys):
+    with pytest.raises(SystemExit):
+        tracker_forecast.main([option, value])
+
+    assert f"argument {option}: {value}" in capsys.readouterr().err
+
+
+def test_command_line(app, capsys):
+    assert tracker_forecast.main(["--scenarios", "200", "--months", "6", "--top", "3", "--seed", "1",
+                                  "--db", str(app / "tracker_db")]) == 0
+
+    output = capsys.readouterr().out
+    assert "SAVINGS AFTER 6 MONTHS" in output
+    assert "Evaluated 200 scenarios over 6 months" in output
+
+
+def test_menu_option(run_app):
+    output = run_app(stdin="f\n6\n1000\nq\n")
+
+    assert "SAVINGS AFTER 6 MONTHS" in output and "Ranked " in output
+
+    assert "Unable to forecast savings. A forecast needs at least one month." in run_app(stdin="f\n0\n\nq\n")
+
+
+##############################################################################################################
+# END OF CODE
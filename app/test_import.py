@@ -0,0 +1,96 @@
+# TESTS: STATEMENT IMPORT
+""" Bulk import of CSV and OFX bank statements: mapping rows to categories, keyword rules, and
+chunked commits where a bad row rolls back only its own chunk.
+
+Usage:
+    python -m pytest app/test_import.py
+"""
+
+##############################################################################################################
+# IMPORT LIBRARIES
+
+import pytest
+
+
+##############################################################################################################
+# FIXTURES
+
+@pytest.fixture
+def actuals(query):
+    """ Reads the actual of every category in a table, in rands. """
+
+    return lambda table_name: dict(query(f"SELECT category, actual / 100.0 FROM {table_name}"))
+
+
+def write_file(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+##############################################################################################################
+# TESTS
+
+def test_csv_rows_are_added_to_their_categories(app, run_app, actuals):
+    statement = write_file(app / "statement.csv", "Date,Description,Amount,Category\n"
+                                                  "2024-03-01,Spar,-120.50,Food\n"
+                                                  "2024-03-02,Checkers,(79.50),Food\n"
+                                                  "2024-03-25,Employer,R20 000.00,Salary\n"
+                                                  "2024-03-26,Shell garage,-650,\n"
+                                                  "2024-03-27,Nothing,0,Food\n")
+    rules = write_file(app / "rules.csv", "keyword,category\nshell,Fuel\n")
+
+    output = run_app("import", statement, rules)
+    assert "Imported 4 rows" in output and "rows/sec" in output
+
+    expenses = actuals("expenses")
+    assert expenses["Food"] == pytest.approx(3004 + 200)
+    assert expenses["Fuel"] == pytest.approx(650)
+    assert actuals("incomes")["Salary"] == pytest.approx(40000)
+
+
+def test_debit_and_credit_columns_and_unmatched_rows(app, run_app, actuals):
+    statement = write_file(app / "statement.csv", "Posting Date,Narrative,Debit,Credit\n"
+                                                  "2024-03-01,Bookshop,250.00,\n"
+                                                  "2024-03-05,Refund,,99.99\n")
+
+    run_app("import", statement)
+
+    assert actuals("expenses")["Uncategorised"] == pytest.approx(250)
+    assert actuals("incomes")["Uncategorised"] == pytest.approx(99.99)
+
+
+def test_ofx_transactions(app, run_app, actuals):
+    statement = write_file(app / "statement.ofx", "<OFX><BANKTRANLIST>\n"
+                                                  "<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240301120000<TRNAMT>-45.00<NAME>Woolworths food</STMTTRN>\n"
+                                                  "<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240325<TRNAMT>1500.00<NAME>Bonus</STMTTRN>\n"
+                                                  "</BANKTRANLIST></OFX>\n")
+    rules = write_file(app / "rules.csv", "food,Food\nbonus,Bonus\n")
+
+    run_app("import", statement, rules)
+
+    assert actuals("expenses")["Food"] == pytest.approx(3004 + 45)
+    assert actuals("incomes")["Bonus"] == pytest.approx(50000 + 1500)
+
+
+def test_bad_row_rolls_back_only_its_chunk(app, run_app, actuals):
+    # The first 10 000 rows fill one chunk, which is committed before the bad row is read
+    rows = "".join(f"2024-03-01,Shop {number},-1.00,Groceries\n" for number in range(10000))
+    statement = write_file(app / "statement.csv", "Date,Description,Amount,Category\n" + rows +
+                           "2024-03-02,Shop,-2.00,Groceries\n2024-03-03,Broken,not a number,Groceries\n")
+
+    output = run_app("import", statement, status=1)
+    assert "10000 rows were imported before the error" in output
+
+    assert actuals("expenses")["Groceries"] == pytest.approx(10000)
+
+
+def test_missing_columns_import_nothing(app, run_app, actuals):
+    statement = write_file(app / "statement.csv", "Date,Reference\n2024-03-01,123\n")
+
+    output = run_app("import", statement, status=1)
+    assert "0 rows were imported" in output
+    assert "Uncategorised" not in actuals("expenses")
+
+
+##############################################################################################################
+# END OF CODE
@@ -0,0 +1,289 @@
+# TESTS: CHANGE JOURNAL
+""" Undo, redo, restore and compaction of the change journal. Every test checks that the derived
+data (actuals, monthly periods and subtree rollups) still agrees with the ledgers afterwards.
+
+Usage:
+    python -m pytest app/test_journal.py
+"""
+
+##############################################################################################################
+# IMPORT LIBRARIES
+
+import os
+import time
+from datetime import datetime
+
+import pytest
+
+import tracker_app
+from tracker_app import Tracker, timestamp_format
+
+
+##############################################################################################################
+# FIXTURES
+
+# Source rows per table, the data undo, redo and restore have to bring back exactly.
+source_queries = {"expenses": "SELECT id, category, budget, parent_id FROM expenses ORDER BY id",
+                  "incomes": "SELECT id, category, budget, parent_id FROM incomes ORDER BY id",
+                  "expenses_ledger": "SELECT * FROM expenses_ledger ORDER BY id",
+                  "incomes_ledger": "SELECT * FROM incomes_ledger ORDER BY id",
+                  "expenses_periods": "SELECT period, category_id, budget FROM expenses_periods ORDER BY 1, 2",
+                  "incomes_periods": "SELECT period, category_id, budget FROM incomes_periods ORDER BY 1, 2"}
+
+
+@pytest.fixture
+def tracker(tmp_path):
+    with Tracker(str(tmp_path / "tracker_db")) as tracker:
+        tracker.add_category("expenses", "Car")
+        tracker.add_category("expenses", "Fuel", parent="Car")
+        tracker.add_category("expenses", "Food")
+        tracker.add_category("incomes", "Salary")
+        tracker.add_transaction("expenses", "Fuel", 850, "2024-03-05", "Shell")
+        tracker.add_transaction("incomes", "Salary", 30000, "2024-03-25", "March")
+        yield tracker
+
+
+def state(tracker):
+    """ Reads every source row, to compare the data before and after journal operations. """
+
+    return {table_name: tracker.cursor.execute(query).fetchall() for table_name, query in source_queries.items()}
+
+
+def now():
+    """ Returns the current journal timestamp, with the clock moved past it. """
+
+    at = datetime.now().strftime(timestamp_format)
+    time.sleep(0.002)
+    return at
+
+
+def assert_consistent(tracker):
+    """ Checks actuals, period actuals and rollups against the ledgers and the closure table. """
+
+    cursor = tracker.cursor
+    for table_name in ("expenses", "incomes"):
+        cursor.execute(f'''SELECT count(*) FROM {table_name} c
+                           WHERE c.actual != (SELECT coalesce(sum(amount), 0) FROM {table_name}_ledger WHERE category_id = c.id)''')
+        assert cursor.fetchone()[0] == 0, f"{table_name} actuals differ from the ledger"
+
+        cursor.execute(f'''SELECT count(*) FROM {table_name}_periods p
+                           WHERE p.actual != (SELECT coalesce(sum(amount), 0) FROM {table_name}_ledger
+                                              WHERE category_id = p.category_id AND substr(date, 1, 7) = p.period)''')
+        assert cursor.fetchone()[0] == 0, f"{table_name} period actuals differ from the ledger"
+
+        cursor.execute(f'''SELECT count(*) FROM (SELECT substr(date, 1, 7) period, category_id FROM {table_name}_ledger
+                                                 EXCEPT SELECT period, category_id FROM {table_name}_periods)''')
+        assert cursor.fetchone()[0] == 0, f"{table_name} ledger months without a period row"
+
+        cursor.execute(f'''SELECT count(*) FROM {table_name}_rollups r
+                           WHERE (r.actual, r.budget) != (SELECT coalesce(sum(c.actual), 0), coalesce(sum(c.budget), 0)
+                                                          FROM {table_name}_tree t JOIN {table_name} c ON c.id = t.descendant_id
+                                                          WHERE t.ancestor_id = r.category_id)''')
+        assert cursor.fetchone()[0] == 0, f"{table_name} rollups differ from their subtrees"
+
+        cursor.execute(f"SELECT count(*) FROM {table_name} c LEFT JOIN {table_name}_rollups r ON r.category_id = c.id WHERE r.category_id IS NULL")
+        assert cursor.fetchone()[0] == 0, f"{table_name} categories without a rollup"
+
+
+def edit(tracker):
+    """ Makes one change of each kind. """
+
+    tracker.add_category("expenses", "Tyres", parent="Car")
+    tracker.add_transaction("expenses", "Tyres", 2400, "2024-04-02", "Four tyres")
+    tracker.add_transaction("incomes", "Salary", 31000, "2024-04-25", "April")
+    tracker.update_actual("expenses", "Food", 3100)
+    tracker.update_goal("expenses", "Fuel", 1200)
+    tracker.set_period_budget("expenses", "Food", "2024-04", 4500)
+    tracker.move_category("expenses", "Food", "Car")
+    tracker.remove_category("expenses", "Fuel")
+
+
+##############################################################################################################
+# TESTS
+
+def test_undo_and_redo_every_change(tracker):
+    before = state(tracker)
+    edit(tracker)
+    after = state(tracker)
+    assert_consistent(tracker)
+
+    for _ in range(8):
+        tracker.undo()
+        assert_consistent(tracker)
+    assert state(tracker) == before
+
+    for _ in range(8):
+        tracker.redo()
+        assert_consistent(tracker)
+    assert state(tracker) == after
+
+
+def test_undo_of_removed_category_brings_back_its_history(tracker):
+    before = state(tracker)
+    assert tracker.remove_category("expenses", "Car")
+    assert tracker.get_category("expenses", "Fuel")[0]
+
+    assert tracker.undo() == "remove_category"
+    assert state(tracker) == before
+    assert_consistent(tracker)
+
+
+def test_nothing_to_redo_after_a_new_change(tracker):
+    tracker.update_goal("expenses", "Food", 900)
+    tracker.undo()
+    tracker.update_goal("expenses", "Food", 800)
+
+    with pytest.raises(LookupError):
+        tracker.redo()
+
+
+def test_restore_and_undo_the_restore(tracker):
+    before = state(tracker)
+    at = now()
+    edit(tracker)
+    after = state(tracker)
+
+    assert tracker.restore(at) == 8
+    assert state(tracker) == before
+    assert_consistent(tracker)
+
+    assert tracker.undo() == "restore"
+    assert state(tracker) == after
+    assert_consistent(tracker)
+
+
+def test_restore_older_than_the_journal_loads_a_snapshot(tracker):
+    tracker.compact(days=0)
+    loaded = state(tracker)
+    at = now()
+
+    # Compacting again drops the journal of these changes, so only the first snapshot reaches 'at'
+    edit(tracker)
+    tracker.compact(days=0)
+    tracker.add_transaction("expenses", "Food", 50, "2024-05-01", "Bread")
+
+    path = tracker.restore(at)
+    assert isinstance(path, str) and os.path.exists(path)
+    assert state(tracker) == loaded
+    assert_consistent(tracker)
+
+    # The load is a barrier: nothing before it can be undone
+    with pytest.raises(LookupError):
+        tracker.undo()
+
+
+def test_restore_before_every_snapshot_fails(tracker):
+    tracker.compact(days=0)
+
+    with pytest.raises(LookupError):
+        tracker.restore("2000-01-01")
+
+
+def import_statement(tracker, tmp_path, rows=25):
+    """ Imports a statement of food and salary rows (and a new category) in chunks of 4 rows. """
+
+    statement = tmp_path / "statement.csv"
+    statement.write_text("Date,Description,Amount,Category\n" + "".join(
+        f"2024-0{3 + number % 3}-1{number % 10},Row {number},{-10 - number if number % 5 else 500 + number},"
+        f"{'Salary' if number % 5 == 0 else 'Books' if number % 7 == 0 else 'Food'}\n"
+        for number in range(rows)), encoding="utf-8")
+
+    return tracker.import_statement(str(statement), chunk_size=4)[0]
+
+
+def test_import_is_one_journal_transaction_of_id_ranges(tracker, tmp_path):
+    before = state(tracker)
+    assert import_statement(tracker, tmp_path) == 25
+    imported = state(tracker)
+    assert_consistent(tracker)
+
+    tracker.cursor.execute("SELECT count(*) FROM journal_txns WHERE operation = 'import_statement'")
+    assert tracker.cursor.fetchone()[0] == 1
+    tracker.cursor.execute("SELECT DISTINCT action FROM journal WHERE table_name LIKE '%_ledger' AND txn_id = (SELECT max(id) FROM journal_txns)")
+    assert tracker.cursor.fetchall() == [("insert_range",)]
+
+    assert tracker.undo() == "import_statement"
+    assert state(tracker) == before
+    assert_consistent(tracker)
+
+    assert tracker.redo() == "import_statement"
+    assert state(tracker) == imported
+    assert tracker.undo() == "import_statement"
+    assert state(tracker) == before
+    assert_consistent(tracker)
+
+
+def test_restore_across_an_import(tracker, tmp_path):
+    tracker.compact(days=30)
+    before = state(tracker)
+    at = now()
+    import_statement(tracker, tmp_path)
+    tracker.remove_category("expenses", "Books")
+    imported = state(tracker)
+
+    assert tracker.restore(at) == 2
+    assert state(tracker) == before
+    assert tracker.undo() == "restore"
+    assert state(tracker) == imported
+    assert_consistent(tracker)
+
+
+def test_snapshot_load_redoes_an_import(tracker, tmp_path):
+    # The snapshot is older than the import, so loading it redoes the import from the journal
+    tracker.compact(days=30)
+    import_statement(tracker, tmp_path)
+    at = now()
+    imported = state(tracker)
+    tracker.remove_category("expenses", "Books")
+
+    tracker.restore_snapshot(at)
+
+    # Rows still in the ledger are read from it, and the rows removed with 'Books' from the journal
+    assert state(tracker) == imported
+    assert tracker.get_category("expenses", "Books")[2] == 10 * 3 + 7 + 14 + 21
+    assert_consistent(tracker)
+
+
+def test_compaction_drops_old_entries_and_keeps_newest_snapshots(tracker, monkeypatch):
+    monkeypatch.setattr(tracker_app, "snapshots_kept", 2)
+
+    # Entries newer than the cutoff are kept
+    assert tracker.compact(days=30) == 0
+    tracker.cursor.execute("SELECT count(*) FROM journal_txns WHERE kind = 'change'")
+    assert tracker.cursor.fetchone()[0] == 6
+
+    paths = []
+    for number in range(3):
+        tracker.add_transaction("expenses", "Food", 10 + number, "2024-03-10", "Snack")
+        tracker.compact(days=0)
+        tracker.cursor.execute("SELECT path FROM journal_snapshots ORDER BY id DESC LIMIT 1")
+        paths.append(tracker.cursor.fetchone()[0])
+
+    tracker.cursor.execute("SELECT kind, count(*) FROM journal_txns GROUP BY kind")
+    assert dict(tracker.cursor.fetchall()) == {"compacted": 1}
+    tracker.cursor.execute("SELECT count(*) FROM journal")
+    assert tracker.cursor.fetchone()[0] == 0
+
+    tracker.cursor.execute("SELECT path FROM journal_snapshots ORDER BY id")
+    kept = [path for (path,) in tracker.cursor.fetchall()]
+    assert kept == paths[-2:]
+    assert sorted(os.listdir(os.path.dirname(kept[0]))) == sorted(os.path.basename(path) for path in kept)
+
+    with pytest.raises(LookupError):
+        tracker.undo()
+    assert_consistent(tracker)
+
+
+def test_compaction_is_due_after_snapshot_changes(tracker, monkeypatch):
+    monkeypatch.setattr(tracker_app, "snapshot_changes", 3)
+    tracker.compact(days=30)
+    assert tracker.compact_if_due() is None
+
+    for number in range(3):
+        tracker.update_goal("expenses", "Food", 100 + number)
+    assert tracker.compact_if_due() == 0
+    assert tracker.compact_if_due() is None
+
+
+##############################################################################################################
+# END OF CODE
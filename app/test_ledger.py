@@ -0,0 +1,90 @@
+# TESTS: TRANSACTION LEDGER
+""" The transaction ledgers: opening balances for existing actuals, and the triggers that keep
+each category's actual equal to the sum of its ledger.
+
+Usage:
+    python -m pytest app/test_ledger.py
+"""
+
+##############################################################################################################
+# IMPORT LIBRARIES
+
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+
+##############################################################################################################
+# FIXTURES
+
+@pytest.fixture
+def ledger_db(app, run_app):
+    """ The copied database after the app has created the ledgers, opened for writing. """
+
+    run_app(stdin="q\n")
+    with closing(sqlite3.connect(app / "tracker_db")) as db:
+        yield db
+
+
+def mismatches(db, table_name):
+    """ Counts categories whose actual differs from the sum of their ledger rows. """
+
+    return db.execute(f'''SELECT count(*) FROM {table_name} t
+                          WHERE round(t.actual, 2) != round((SELECT Total(amount) FROM {table_name}_ledger
+                                                            WHERE category_id = t.id), 2)''').fetchone()[0]
+
+
+##############################################################################################################
+# TESTS
+
+def test_existing_actuals_become_opening_balances(ledger_db):
+    for table_name in ("expenses", "incomes"):
+        assert mismatches(ledger_db, table_name) == 0
+
+    assert ledger_db.execute("SELECT amount FROM expenses_ledger WHERE category_id = 1").fetchall() == [(300400,)]
+
+
+def test_triggers_keep_actuals_in_step(ledger_db):
+    food_id = ledger_db.execute("SELECT id FROM expenses WHERE category = 'Food'").fetchone()[0]
+    ledger_db.execute("INSERT INTO expenses_ledger(category_id, date, amount, description) VALUES(?, '2024-03-01', 12050, 'Spar')",
+                      (food_id,))
+    ledger_db.execute("INSERT INTO expenses_ledger(category_id, date, amount, description) VALUES(?, '2024-03-02', 7950, 'Checkers')",
+                      (food_id,))
+    ledger_db.execute("UPDATE expenses_ledger SET amount = 10000 WHERE description = 'Checkers'")
+    ledger_db.execute("DELETE FROM expenses_ledger WHERE description = 'Spar'")
+    ledger_db.commit()
+
+    assert ledger_db.execute("SELECT actual FROM expenses WHERE id = ?", (food_id,)).fetchone()[0] == 310400
+    assert mismatches(ledger_db, "expenses") == 0
+
+
+def test_removing_a_category_removes_its_ledger(ledger_db):
+    ledger_db.execute("DELETE FROM expenses WHERE category = 'Beer'")
+    ledger_db.commit()
+
+    assert ledger_db.execute("SELECT count(*) FROM expenses_ledger WHERE category_id = 2").fetchone()[0] == 0
+
+
+def test_update_actual_records_an_adjustment(run_app, query):
+    run_app(stdin="e\nu\nFood\n3100\nq\nq\n")
+
+    assert query("SELECT actual FROM expenses WHERE category = 'Food'") == [(310000,)]
+    assert query("SELECT amount, description FROM expenses_ledger WHERE category_id = 1 ORDER BY id") == [
+        (300400, "Opening balance"), (9600, "Adjustment")]
+
+
+def test_import_writes_one_ledger_row_per_statement_row(app, run_app, query):
+    statement = app / "statement.csv"
+    statement.write_text("Date,Description,Amount,Category\n2024-03-01,Spar,-120.50,Food\n2024-03-02,Spar,-79.50,Food\n",
+                         encoding="utf-8")
+
+    run_app("import", str(statement))
+
+    assert query("SELECT date, amount, description FROM expenses_ledger WHERE category_id = 1 AND date LIKE '2024-%' ORDER BY id") == [
+        ("2024-03-01", 12050, "Spar"), ("2024-03-02", 7950, "Spar")]
+    assert query("SELECT actual FROM expenses WHERE category = 'Food'") == [(320400,)]
+
+
+##############################################################################################################
+# END OF CODE
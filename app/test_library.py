@@ -0,0 +1,98 @@
+# TESTS: TRACKER LIBRARY
+""" The app as an importable library: importing it has no side effects, and the Tracker class opens
+its connection lazily, reuses it, and reports errors as exceptions instead of prompts.
+
+Usage:
+    python -m pytest app/test_library.py
+"""
+
+##############################################################################################################
+# IMPORT LIBRARIES
+
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+
+##############################################################################################################
+# TESTS
+
+def test_import_has_no_side_effects(app):
+    db_path = app / "unused_db"
+    result = subprocess.run([sys.executable, "-c", "import sys, tracker_app; print('tabulate' in sys.modules)"],
+                            cwd=app, env=dict(os.environ, TRACKER_DB=str(db_path)), input="",
+                            capture_output=True, text=True, timeout=60)
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == "False\n"
+    assert not db_path.exists()
+
+
+def test_connection_is_opened_on_first_use_and_reused(app, tracker_app):
+    db_path = app / "new_db"
+    tracker = tracker_app.Tracker(str(db_path))
+    assert not db_path.exists()
+
+    assert tracker.db is tracker.db
+    assert db_path.exists()
+    assert tracker.cursor.execute("PRAGMA user_version").fetchone()[0] == tracker_app.migrations[-1][0]
+
+    tracker.close()
+    assert tracker._db is None
+    assert tracker.get_rows("expenses") == [(1, "None", 0, 0)]
+    tracker.close()
+
+
+def test_writes_and_summary(tracker, query):
+    tracker.add_category("expenses", "Garden")
+    tracker.add_transaction("expenses", "Garden", 150.256, "2024-03-01", "Nursery")
+    assert tracker.update_actual("expenses", "Food", 3100) == 96
+    assert tracker.update_goal("expenses", "Garden", 200.004) == 200
+
+    summary = tracker.get_summary()
+    assert summary["total_expenses"] == pytest.approx(19157 + 150.26 + 96)
+    assert summary["budget_expenses"] == pytest.approx(19309 + 200)
+    assert summary["actual_difference"] == pytest.approx(summary["total_income"] - summary["total_expenses"])
+
+    # Every write is committed and visible to other connections, amounts in cents
+    assert query("SELECT actual, budget FROM expenses WHERE category = 'Garden'") == [(15026, 20000)]
+
+
+def test_errors_are_raised_and_rolled_back(tracker):
+    with pytest.raises(LookupError):
+        tracker.add_transaction("expenses", "Nothing", 10)
+    with pytest.raises(LookupError):
+        tracker.update_goal("incomes", "Nothing", 10)
+    with pytest.raises(sqlite3.IntegrityError):
+        tracker.add_category("expenses", "Food")
+
+    assert not tracker.db.in_transaction
+    assert tracker.category_exists("expenses", "Food")
+    assert not tracker.category_exists("expenses", "Nothing")
+
+
+def test_remove_category_and_transaction(tracker):
+    food_id = tracker.get_category("expenses", "Food")[0]
+    ledger_id = tracker.add_transaction("expenses", "Food", 20, "2024-03-01")
+
+    assert tracker.remove_transaction("expenses", food_id, ledger_id)
+    assert tracker.get_category("expenses", "Food")[2] == pytest.approx(3004)
+    assert tracker.remove_category("expenses", "Beer")
+    assert not tracker.remove_category("expenses", "Beer")
+
+
+def test_main_runs_the_command_line(app, tracker_app, monkeypatch, capsys):
+    # The copied module's default database is the copy next to it
+    assert tracker_app.db_file == str(app / "tracker_db")
+    monkeypatch.setattr("builtins.input", lambda prompt="": "q")
+
+    assert tracker_app.main([]) == 0
+    assert tracker_app.main(["import", str(app / "missing.csv")]) == 1
+    assert "0 rows were imported" in capsys.readouterr().out
+
+
+##############################################################################################################
+# END OF CODE
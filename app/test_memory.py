@@ -0,0 +1,108 @@
+# TESTS: IN-MEMORY MODE
+""" In-memory working mode: edits stay in memory until a checkpoint copies them to the file, by
+timer, after a number of commits or on close, and a failed final checkpoint loses nothing.
+
+Usage:
+    python -m pytest app/test_memory.py
+"""
+
+##############################################################################################################
+# IMPORT LIBRARIES
+
+import sqlite3
+import time
+
+import pytest
+
+
+##############################################################################################################
+# FIXTURES
+
+@pytest.fixture
+def memory_tracker(app, tracker_app):
+    """ In-memory Tracker on the copied database that only checkpoints when asked to. """
+
+    tracker = tracker_app.Tracker(str(app / "tracker_db"), in_memory=True, checkpoint_seconds=3600, checkpoint_changes=1000)
+    tracker.connect()
+    yield tracker
+    tracker.close()
+
+
+def food_actual(query):
+    return query("SELECT actual FROM expenses WHERE category = 'Food'")[0][0]
+
+
+##############################################################################################################
+# TESTS
+
+def test_changes_reach_the_file_at_checkpoints(memory_tracker, query):
+    memory_tracker.update_actual("expenses", "Food", 3100)
+
+    assert memory_tracker.get_category("expenses", "Food")[2] == 3100
+    assert food_actual(query) == 300400
+
+    assert memory_tracker.checkpoint()
+    assert food_actual(query) == 310000
+    # Nothing left to save
+    assert not memory_tracker.checkpoint()
+
+
+def test_checkpoint_after_a_number_of_commits(memory_tracker, query):
+    memory_tracker.checkpoint_changes = 3
+    for amount in (3001, 3002):
+        memory_tracker.update_actual("expenses", "Food", amount)
+    assert food_actual(query) == 300400
+
+    memory_tracker.update_actual("expenses", "Food", 3003)
+    assert food_actual(query) == 300300
+    assert memory_tracker.unsaved_changes == 0
+
+
+def test_checkpoint_timer(memory_tracker, query):
+    memory_tracker.checkpoint_seconds = 0.05
+    memory_tracker.close()
+    memory_tracker.connect()
+
+    memory_tracker.update_actual("expenses", "Food", 3100)
+    deadline = time.monotonic() + 10
+    while food_actual(query) != 310000 and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert food_actual(query) == 310000
+
+
+def test_close_saves_changes(memory_tracker, query):
+    memory_tracker.add_category("expenses", "Garden")
+    memory_tracker.close()
+
+    assert query("SELECT count(*) FROM expenses WHERE category = 'Garden'") == [(1,)]
+    assert memory_tracker._checkpoint_thread is None
+
+
+def test_failed_final_checkpoint_keeps_the_timer_running(memory_tracker, tracker_app, query, monkeypatch):
+    memory_tracker.update_actual("expenses", "Food", 3100)
+
+    def fail(tracker):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(tracker_app.Tracker, "checkpoint", fail)
+    with pytest.raises(sqlite3.OperationalError):
+        memory_tracker.close()
+
+    assert memory_tracker._checkpoint_thread.is_alive()
+    assert memory_tracker.get_category("expenses", "Food")[2] == 3100
+
+    monkeypatch.undo()
+    memory_tracker.close()
+    assert food_actual(query) == 310000
+
+
+def test_menu_saves_on_exit(run_app, query):
+    output = run_app(stdin="e\nu\nFood\n3100\nq\nq\n", env={"TRACKER_IN_MEMORY": "1"})
+
+    assert "Saving changes to disk." in output
+    assert food_actual(query) == 310000
+
+
+##############################################################################################################
+# END OF CODE
@@ -0,0 +1,102 @@
+# TESTS: QUERY METRICS
+""" Query instrumentation: histogram quantiles, statements grouped by the operation that ran them,
+and the JSON and Prometheus reports.
+
+Usage:
+    python -m pytest app/test_metrics.py
+"""
+
+##############################################################################################################
+# IMPORT LIBRARIES
+
+import json
+import sqlite3
+
+import pytest
+
+import tracker_metrics
+
+
+##############################################################################################################
+# FIXTURES
+
+@pytest.fixture
+def metrics(monkeypatch):
+    """ The metrics registry, switched on and emptied for the test. """
+
+    tracker_metrics.registry.reset()
+    monkeypatch.setattr(tracker_metrics.registry, "enabled", True)
+    yield tracker_metrics.registry
+    tracker_metrics.registry.reset()
+
+
+##############################################################################################################
+# TESTS
+
+def test_histogram_quantiles():
+    histogram = tracker_metrics.Histogram()
+    for seconds in [0.0002] * 98 + [0.03, 60]:
+        histogram.observe(seconds, rows=2)
+
+    assert histogram.count == 100 and histogram.rows == 200
+    assert histogram.quantile(0.50) == 0.00025
+    assert histogram.quantile(0.99) == 0.05
+    # Observations above every bound are reported as the largest bound, so JSON stays valid
+    assert histogram.quantile(1.0) == tracker_metrics.latency_buckets[-1]
+    assert histogram.counts[-1] == 1
+    assert json.loads(json.dumps(histogram.to_dict(), allow_nan=False))["buckets"]["+Inf"] == 1
+    assert tracker_metrics.Histogram().quantile(0.99) == 0.0
+
+
+def test_statements_are_grouped_by_operation(metrics, tracker, tracker_app, capsys):
+    assert isinstance(tracker.db, tracker_metrics.InstrumentedConnection)
+
+    tracker_app.view_tables("expenses", tracker)
+    tracker.update_actual("expenses", "Food", 3100)
+    capsys.readouterr()
+
+    report = tracker_metrics.report_json()
+    assert report["operations"]["view_tables"]["count"] == 1
+    assert report["operations"]["update_actual"]["count"] == 1
+
+    # SQL run by nested operations counts towards the outer one
+    statements = {(entry["operation"], entry["statement"]): entry for entry in report["statements"]}
+    tree_query = next(statement for operation, statement in statements
+                      if operation == "view_tables" and "FROM expenses c JOIN expenses_rollups" in statement)
+    assert statements[("view_tables", tree_query)]["rows"] == 5
+    assert ("update_actual", "COMMIT") in statements
+    assert "get_category" not in {operation for operation, _ in statements}
+
+
+def test_prometheus_report(metrics, tracker):
+    tracker.get_summary()
+
+    lines = tracker_metrics.report_prometheus().splitlines()
+
+    assert "# TYPE tracker_operation_seconds histogram" in lines
+    buckets = [line for line in lines if line.startswith('tracker_operation_seconds_bucket{operation="get_summary"')]
+    assert len(buckets) == len(tracker_metrics.latency_buckets) + 1
+    assert buckets[-1].startswith('tracker_operation_seconds_bucket{operation="get_summary",le="+Inf"}')
+    assert 'tracker_operation_seconds_count{operation="get_summary"} 1' in lines
+    assert any(line.startswith("tracker_sql_rows_total{") for line in lines)
+
+
+def test_reports_written_on_exit(app, run_app):
+    output = run_app(stdin="s\nq\n", env={"TRACKER_METRICS": "1", "TRACKER_METRICS_FILE": str(app / "report.json")})
+    assert "TOTAL (MS)" in output
+
+    report = json.loads((app / "report.json").read_text())
+    assert report["buckets"] == list(tracker_metrics.latency_buckets)
+    assert report["statements"]
+
+    run_app(stdin="q\n", env={"TRACKER_METRICS": "1", "TRACKER_METRICS_FILE": str(app / "report.prom")})
+    assert "# TYPE tracker_sql_statement_seconds histogram" in (app / "report.prom").read_text()
+
+
+def test_switched_off_by_default(run_app, tracker):
+    assert type(tracker.db) is sqlite3.Connection
+    assert "Query metrics are switched off" in run_app(stdin="s\nq\n", env={"TRACKER_METRICS": ""})
+
+
+##############################################################################################################
+# END OF CODE
@@ -0,0 +1,88 @@
+# TESTS: SCHEMA MIGRATIONS
+""" Versioned schema migrations: upgrading the committed database, merging duplicate categories
+into a unique category index, and leaving a failed migration rolled back.
+
+Usage:
+    python -m pytest app/test_migrations.py
+"""
+
+##############################################################################################################
+# IMPORT LIBRARIES
+
+import sqlite3
+from contextlib import closing
+
+import tracker_app
+
+
+##############################################################################################################
+# FIXTURES
+
+# Schema version the app migrates databases to
+latest_version = tracker_app.migrations[-1][0]
+
+
+def write_db(app, *statements):
+    """ Runs statements against the copied database before the app opens it. """
+
+    with closing(sqlite3.connect(app / "tracker_db")) as db:
+        for statement in statements:
+            db.execute(statement)
+        db.commit()
+
+
+##############################################################################################################
+# TESTS
+
+def test_committed_database_is_migrated_to_the_latest_version(app, run_app, query):
+    assert query("PRAGMA user_version") == [(0,)]
+
+    run_app(stdin="q\n")
+
+    assert query("PRAGMA user_version") == [(latest_version,)]
+    assert query("SELECT category FROM expenses ORDER BY id") == [
+        ("Food",), ("Beer",), ("Rent",), ("Personal care",), ("Dog food",)]
+
+    # A second start has nothing left to run
+    schema = query("SELECT type, name, sql FROM sqlite_master ORDER BY name")
+    run_app(stdin="q\n")
+    assert query("SELECT type, name, sql FROM sqlite_master ORDER BY name") == schema
+
+
+def test_category_lookups_use_the_unique_index(run_app, query):
+    run_app(stdin="q\n")
+
+    for table_name in ("expenses", "incomes"):
+        plan = " ".join(row[-1] for row in query(f"EXPLAIN QUERY PLAN SELECT * FROM {table_name} WHERE category = ?", ("Food",)))
+        assert f"USING INDEX {table_name}_category_idx" in plan
+
+
+def test_duplicate_categories_are_merged(app, run_app, query):
+    write_db(app, "INSERT INTO expenses(id, category, actual, budget) VALUES(6, 'Food', 96, 500)")
+
+    run_app(stdin="q\n")
+
+    assert query("SELECT id, actual, budget FROM expenses WHERE category = 'Food'") == [(1, 310000, 550000)]
+    assert query("SELECT count(*) FROM expenses_ledger WHERE category_id = 6") == [(0,)]
+
+
+def test_adding_an_existing_category_is_refused(run_app, query):
+    output = run_app(stdin="e\na\nFood\nGarden\n\nq\nq\n")
+
+    assert "That category already exists in expenses" in output
+    assert query("SELECT count(*) FROM expenses WHERE category IN ('Food', 'Garden') GROUP BY category") == [(1,), (1,)]
+
+
+def test_failed_migration_is_rolled_back(app, run_app, query):
+    # A view in the ledger's place makes the ledger migration fail part way through
+    write_db(app, "CREATE VIEW expenses_ledger AS SELECT 1 AS id, 1 AS category_id, '' AS date, 0 AS amount")
+
+    output = run_app(stdin="q\n", status=1)
+
+    assert "Unable to upgrade database to version 2" in output
+    assert query("PRAGMA user_version") == [(1,)]
+    assert query("SELECT count(*) FROM sqlite_master WHERE name LIKE 'incomes_ledger%'") == [(0,)]
+
+
+##############################################################################################################
+# END OF CODE
@@ -0,0 +1,89 @@
+# TESTS: MONEY
+""" Money as integer cents: parsing and rounding, arithmetic and formatting, and the migration that
+converts REAL rands to exact cents.
+
+Usage:
+    python -m pytest app/test_money.py
+"""
+
+##############################################################################################################
+# IMPORT LIBRARIES
+
+import sqlite3
+from contextlib import closing
+from decimal import Decimal
+
+import pytest
+
+from tracker_app import Money
+
+
+##############################################################################################################
+# TESTS
+
+@pytest.mark.parametrize("value, cents", [("12.30", 1230), (12.3, 1230), (0.1, 10), (7, 700), (Decimal("1.005"), 101),
+                                          ("0.005", 1), ("-0.005", -1), ("2.675", 268), (2.675, 268), ("-45", -4500),
+                                          (1e13, 10 ** 15)])
+def test_parse_rounds_half_up_to_the_cent(value, cents):
+    assert Money.parse(value).cents == cents
+
+
+@pytest.mark.parametrize("value", ["", "R12", "12,30", "nan", float("inf"), None, [12]])
+def test_parse_rejects_other_values(value):
+    with pytest.raises(ValueError):
+        Money.parse(value)
+
+
+def test_arithmetic_and_comparison():
+    amounts = [Money.parse(0.1)] * 10
+
+    assert sum(amounts) == Money(100) == 1 == 1.0 == Decimal("1.00")
+    assert Money(30) == 0.3 and Money.parse(0.1) + Money.parse(0.2) == Money.parse("0.3")
+    assert Money(250) - Money(300) == Money(-50) and -Money(50) == Money(-50) and abs(Money(-50)) == Money(50)
+    assert Money(99) < 1 < Money(101) and max(Money(5), Money(7)) == Money(7)
+    assert not Money() and Money(1)
+    assert hash(Money(700)) == hash(Decimal(7))
+    with pytest.raises(TypeError):
+        Money(100) + 1.5
+
+
+def test_formatting():
+    assert str(Money(123456)) == "1234.56"
+    assert str(Money(-5)) == "-0.05"
+    assert repr(Money(100)) == "Money('1.00')"
+    assert f"{Money(123456):,.2f}" == "1,234.56"
+    assert f"R{Money(7)}" == "R0.07"
+    assert float(Money(1999)) == 19.99
+
+
+def test_amounts_are_stored_as_cents(tracker, tracker_app, query):
+    # The tracker is the copied module's, so its amounts are the copied module's Money
+    money = tracker_app.Money.parse
+    for _ in range(10):
+        tracker.add_transaction("expenses", "Food", 0.1, "2024-03-01")
+
+    assert query("SELECT typeof(actual), actual FROM expenses WHERE category = 'Food'") == [("integer", 300500)]
+    assert tracker.get_category("expenses", "Food")[2] == money("3005.00")
+    assert tracker.update_actual("expenses", "Food", "3005.01") == money("0.01")
+    assert tracker.get_summary()["total_expenses"] == money("19158.01")
+
+
+def test_migration_converts_rands_to_cents(app, run_app, query):
+    # Amounts a REAL column cannot hold exactly still become exact cents
+    with closing(sqlite3.connect(app / "tracker_db")) as db:
+        db.execute("UPDATE expenses SET actual = 450.1 + 0.2 WHERE category = 'Dog food'")
+        db.commit()
+
+    run_app(stdin="q\n")
+    schema = query("SELECT sql FROM sqlite_master WHERE name = 'expenses'")[0][0]
+    assert "actual INTEGER" in schema and "budget INTEGER" in schema
+
+    assert query("SELECT actual FROM expenses WHERE category = 'Dog food'") == [(45030,)]
+    totals = query("SELECT sum(actual), sum(budget) FROM expenses")
+    assert totals == [(1915730, 1930900)]
+    assert query("SELECT count(*) FROM expenses_ledger WHERE typeof(amount) != 'integer'") == [(0,)]
+    assert query("SELECT count(*) FROM expenses_periods WHERE typeof(actual) != 'integer'") == [(0,)]
+
+
+##############################################################################################################
+# END OF CODE
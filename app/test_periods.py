@@ -0,0 +1,144 @@
+# TESTS: MONTHLY PERIODS
+""" Monthly periods: every category has a budget row in every opened month, back-dated writes open
+the months before them, and month, range and year-over-year summaries read the period tables.
+
+Usage:
+    python -m pytest app/test_periods.py
+"""
+
+##############################################################################################################
+# IMPORT LIBRARIES
+
+from datetime import date
+
+import pytest
+
+
+##############################################################################################################
+# FIXTURES
+
+# Month of the opening balances the first start records
+this_month = date.today().strftime("%Y-%m")
+
+
+def period_rows(tracker, table_name):
+    """ Reads {(period, category_id): (actual, budget)} in rands from a periods table. """
+
+    tracker.cursor.execute(f"SELECT period, category_id, actual / 100.0, budget / 100.0 FROM {table_name}_periods")
+    return {(period, category_id): (actual, budget) for period, category_id, actual, budget in tracker.cursor.fetchall()}
+
+
+def opened_months(tracker):
+    tracker.cursor.execute("SELECT period FROM opened_periods ORDER BY period")
+    return [period for period, in tracker.cursor.fetchall()]
+
+
+##############################################################################################################
+# TESTS
+
+def test_period_ranges(tracker_app):
+    today = date(2024, 5, 17)
+
+    assert tracker_app.period_range("2024-03", today) == ("2024-03", "2024-03")
+    assert tracker_app.period_range("2023-11:2024-02", today) == ("2023-11", "2024-02")
+    assert tracker_app.period_range("2023", today) == ("2023-01", "2023-12")
+    assert tracker_app.period_range(" YTD ", today) == ("2024-01", "2024-05")
+    assert tracker_app.shift_period("2024-01", -1) == "2023-12"
+    assert tracker_app.shift_period("2023-12", 13) == "2025-01"
+
+    for text in ("2024-13", "24-01", "2024-03:2024-01", "last month"):
+        with pytest.raises(ValueError):
+            tracker_app.period_range(text, today)
+
+
+def test_opening_balances_are_rolled_up_by_month(tracker):
+    rows = period_rows(tracker, "expenses")
+
+    assert opened_months(tracker) == [this_month]
+    assert rows[(this_month, 1)] == (3004, 5000)
+    assert len(rows) == 5
+
+
+def test_back_dated_transactions_open_every_month_for_every_category(tracker, tracker_app):
+    first_month = tracker_app.shift_period(this_month, -4)
+    tracker.add_transaction("expenses", "Food", 120, f"{first_month}-15", "Spar")
+
+    months = [tracker_app.shift_period(first_month, offset) for offset in range(5)]
+    assert opened_months(tracker) == months
+
+    expenses, incomes = period_rows(tracker, "expenses"), period_rows(tracker, "incomes")
+    assert len(expenses) == 5 * 5 and len(incomes) == 5 * len(tracker.get_rows("incomes"))
+    assert expenses[(first_month, 1)] == (120, 5000)
+    assert expenses[(months[2], 3)] == (0, 10000)
+
+    # Quiet months count towards range budgets
+    summary = tracker.get_summary(start_period=months[0], end_period=months[3])
+    assert summary["total_expenses"] == pytest.approx(120)
+    assert summary["budget_expenses"] == pytest.approx(4 * 19309)
+
+
+def test_later_months_are_opened_without_gaps(tracker, tracker_app):
+    later_month = tracker_app.shift_period(this_month, 3)
+    tracker.begin_write()
+    tracker_app.open_period(tracker.cursor, later_month)
+    tracker.commit()
+
+    assert opened_months(tracker) == [tracker_app.shift_period(this_month, offset) for offset in range(4)]
+    assert len(period_rows(tracker, "expenses")) == 4 * 5
+
+
+def test_budgets_per_month(tracker, tracker_app):
+    last_month = tracker_app.shift_period(this_month, -1)
+    tracker.add_transaction("expenses", "Food", 50, f"{last_month}-02")
+
+    tracker.update_goal("expenses", "Food", 5500)
+    tracker.set_period_budget("expenses", "Rent", last_month, 9000)
+
+    rows = period_rows(tracker, "expenses")
+    assert rows[(this_month, 1)] == (3004, 5500)
+    assert rows[(last_month, 1)] == (50, 5000)
+    assert rows[(last_month, 3)] == (0, 9000)
+    assert rows[(this_month, 3)] == (12000, 10000)
+
+    with pytest.raises(ValueError):
+        tracker.set_period_budget("expenses", "Rent", "2024-3", 9000)
+    with pytest.raises(LookupError):
+        tracker.set_period_budget("expenses", "Nothing", last_month, 9000)
+
+
+def test_ledger_changes_move_period_actuals(tracker, tracker_app):
+    last_month = tracker_app.shift_period(this_month, -1)
+    ledger_id = tracker.add_transaction("expenses", "Beer", 40, f"{last_month}-10")
+
+    tracker.cursor.execute("UPDATE expenses_ledger SET date = ? WHERE id = ?", (f"{this_month}-01", ledger_id))
+    tracker.commit()
+    rows = period_rows(tracker, "expenses")
+    assert rows[(last_month, 2)][0] == 0
+    assert rows[(this_month, 2)][0] == pytest.approx(2503 + 40)
+
+    tracker.remove_category("expenses", "Beer")
+    assert not [key for key in period_rows(tracker, "expenses") if key[1] == 2]
+
+
+def test_year_over_year(tracker, tracker_app):
+    year_ago = tracker_app.shift_period(this_month, -12)
+    tracker.add_transaction("incomes", "Salary", 1000, f"{year_ago}-25")
+
+    comparison = tracker.compare_years(this_month)
+
+    assert comparison["previous"]["start"] == year_ago
+    assert comparison["previous"]["total_income"] == pytest.approx(1000)
+    assert comparison["current"]["total_expenses"] == pytest.approx(19157)
+    assert comparison["previous"]["budget_expenses"] == pytest.approx(19309)
+
+
+def test_period_summary_menu(run_app):
+    output = run_app(stdin=f"p\n{this_month}\np\nnext month\nq\n")
+
+    assert f"Budget summary for {this_month} to {this_month}:" in output
+    assert "YEAR BEFORE (RANDS)" in output
+    assert "Unable to extract period summary. next month is not a month (YYYY-MM)." in output
+
+
+##############################################################################################################
+# END OF CODE
@@ -0,0 +1,141 @@
+# TESTS: TABLE RENDERING AND PAGES
+""" Table renderers (tabulate, the fixed-width plain renderer and custom ones), keyset pages of
+large tables in category and top-N order, and the paged views and auto-view toggle in the menus.
+
+Usage:
+    python -m pytest app/test_render.py
+"""
+
+##############################################################################################################
+# IMPORT LIBRARIES
+
+import pytest
+
+
+##############################################################################################################
+# FIXTURES
+
+@pytest.fixture
+def many(tracker):
+    """ The existing expenses plus 20 more, with actuals that tie in pairs. """
+
+    for number in range(20):
+        tracker.add_category("expenses", f"Extra {number:02}")
+        tracker.update_actual("expenses", f"Extra {number:02}", 100 * (number // 2))
+
+    return tracker
+
+
+def every_page(tracker, order, limit):
+    """ Reads pages until the last, returning the ids of each page. """
+
+    pages, next_key = [], None
+    while True:
+        rows, next_key = tracker.get_page("expenses", order, next_key, limit)
+        pages.append([row[0] for row in rows])
+        if next_key is None:
+            return pages
+
+
+##############################################################################################################
+# TESTS
+
+def test_plain_renderer(tracker_app):
+    rendered = tracker_app.PlainRenderer().render(
+        [[1, "  Fuel", tracker_app.Money.parse(850.5), 1.005, None], [12, "TOTAL", "10.00", "", "x"]],
+        ["ID", "CATEGORY", "ACTUAL", "BUDGET", "NOTE"])
+
+    assert rendered.splitlines() == ["ID  CATEGORY  ACTUAL  BUDGET  NOTE",
+                                     "--  --------  ------  ------  ----",
+                                     " 1    Fuel    850.50    1.00",
+                                     "12  TOTAL      10.00          x"]
+
+
+def test_set_renderer(tracker_app):
+    class Counting:
+        def render(self, rows, headers, floatfmt=".2f"):
+            return f"{len(rows)} rows"
+
+    tracker_app.set_renderer(Counting())
+    assert tracker_app.render_table([[1], [2]], ["ID"]) == "2 rows"
+
+    tracker_app.set_renderer("plain")
+    assert isinstance(tracker_app.renderer, tracker_app.PlainRenderer)
+    with pytest.raises(ValueError):
+        tracker_app.set_renderer("html")
+
+
+def test_tabulate_missing_falls_back_to_plain(tracker_app):
+    class Missing:
+        def render(self, rows, headers, floatfmt=".2f"):
+            raise ImportError("No module named 'tabulate'")
+
+    tracker_app.set_renderer(Missing())
+
+    assert tracker_app.render_table([["Food", 1.5]], ["CATEGORY", "ACTUAL"]).splitlines()[-1] == "Food        1.50"
+    assert isinstance(tracker_app.renderer, tracker_app.PlainRenderer)
+
+
+def test_renderers_keep_indents(tracker_app):
+    for name in tracker_app.renderers:
+        tracker_app.set_renderer(name)
+        assert "\n    Excess" in tracker_app.render_table([["Car"], ["    Excess"]], ["CATEGORY"])
+
+
+def test_pages_in_category_order(many):
+    pages = every_page(many, "id", 10)
+
+    assert [len(page) for page in pages] == [10, 10, 5]
+    assert sum(pages, []) == sorted(sum(pages, []))
+    assert many.get_page("expenses", limit=25)[1] is None
+
+
+def test_top_n_pages_break_ties_by_id(many):
+    pages = every_page(many, "actual", 4)
+    expected = many.cursor.execute("SELECT id FROM expenses ORDER BY actual DESC, id DESC").fetchall()
+
+    assert sum(pages, []) == [category_id for (category_id,) in expected]
+    rows = many.get_page("expenses", "actual", limit=1)[0]
+    assert rows[0][1] == "Rent" and rows[0][3] == 12000
+
+
+def test_top_n_reads_the_actual_index(many):
+    plan = many.cursor.execute("EXPLAIN QUERY PLAN SELECT id FROM expenses ORDER BY actual DESC, id DESC LIMIT 5").fetchall()
+
+    assert any("expenses_actual_idx" in row[-1] for row in plan)
+    with pytest.raises(ValueError):
+        many.get_page("expenses", "category")
+
+
+def test_large_tables_show_their_first_page(many, tracker_app, monkeypatch, capsys):
+    monkeypatch.setattr(tracker_app, "page_size", 10)
+
+    tracker_app.view_tables("expenses", many)
+
+    output = capsys.readouterr().out
+    assert "Showing the first 10 of 25 entries in expenses:" in output
+    assert "Extra 04" in output and "Extra 05" not in output
+
+
+def test_browse_menu(run_app):
+    output = run_app(stdin="e\nv\nn\nn\nn\nt\np\nq\nq\nq\n", env={"TRACKER_PAGE_SIZE": "2"})
+
+    assert "Showing entries 1-2 of 5 in expenses:" in output
+    assert "Showing entries 5-5 of 5 in expenses:" in output
+    assert "This is the last page." in output
+    assert "Showing entries 1-2 of 5 in expenses, largest actual first:" in output
+
+
+def test_auto_view_toggle(run_app):
+    shown = run_app(stdin="e\nu\nFood\n3100\nq\nq\n")
+    hidden = run_app(stdin="d\ne\nu\nFood\n3200\nq\nq\n")
+
+    assert "The table view after each change is now off." in hidden
+    # The categories are still listed to pick from, only the view after the change is dropped
+    assert shown.count("Showing entries in expenses:") == 2
+    assert hidden.count("Showing entries in expenses:") == 1
+    assert run_app(stdin="e\nu\nFood\n3300\nq\nq\n", env={"TRACKER_AUTO_VIEW": "0"}).count("Showing entries in expenses:") == 1
+
+
+##############################################################################################################
+# END OF CODE
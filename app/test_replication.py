@@ -0,0 +1,194 @@
+# TESTS: TRACKER REPLICATION
+""" Replication between two local database files: seeding, incremental batches, imports, resuming
+after an interrupted batch and reseeding after journal compaction.
+
+Usage:
+    python -m pytest app/test_replication.py
+"""
+
+##############################################################################################################
+# IMPORT LIBRARIES
+
+import itertools
+
+import pytest
+
+import tracker_replication
+from tracker_app import Tracker
+from tracker_replication import (JsonLinesSink, ReplicationSink, ResyncNeeded, StandbySink, compare, read_batch,
+                                 replicate)
+
+
+##############################################################################################################
+# FIXTURES
+
+@pytest.fixture
+def source(tmp_path):
+    with Tracker(str(tmp_path / "source_db")) as tracker:
+        tracker.add_category("expenses", "Car")
+        tracker.add_category("expenses", "Fuel", parent="Car")
+        tracker.add_category("incomes", "Salary")
+        yield tracker
+
+
+@pytest.fixture
+def standby(tmp_path):
+    sink = StandbySink(str(tmp_path / "standby_db"))
+    yield sink
+    sink.close()
+
+
+category_numbers = itertools.count()
+
+
+def make_changes(tracker, count):
+    """ Makes 'count' journaled transactions of different kinds. """
+
+    for number in itertools.islice(category_numbers, count):
+        if number % 3 == 0:
+            tracker.add_transaction("expenses", "Fuel", 100 + number, "2024-03-05", f"Fill-up {number}")
+        elif number % 3 == 1:
+            tracker.update_goal("expenses", "Car", 1000 + number)
+        else:
+            tracker.add_category("expenses", f"Extra {number}", parent="Car")
+
+
+##############################################################################################################
+# TESTS
+
+def test_seed_then_incremental_batches(source, standby):
+    first = replicate(source, standby, batch_size=4)
+    assert first["seeded"]
+    assert compare(source.db_file, standby.path) == []
+
+    make_changes(source, 10)
+    result = replicate(source, standby, batch_size=4)
+    assert not result["seeded"]
+    assert result["transactions"] == 10
+    assert result["batches"] == 3
+    assert compare(source.db_file, standby.path) == []
+
+    # Undo and removals travel as ordinary journal transactions
+    source.undo()
+    source.remove_category("expenses", "Fuel")
+    assert replicate(source, standby, batch_size=4)["transactions"] == 2
+    assert compare(source.db_file, standby.path) == []
+    assert replicate(source, standby)["transactions"] == 0
+
+
+def test_max_batches_stops_early_and_resumes(source, standby):
+    replicate(source, standby)
+    make_changes(source, 9)
+
+    result = replicate(source, standby, batch_size=2, max_batches=2)
+    assert result["transactions"] == 4
+    assert standby.position(tracker_replication.source_name(source)) == result["position"]
+    assert compare(source.db_file, standby.path) != []
+
+    assert replicate(source, standby, batch_size=2)["transactions"] == 5
+    assert compare(source.db_file, standby.path) == []
+
+
+def test_interrupted_batch_is_rolled_back_and_resumed(source, standby, monkeypatch):
+    replicate(source, standby)
+    make_changes(source, 9)
+    position = standby.position(tracker_replication.source_name(source))
+
+    # Fail after the first change of the second batch has been applied
+    batches, changes = [], []
+    apply, apply_change = standby.apply, tracker_replication.apply_change
+
+    def counting_apply(*args):
+        batches.append(args)
+        changes.clear()
+        apply(*args)
+
+    def failing_apply_change(*args):
+        changes.append(args)
+        if len(batches) == 2 and len(changes) == 2:
+            raise OSError("Connection lost")
+        apply_change(*args)
+
+    monkeypatch.setattr(standby, "apply", counting_apply)
+    monkeypatch.setattr(tracker_replication, "apply_change", failing_apply_change)
+    with pytest.raises(OSError):
+        replicate(source, standby, batch_size=3)
+
+    # The first batch and its position were committed, the second was rolled back
+    assert standby.position(tracker_replication.source_name(source)) == position + 3
+
+    monkeypatch.undo()
+    result = replicate(source, standby, batch_size=3)
+    assert not result["seeded"]
+    assert result["transactions"] == 6
+    assert compare(source.db_file, standby.path) == []
+
+
+def test_imports_ship_their_rows(source, standby, tmp_path):
+    replicate(source, standby)
+    statement = tmp_path / "statement.csv"
+    statement.write_text("Date,Description,Amount,Category\n" + "".join(
+        f"2024-03-{day:02},Row {day},-{day}0,{'Books' if day % 2 else 'Fuel'}\n" for day in range(1, 11)), encoding="utf-8")
+    source.import_statement(str(statement), chunk_size=3)
+
+    # The import's id ranges travel as the rows they cover, also after some were removed again
+    source.remove_category("expenses", "Books")
+    batch = read_batch(source, standby.position(tracker_replication.source_name(source)))
+    ledger_changes = [change for change in batch[0]["changes"] if change[0] == "expenses_ledger"]
+    assert {change[1] for change in ledger_changes} == {"insert"}
+    assert sum(len(change[3]) for change in ledger_changes) == 10
+
+    assert replicate(source, standby)["transactions"] == 2
+    assert compare(source.db_file, standby.path) == []
+
+    source.undo()
+    source.undo()
+    replicate(source, standby)
+    assert compare(source.db_file, standby.path) == []
+
+
+def test_compaction_gap_needs_resync(source, standby):
+    replicate(source, standby)
+    position = standby.position(tracker_replication.source_name(source))
+    make_changes(source, 4)
+    source.compact(days=0)
+    make_changes(source, 2)
+
+    with pytest.raises(ResyncNeeded):
+        read_batch(source, position)
+
+    result = replicate(source, standby)
+    assert result["seeded"]
+    assert compare(source.db_file, standby.path) == []
+
+    # Later changes are incremental again
+    make_changes(source, 3)
+    result = replicate(source, standby)
+    assert not result["seeded"]
+    assert result["transactions"] == 3
+    assert compare(source.db_file, standby.path) == []
+
+
+def test_json_lines_sink_resumes_from_its_position(source, tmp_path):
+    path = str(tmp_path / "feed.jsonl")
+    replicate(source, JsonLinesSink(path))
+    make_changes(source, 5)
+    replicate(source, JsonLinesSink(path), batch_size=2)
+
+    with open(path, encoding="utf-8") as feed:
+        lines = feed.read().splitlines()
+    assert len(lines) == 6
+    assert replicate(source, JsonLinesSink(path))["transactions"] == 0
+
+
+def test_incomplete_sink_cannot_be_created():
+    class PositionOnlySink(ReplicationSink):
+        def position(self, source):
+            return None
+
+    with pytest.raises(TypeError):
+        PositionOnlySink()
+
+
+##############################################################################################################
+# END OF CODE
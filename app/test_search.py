@@ -0,0 +1,101 @@
+# TESTS: CATEGORY SEARCH
+""" Fuzzy category search: ranking of exact, prefix, substring and near matches, the FTS5 trigram
+index the triggers keep in step, the scan used without it, and the menus that offer suggestions.
+
+Usage:
+    python -m pytest app/test_search.py
+"""
+
+##############################################################################################################
+# IMPORT LIBRARIES
+
+import pytest
+
+
+##############################################################################################################
+# FIXTURES
+
+@pytest.fixture
+def categories(tracker):
+    """ The existing expenses plus names that share words and letters. """
+
+    for category in ("Car fuel", "Fuel levy", "Dog grooming", 'Kids "extras"', "Foodies club"):
+        tracker.add_category("expenses", category)
+
+    return tracker
+
+
+@pytest.fixture(params=[True, False], ids=["index", "scan"])
+def search(request, categories):
+    """ Searches the expenses with and without the trigram index. """
+
+    if not request.param:
+        categories.search_index = False
+    elif not categories.search_index:
+        pytest.skip("This SQLite build has no FTS5 trigram tokenizer.")
+
+    return lambda text, limit=10: categories.search_categories("expenses", text, limit)
+
+
+##############################################################################################################
+# TESTS
+
+def test_index_is_built_by_the_migration(categories):
+    if not categories.search_index:
+        pytest.skip("This SQLite build has no FTS5 trigram tokenizer.")
+
+    assert categories.cursor.execute("SELECT rowid, category FROM incomes_search ORDER BY rowid").fetchall() == \
+        categories.cursor.execute("SELECT id, category FROM incomes ORDER BY id").fetchall()
+
+
+def test_exact_prefix_and_substring_order(search):
+    assert search("FOOD") == ["Food", "Foodies club", "Dog food"]
+    assert search("fuel") == ["Fuel levy", "Car fuel"]
+    assert search("ood", limit=2) == ["Food", "Dog food"]
+
+
+def test_near_matches(search):
+    assert search("Beeer") == ["Beer"]
+    assert search("persnal care")[0] == "Personal care"
+    assert search("Dgo")[0] == "Dog food"
+    assert search("zzzz") == []
+    assert search("  ") == []
+
+
+def test_punctuation_is_matched_literally(search):
+    assert search('"extras"') == ['Kids "extras"']
+    # FTS5 query syntax in the text is searched for like any other characters
+    assert search("NEAR(food*")[0] == "Food"
+    assert search("food OR")[0] == "Food"
+
+
+def test_index_follows_category_changes(categories, search):
+    categories.add_category("expenses", "Fuel card")
+    assert search("fuel") == ["Fuel card", "Fuel levy", "Car fuel"]
+
+    categories.remove_category("expenses", "Fuel levy")
+    categories.cursor.execute("UPDATE expenses SET category = 'Petrol' WHERE category = 'Car fuel'")
+    categories.db.commit()
+    assert search("fuel") == ["Fuel card"]
+    assert search("petrol")[0] == "Petrol"
+
+
+def test_menu_suggestions(run_app, query):
+    # 'Beeer' is offered 'Beer', picked as suggestion 1, then 'Rnet' is cancelled
+    output = run_app(stdin="e\nu\nBeeer\n1\n30\nu\nRnet\nn\nq\nq\n")
+
+    assert "Beeer is not a category in expenses. Did you mean:\n1 - Beer" in output
+    assert query("SELECT actual FROM expenses WHERE category = 'Beer'") == [(3000,)]
+    assert "1 - Rent\nEnter a number to pick a category, or anything else to cancel: Unable to update." in output
+    assert query("SELECT actual FROM expenses WHERE category = 'Rent'") == [(1200000,)]
+
+
+def test_search_menu(run_app):
+    output = run_app(stdin="e\ns\ncare\ns\nxyz\nq\nq\n")
+
+    assert "Personal care" in output
+    assert "No categories in expenses match xyz." in output
+
+
+##############################################################################################################
+# END OF CODE
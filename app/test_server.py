@@ -0,0 +1,168 @@
+# TESTS: TRACKER SERVER
+""" The JSON HTTP service: status codes for each endpoint, validation of request bodies, and the
+load test against a copy of the database.
+
+Usage:
+    python -m pytest app/test_server.py
+"""
+
+##############################################################################################################
+# IMPORT LIBRARIES
+
+import asyncio
+import json
+
+import pytest
+
+import tracker_server
+from tracker_app import Tracker
+
+
+##############################################################################################################
+# FIXTURES
+
+@pytest.fixture
+def serve(app):
+    """ Starts the service on a free loopback port against the copied database, sends the requests
+    given over one keep-alive connection and returns the (status, JSON body) of each response.
+    """
+
+    async def send_all(requests):
+        pool = tracker_server.TrackerPool(str(app / "tracker_db"), 2)
+        server = await tracker_server.start_server(pool, "127.0.0.1", 0)
+        host, port = server.sockets[0].getsockname()[:2]
+        reader, writer = await asyncio.open_connection(host, port)
+        responses = []
+
+        try:
+            for method, path, body in requests:
+                raw_body = body.encode() if isinstance(body, str) else json.dumps(body).encode() if body is not None else b""
+                writer.write(f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Length: {len(raw_body)}\r\n\r\n".encode()
+                             + raw_body)
+                await writer.drain()
+
+                status = int((await reader.readline()).split()[1])
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b""):
+                        break
+                    name, _, value = line.decode().partition(":")
+                    headers[name.lower()] = value.strip()
+                responses.append((status, json.loads(await reader.readexactly(int(headers["content-length"])))))
+        finally:
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            pool.close()
+
+        return responses
+
+    return lambda *requests: asyncio.run(send_all(requests))
+
+
+##############################################################################################################
+# TESTS
+
+def test_reads(serve):
+    (summary_status, summary), (table_status, table) = serve(("GET", "/summary", None), ("GET", "/tables/expenses?page=1", None))
+
+    assert summary_status == 200
+    assert summary["total_expenses"] == pytest.approx(19157)
+    assert table_status == 200
+    assert table["rows"][0] == {"id": 1, "category": "Food", "actual": 3004, "budget": 5000}
+    assert table["total_actual"] == pytest.approx(19157)
+
+
+def test_period_summary(serve):
+    (status, payload), (bad_status, _) = serve(("GET", "/summary?period=ytd", None), ("GET", "/summary?period=2024-13", None))
+
+    assert status == 200
+    assert set(payload) == {"current", "previous"}
+    assert payload["current"]["total_expenses"] == pytest.approx(19157)
+    assert bad_status == 400
+
+
+def test_writes(serve, query):
+    responses = serve(("POST", "/tables/expenses/categories", {"category": "Fuel"}),
+                      ("POST", "/tables/expenses/actual", {"category": "Fuel", "amount": 850.256}),
+                      ("POST", "/tables/expenses/goal", {"category": "Fuel", "target": 900}),
+                      ("POST", "/tables/expenses/categories", {"category": "Fuel"}))
+
+    assert [status for status, _ in responses] == [201, 200, 200, 409]
+    assert responses[1][1]["adjustment"] == pytest.approx(850.26)
+    assert query("SELECT actual, budget FROM expenses WHERE category = 'Fuel'") == [(85026, 90000)]
+
+
+def test_search(serve):
+    (status, payload), (limited_status, limited), (bad_status, _) = serve(
+        ("GET", "/tables/expenses/search?q=fod", None), ("GET", "/tables/expenses/search?q=foo&limit=1", None),
+        ("GET", "/tables/expenses/search?q=food&limit=many", None))
+
+    assert status == 200 and payload == {"query": "fod", "matches": ["Food"]}
+    assert limited_status == 200 and len(limited["matches"]) == 1
+    assert bad_status == 400
+
+
+def test_alerts(serve, query):
+    responses = serve(("POST", "/tables/expenses/actual", {"category": "Food", "amount": 4100}),
+                      ("GET", "/alerts", None), ("GET", "/alerts?after=1&limit=5", None),
+                      ("POST", "/alerts/acknowledge", {"up_to": 1}), ("GET", "/alerts?after=none", None),
+                      ("POST", "/alerts/acknowledge", {"up_to": "all"}))
+
+    assert [status for status, _ in responses] == [200, 200, 200, 200, 400, 400]
+    assert [(alert["category"], alert["percent"]) for alert in responses[1][1]["alerts"]] == [(None, 100), ("Food", 80)]
+    assert [alert["id"] for alert in responses[2][1]["alerts"]] == [2]
+    assert responses[3][1] == {"acknowledged": 1}
+    assert query("SELECT id FROM alerts") == [(2,)]
+
+
+def test_unknown_routes_tables_and_categories(serve):
+    responses = serve(("GET", "/nothing", None),
+                      ("GET", "/tables/sqlite_master", None),
+                      ("DELETE", "/tables/expenses", None),
+                      ("POST", "/tables/expenses/actual", {"category": "Nothing", "amount": 10}))
+
+    assert [status for status, _ in responses] == [404, 404, 404, 404]
+
+
+@pytest.mark.parametrize("body", ['{"category": "Food", "amount": NaN}',
+                                  '{"category": "Food", "amount": Infinity}',
+                                  '{"category": "Food", "amount": -Infinity}',
+                                  '{"category": "Food", "amount": 1e300}',
+                                  '{"category": "Food", "amount": 100000000000000000000}',
+                                  '{"category": "Food", "amount": true}',
+                                  '{"category": "Food", "amount": "10"}',
+                                  '{"amount": 10}',
+                                  '["Food", 10]',
+                                  '{"category": "Food",'])
+def test_invalid_bodies_are_rejected(serve, query, body):
+    (status, payload), = serve(("POST", "/tables/expenses/actual", body))
+
+    assert status == 400
+    assert payload["error"]
+    assert query("SELECT actual FROM expenses WHERE category = 'Food'") == [(300400,)]
+
+
+def test_unexpected_errors_are_not_echoed(serve, monkeypatch):
+    def fail(tracker, *args):
+        raise RuntimeError(f"no such table in {tracker.db_file}")
+
+    monkeypatch.setattr(Tracker, "get_summary", fail)
+
+    (status, payload), = serve(("GET", "/summary", None))
+
+    assert status == 500
+    assert payload == {"error": "Internal server error."}
+
+
+def test_load_test_reports_each_concurrency_level(app):
+    results = asyncio.run(tracker_server.load_test(str(app / "tracker_db"), 40, [1, 4], 2))
+
+    assert [result["concurrency"] for result in results] == [1, 4]
+    assert [result["requests"] for result in results] == [40, 40]
+    assert all(result["p99_ms"] >= result["p50_ms"] > 0 for result in results)
+
+
+##############################################################################################################
+# END OF CODE
@@ -0,0 +1,91 @@
+# TESTS: BUDGET SUMMARY
+""" The budget summary engine: totals from one aggregate query, cached between views and
+recomputed after a write through the app or a commit by another connection.
+
+Usage:
+    python -m pytest app/test_summary.py
+"""
+
+##############################################################################################################
+# IMPORT LIBRARIES
+
+import queue
+import re
+import sqlite3
+import subprocess
+import sys
+import threading
+from contextlib import closing
+
+
+##############################################################################################################
+# FIXTURES
+
+def summary_totals(output):
+    """ Reads the (actual, budget) totals from the last budget summary printed. """
+
+    totals = {}
+    for label in ("Income", "Expenses"):
+        line = [line for line in output.splitlines() if line.strip().startswith(f"{label}:")][-1]
+        actual, budget = [float(re.sub(r"[^0-9.\-]", "", number)) for number in re.findall(r"-?[\d ,]*\d\.\d\d", line)][:2]
+        totals[label] = (actual, budget)
+    return totals
+
+
+class MenuSession:
+    """ Drives the menu of a running copy of the app one answer at a time. """
+
+    def __init__(self, app):
+        self.process = subprocess.Popen([sys.executable, "-u", str(app / "tracker_app.py")], cwd=app, text=True,
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        self.lines = queue.Queue()
+        threading.Thread(target=lambda: [self.lines.put(line) for line in self.process.stdout], daemon=True).start()
+
+    def send(self, answers, until):
+        """ Sends answers and returns the output up to the next line containing 'until'. """
+
+        self.process.stdin.write(answers)
+        self.process.stdin.flush()
+        output = []
+        while not output or until not in output[-1]:
+            output.append(self.lines.get(timeout=30))
+        return "".join(output)
+
+    def close(self):
+        self.process.communicate("q\n", timeout=30)
+
+
+##############################################################################################################
+# TESTS
+
+def test_summary_follows_writes_made_in_the_app(run_app):
+    output = run_app(stdin="g\ne\nu\nFood\n3100\nq\ng\nq\n")
+
+    first, second = output.split("Exiting expense management.")
+    assert summary_totals(first) == {"Income": (87000, 99000), "Expenses": (19157, 19309)}
+    assert summary_totals(second) == {"Income": (87000, 99000), "Expenses": (19253, 19309)}
+
+
+def test_summary_follows_commits_by_other_connections(app):
+    session = MenuSession(app)
+    try:
+        assert summary_totals(session.send("g\n", "SAVINGS:"))["Expenses"] == (19157, 19309)
+
+        with closing(sqlite3.connect(app / "tracker_db")) as db:
+            db.execute("UPDATE expenses SET budget = budget + 100000 WHERE category = 'Rent'")
+            db.commit()
+
+        assert summary_totals(session.send("g\n", "SAVINGS:"))["Expenses"] == (19157, 20309)
+    finally:
+        session.close()
+
+
+def test_repeated_views_show_the_same_totals(run_app):
+    output = run_app(stdin="g\ng\nq\n")
+
+    first, second = output.split("You have selected to view your budget summary.")[1:]
+    assert summary_totals(first) == summary_totals(second)
+
+
+##############################################################################################################
+# END OF CODE
@@ -0,0 +1,133 @@
+# TESTS: TENANTS
+""" Multi-tenant mode: tenant names, the router's bounded set of open trackers, and the
+consolidated summary read through ATTACH batches or a process pool.
+
+Usage:
+    python -m pytest app/test_tenants.py
+"""
+
+##############################################################################################################
+# IMPORT LIBRARIES
+
+import shutil
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+import tracker_app
+import tracker_tenants
+from tracker_app import Money
+
+
+##############################################################################################################
+# FIXTURES
+
+@pytest.fixture
+def router(tmp_path):
+    """ Router over an empty tenants directory. """
+
+    with tracker_tenants.TenantRouter(str(tmp_path / "tenants")) as router:
+        yield router
+
+
+@pytest.fixture
+def tenants(router):
+    """ More tenants than one ATTACH batch holds, each with its own income and spending. """
+
+    names = [f"household-{number:02d}" for number in range(tracker_tenants.attach_batch_size + 3)]
+    for number, name in enumerate(names):
+        tracker = router.create(name)
+        tracker.add_category("incomes", "Salary")
+        tracker.add_transaction("incomes", "Salary", 1000 + number, "2024-03-25")
+        tracker.add_transaction("incomes", "Salary", 0.01, "2024-04-25")
+        tracker.update_goal("incomes", "Salary", 1200)
+        tracker.add_category("expenses", "Food")
+        tracker.add_transaction("expenses", "Food", 100.10 * number, "2024-03-02")
+    router.close()
+
+    return names
+
+
+def schema_version(db_path):
+    with closing(sqlite3.connect(db_path)) as db:
+        return db.execute("PRAGMA user_version").fetchone()[0]
+
+
+##############################################################################################################
+# TESTS
+
+@pytest.mark.parametrize("name", ["../elsewhere", ".hidden", "", "a/b", "x" * 65, None])
+def test_unsafe_tenant_names_are_refused(router, name):
+    with pytest.raises(ValueError):
+        router.path(name)
+
+
+def test_router(router):
+    router.max_open = 2
+    router.create("smith")
+    router.create("jones.co")
+
+    assert router.tenants() == ["jones.co", "smith"]
+    assert router.tracker("smith") is router.tracker("smith")
+    with pytest.raises(FileExistsError):
+        router.create("smith")
+    with pytest.raises(LookupError):
+        router.tracker("nobody")
+
+    # Opening a third tenant closes the least recently used
+    router.create("brown")
+    assert list(router.open_trackers) == ["smith", "brown"]
+
+
+@pytest.mark.parametrize("period", [(None, None), ("2024-03", "2024-03")])
+def test_attach_and_process_summaries_agree(router, tenants, period):
+    by_attach = tracker_tenants.consolidated_summary(router, None, *period, method="attach")
+    by_process = tracker_tenants.consolidated_summary(router, None, *period, method="process", workers=2)
+
+    assert by_attach == by_process
+    assert list(by_attach["tenants"]) == tenants
+
+    income = sum(1000 + number for number in range(len(tenants)))
+    expenses = sum(Money.parse(100.10 * number) for number in range(len(tenants)))
+    total = by_attach["total"]
+    assert total["total_income"] == (income if period[0] else Money.parse(income + 0.01 * len(tenants)))
+    assert total["total_expenses"] == expenses
+    # Months before the target was set keep the target they had then
+    assert total["budget_income"] == (0 if period[0] else 1200 * len(tenants))
+    assert by_attach["tenants"]["household-02"]["total_expenses"] == Money.parse("200.20")
+
+
+def test_unknown_method(router, tenants):
+    with pytest.raises(ValueError):
+        tracker_tenants.consolidated_summary(router, method="threads")
+
+
+@pytest.mark.parametrize("method", ["attach", "process"])
+def test_outdated_shards_are_migrated_when_read(app, router, tenants, method):
+    # A shard at schema version 0, next to shards that are up to date
+    shutil.copyfile(app / "tracker_db", router.path("legacy"))
+
+    result = tracker_tenants.consolidated_summary(router, ["legacy", tenants[0]], method=method, workers=2)
+
+    assert schema_version(router.path("legacy")) == tracker_app.migrations[-1][0]
+    assert result["tenants"]["legacy"]["total_expenses"] == 19157
+    # Shards are read without the router opening them
+    assert not router.open_trackers
+
+
+def test_command_line(tmp_path, capsys):
+    directory = str(tmp_path / "tenants")
+
+    assert tracker_tenants.main(["create", "smith", "--dir", directory]) == 0
+    assert tracker_tenants.main(["create", "smith", "--dir", directory]) == 1
+    assert tracker_tenants.main(["list", "--dir", directory]) == 0
+    assert tracker_tenants.main(["summary", "--period", "ytd", "--dir", directory]) == 0
+
+    output = capsys.readouterr().out
+    assert "Created tenant smith." in output and "smith already exists." in output
+    assert "TOTAL" in output and "SAVINGS VARIANCE" in output
+
+
+##############################################################################################################
+# END OF CODE
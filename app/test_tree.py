@@ -0,0 +1,178 @@
+# TESTS: CATEGORY TREE
+""" Sub-categories: the closure table and subtree rollups the triggers maintain as categories are
+added, changed, moved and removed, the tree and group reads, and the menus that show them.
+
+Usage:
+    python -m pytest app/test_tree.py
+"""
+
+##############################################################################################################
+# IMPORT LIBRARIES
+
+import random
+import re
+import sqlite3
+
+import pytest
+
+
+##############################################################################################################
+# FIXTURES
+
+@pytest.fixture
+def car(tracker):
+    """ Car > (Fuel, Insurance > Excess) below the existing expenses, with some spending. """
+
+    tracker.add_category("expenses", "Car")
+    tracker.add_category("expenses", "Fuel", parent="Car")
+    tracker.add_category("expenses", "Insurance", parent="Car")
+    tracker.add_category("expenses", "Excess", parent="Insurance")
+    tracker.add_transaction("expenses", "Fuel", 800, "2024-03-05")
+    tracker.add_transaction("expenses", "Excess", 150, "2024-04-05")
+    tracker.update_goal("expenses", "Insurance", 300)
+
+    return tracker
+
+
+def tree(tracker, *period):
+    """ (category, depth, subtotal actual, subtotal budget) per row, in rands. """
+
+    return [(category, depth, float(subtotal_actual), float(subtotal_budget))
+            for _, category, depth, _, _, subtotal_actual, subtotal_budget, _ in tracker.get_tree("expenses", *period)]
+
+
+def closure_is_consistent(tracker):
+    """ Compares the closure table and the rollups with a recursive walk of parent_id. """
+
+    walk = tracker.cursor.execute('''WITH RECURSIVE walk(ancestor_id, descendant_id, depth) AS (
+                                         SELECT id, id, 0 FROM expenses
+                                         UNION ALL
+                                         SELECT walk.ancestor_id, c.id, walk.depth + 1 FROM walk JOIN expenses c ON c.parent_id = walk.descendant_id)
+                                     SELECT * FROM walk ORDER BY 1, 2''').fetchall()
+    closure = tracker.cursor.execute("SELECT ancestor_id, descendant_id, depth FROM expenses_tree ORDER BY 1, 2").fetchall()
+    rollups = tracker.cursor.execute('''SELECT r.category_id, r.actual, r.budget,
+                                            (SELECT sum(c.actual) FROM expenses_tree t JOIN expenses c ON c.id = t.descendant_id
+                                             WHERE t.ancestor_id = r.category_id),
+                                            (SELECT sum(c.budget) FROM expenses_tree t JOIN expenses c ON c.id = t.descendant_id
+                                             WHERE t.ancestor_id = r.category_id)
+                                        FROM expenses_rollups r''').fetchall()
+
+    return walk == closure and all(actual == walk_actual and budget == walk_budget
+                                   for _, actual, budget, walk_actual, walk_budget in rollups)
+
+
+##############################################################################################################
+# TESTS
+
+def test_existing_categories_become_top_level(tracker):
+    assert [(category, depth) for category, depth, _, _ in tree(tracker)] == [
+        ("Food", 0), ("Beer", 0), ("Rent", 0), ("Personal care", 0), ("Dog food", 0)]
+    assert tree(tracker)[0][2:] == (3004, 5000)
+    assert closure_is_consistent(tracker)
+
+
+def test_subtree_rollups(car):
+    assert tree(car)[-4:] == [("Car", 0, 950, 300), ("Fuel", 1, 800, 0), ("Insurance", 1, 150, 300), ("Excess", 2, 150, 0)]
+    assert [row[7] for row in car.get_tree("expenses")][-4:] == [2, 0, 1, 0]
+    # The table totals still count each category once
+    assert car.get_summary()["total_expenses"] == 19157 + 950
+    assert closure_is_consistent(car)
+
+
+def test_period_subtotals(car):
+    assert tree(car, "2024-03")[-4:] == [("Car", 0, 800, 0), ("Fuel", 1, 800, 0), ("Insurance", 1, 0, 0), ("Excess", 2, 0, 0)]
+    assert tree(car, "2024-03", "2024-04")[-4][2] == 950
+
+
+def test_move_category(car):
+    car.add_category("expenses", "Transport")
+
+    assert car.move_category("expenses", "Insurance", "Transport") == car.get_category("expenses", "Transport")[0]
+    assert tree(car)[-5:] == [("Car", 0, 800, 0), ("Fuel", 1, 800, 0), ("Transport", 0, 150, 300),
+                              ("Insurance", 1, 150, 300), ("Excess", 2, 150, 0)]
+
+    assert car.move_category("expenses", "Insurance") is None
+    assert ("Insurance", 0, 150, 300) in tree(car)
+    assert closure_is_consistent(car)
+
+
+@pytest.mark.parametrize("parent", ["Car", "Excess"])
+def test_moving_a_category_under_itself_is_refused(car, parent):
+    with pytest.raises(sqlite3.IntegrityError, match="cannot be moved under itself"):
+        car.move_category("expenses", "Car", parent)
+
+    assert tree(car)[-4][:2] == ("Car", 0)
+    assert closure_is_consistent(car)
+
+
+def test_unknown_parent(car):
+    with pytest.raises(LookupError):
+        car.add_category("expenses", "Tyres", parent="Bicycle")
+    with pytest.raises(LookupError):
+        car.move_category("expenses", "Fuel", "Bicycle")
+
+    assert car.cursor.execute("SELECT count(*) FROM expenses WHERE category = 'Tyres'").fetchone() == (0,)
+
+
+def test_removing_a_category_moves_its_sub_categories_up(car):
+    assert car.remove_category("expenses", "Insurance")
+
+    assert tree(car)[-3:] == [("Car", 0, 950, 0), ("Fuel", 1, 800, 0), ("Excess", 1, 150, 0)]
+    assert closure_is_consistent(car)
+
+
+def test_groups(car):
+    groups = [(category, depth, float(actual), float(budget)) for _, category, depth, actual, budget in car.get_groups("expenses")]
+
+    assert groups == [("Car", 0, 950, 300), ("Insurance", 1, 150, 300)]
+    assert [row[1] for row in car.get_groups("expenses", "2024-04")] == ["Car", "Insurance"]
+    assert car.get_groups("expenses", "2024-04")[0][3] == 150
+    assert car.get_groups("incomes") == []
+
+
+def test_random_moves_and_removals(tracker):
+    generator = random.Random(3)
+    names = [f"Node {number}" for number in range(60)]
+    for number, name in enumerate(names):
+        parent = generator.choice(names[:number]) if number and generator.random() < 0.8 else None
+        tracker.add_category("expenses", name, parent=parent)
+        tracker.add_transaction("expenses", name, generator.randint(1, 500), "2024-03-01")
+
+    for _ in range(40):
+        category, parent = generator.sample(names, 2)
+        try:
+            tracker.move_category("expenses", category, parent)
+        except sqlite3.IntegrityError:
+            pass
+    for name in generator.sample(names, 10):
+        tracker.remove_category("expenses", name)
+
+    assert closure_is_consistent(tracker)
+    subtotal = sum(row[2] for row in tree(tracker) if row[1] == 0)
+    assert subtotal == pytest.approx(float(tracker.get_summary()["total_expenses"]))
+
+
+def test_views_show_the_tree(car, tracker_app, capsys):
+    tracker_app.view_tables("expenses", car)
+    tracker_app.budget_summary("incomes", "expenses", car)
+
+    output = capsys.readouterr().out
+    assert "SUBTOTAL ACTUAL" in output
+    indents = dict((category, len(indent)) for indent, category in
+                   re.findall(r"^ *\d+  ( *)(Car|Fuel|Insurance|Excess) ", output, re.MULTILINE))
+    assert indents == {"Car": 0, "Fuel": 2, "Insurance": 2, "Excess": 4}
+    assert "Subtotals of expenses category groups:" in output
+    assert "Subtotals of incomes category groups:" not in output
+
+
+def test_menus(run_app, query):
+    output = run_app(stdin="e\na\nCar\n\na\nFuel\nCar\nm\nFood\nCar\nm\nCar\nFuel\nq\nq\n")
+
+    assert "Food is now under Car." in output
+    assert "Unable to move category. A category cannot be moved under itself" in output
+    assert query('''SELECT c.category, p.category FROM expenses c JOIN expenses p ON p.id = c.parent_id
+                    ORDER BY c.id''') == [("Food", "Car"), ("Fuel", "Car")]
+
+
+##############################################################################################################
+# END OF CODE
@@ -1,548 +1,3900 @@
 # TRACKER APP
 """ This application, developed using only the finest key-strokes,
-allows a user to manage his or her budget by tracking and managing 
+allows a user to manage his or her budget by tracking and managing
 income and expense categories and values. It also allows the user to
-specify goals (or targets) per category and track progress towards 
+specify goals (or targets) per category and track progress towards
 overall financial goals.
 This app has been version controlled and can be accessed at:
 https://github.com/HeinoDeist/tracker_app
 
+Run the file to use the menu. Importing it has no side effects: scripts and workers create a
+Tracker and call its methods directly, e.g.
+
+    from tracker_app import Tracker
+    with Tracker() as tracker:
+        tracker.add_transaction("expenses", "Food", 120.50)
+
+"""
+
+##############################################################################################################
+# IMPORT LIBRARIES
+
+""" Import sqlite3 and standard libraries. Sqlite3 performs database manipulation.
+tabulate (used to represent output in neat and readable format) is only imported when
+something is rendered, so importing this module stays cheap for scripts and workers. Without
+it tables are rendered as plain fixed-width text (see DISPLAY FUNCTIONS).
+tracker_metrics times SQL statements per operation when switched on with TRACKER_METRICS=1.
+"""
+import sqlite3
+import os
+import csv
+import re
+import sys
+import time
+import random
+import functools
+import json
+import threading
+from difflib import SequenceMatcher
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+import tracker_metrics
+from tracker_metrics import measured
+
+
+##############################################################################################################
+# DATABASE FUNCTIONS
+
+# Reference the path to the database file.
+# https://note.nkmk.me/en/python-script-file-path/
+# Accessed on 25 October 2023, wanted to know more about relative file referencing
+# and include the db in folder.
+# TRACKER_DB points the app at another database file, e.g. for stress tests.
+db_file = os.environ.get("TRACKER_DB") or os.path.join(os.path.dirname(__file__), 'tracker_db')
+
+# Concurrency mode is for several processes writing to the same database (TRACKER_CONCURRENT=1).
+# It switches the database to WAL journaling so readers are not blocked by a writer.
+concurrent_mode = os.environ.get("TRACKER_CONCURRENT") == "1"
+
+# Seconds SQLite keeps retrying a locked database before giving up, and how often begin_write()
+# retries (with exponential backoff) after that.
+busy_timeout = 30
+write_retries = 8
+retry_delay = 0.05
+
+# In-memory mode (TRACKER_IN_MEMORY=1) loads the database into memory and works there, copying it
+# back to the file (a checkpoint) every checkpoint_seconds, after checkpoint_changes committed
+# writes, and on exit. Together they are the durability window: a crash loses at most that much.
+in_memory_mode = os.environ.get("TRACKER_IN_MEMORY") == "1"
+checkpoint_seconds = float(os.environ.get("TRACKER_CHECKPOINT_SECONDS") or 30)
+checkpoint_changes = int(os.environ.get("TRACKER_CHECKPOINT_CHANGES") or 100)
+
+
+def create_connection(db_file, concurrent=False, check_same_thread=True):
+    """Connects to the budget database.
+    :param bool concurrent: Switches on WAL journaling for use by several processes at once
+    :param bool check_same_thread: False lets a connection pool hand the connection to other threads
+    :param db: Database object, instrumented when query metrics are switched on (TRACKER_METRICS=1)
+    :param cursor: Cursor object
+    :raises Exception: Raises error when unable to connect
+    :returns: Active database connection and cursor
+    """
+
+    factory = tracker_metrics.InstrumentedConnection if tracker_metrics.registry.enabled else sqlite3.Connection
+    db = sqlite3.connect(db_file, timeout=busy_timeout, check_same_thread=check_same_thread, factory=factory)
+    cursor = db.cursor()
+
+    if concurrent:
+        # WAL lets readers carry on while one writer commits. synchronous=NORMAL is
+        # safe in WAL mode and avoids an fsync on every commit.
+        cursor.execute("PRAGMA journal_mode = WAL")
+        cursor.execute("PRAGMA synchronous = NORMAL")
+
+    return db, cursor
+
+
+def begin_write(db, cursor):
+    """ Starts a write transaction that holds the database write lock until commit or rollback.
+    Reads made after this (e.g. the next free id) cannot be changed by another process before
+    the commit, which keeps id allocation and read-modify-write updates atomic.
+    :param float delay: Current wait before retrying, doubled after every failed attempt
+    :raises sqlite3.OperationalError: Raised when the database stays locked after all retries
+    :returns: Open write transaction on 'db'
+    """
+
+    delay = retry_delay
+
+    for attempt in range(write_retries):
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            return
+
+        except sqlite3.OperationalError as error_msg:
+            if "locked" not in str(error_msg) or attempt == write_retries - 1:
+                raise
+            # Random jitter stops waiting processes from retrying in lock-step
+            time.sleep(delay + random.uniform(0, delay))
+            delay *= 2
+
+
+##############################################################################################################
+# MONEY
+
+@functools.total_ordering
+class Money:
+    """ An exact amount of money, held as a whole number of cents.
+    Amounts are stored in the database as INTEGER cents, so SQLite adds them up exactly with sum()
+    and they only become rands (with two decimals) when they are shown.
+    :param int cents: Amount in cents
+    """
+
+    __slots__ = ("cents",)
+
+    def __init__(self, cents=0):
+        self.cents = int(cents)
+
+    @classmethod
+    def parse(cls, value):
+        """ Converts rands given as text, an int, a float or a Decimal into Money, rounding half up to the cent.
+        :raises ValueError: Raised when the value is not a number
+        :returns: Money
+        """
+
+        if isinstance(value, Money):
+            return value
+
+        try:
+            # repr() gives the shortest text that reads back as the same float, so 0.1 becomes exactly 0.10
+            amount = Decimal(repr(value) if isinstance(value, float) else value)
+        except (InvalidOperation, TypeError):
+            raise ValueError(f"{value!r} is not an amount of money.")
+        if not amount.is_finite():
+            raise ValueError(f"{value!r} is not an amount of money.")
+
+        return cls(int((amount * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP)))
+
+    def to_decimal(self):
+        return Decimal(self.cents).scaleb(-2)
+
+    def __str__(self):
+        sign = "-" if self.cents < 0 else ""
+        rands, cents = divmod(abs(self.cents), 100)
+        return f"{sign}{rands}.{cents:02d}"
+
+    def __repr__(self):
+        return f"Money('{self}')"
+
+    def __format__(self, format_spec):
+        return format(self.to_decimal(), format_spec) if format_spec else str(self)
+
+    def __float__(self):
+        return self.cents / 100
+
+    def __bool__(self):
+        return self.cents != 0
+
+    def __hash__(self):
+        return hash(self.to_decimal())
+
+    def compared(self, other):
+        """ Returns (own value, other value) in comparable form, or None when 'other' is not a number. """
+
+        if isinstance(other, Money):
+            return self.cents, other.cents
+        if isinstance(other, (int, Decimal)):
+            return self.to_decimal(), Decimal(other)
+        if isinstance(other, float):
+            return self.to_decimal(), Decimal(repr(other))
+        return None
+
+    def __eq__(self, other):
+        values = self.compared(other)
+        return NotImplemented if values is None else values[0] == values[1]
+
+    def __lt__(self, other):
+        values = self.compared(other)
+        return NotImplemented if values is None else values[0] < values[1]
+
+    def __add__(self, other):
+        if isinstance(other, Money):
+            return Money(self.cents + other.cents)
+        # sum() starts from 0
+        return self if other == 0 and isinstance(other, int) else NotImplemented
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return Money(self.cents - other.cents) if isinstance(other, Money) else NotImplemented
+
+    def __neg__(self):
+        return Money(-self.cents)
+
+    def __abs__(self):
+        return Money(abs(self.cents))
+
+
+# Money is written to the database as its integer cents
+sqlite3.register_adapter(Money, lambda money: money.cents)
+
+
+##############################################################################################################
+# SCHEMA MIGRATIONS
+
+""" The schema is versioned with SQLite's user_version pragma. Each migration runs once, in order,
+inside its own transaction together with the version bump, so a database is never left half
+migrated. Databases created before migrations existed already have the tables from the first two
+migrations, which is why those still use IF NOT EXISTS.
+"""
+
+# Set to True before the category index migration first runs to treat 'Food' and 'food' as the
+# same category. Existing databases keep the collation their index was created with.
+case_insensitive_categories = False
+
+def migration_create_tables(cursor):
+    """ Migration 1: creates the 'expenses' and 'incomes' tables with a 'None' placeholder row.
+    :param list initial_data: Dummy-data to initialise table
+    :returns: Expense and income tables created in the database
+    """
+
+    for table_name in ("expenses", "incomes"):
+        cursor.execute(f'''CREATE TABLE IF NOT EXISTS {table_name}(id INTEGER PRIMARY KEY, category TEXT, actual REAL, budget REAL)''')
+        initial_data = [[1,"None", 0, 0]]
+
+        # https://stackoverflow.com/questions/29721656/most-efficient-way-to-do-a-sql-insert-if-not-exists
+        # Accessed 29 Sep 2023, How to ignore if data already exists. 
+        cursor.executemany(f'''INSERT OR IGNORE INTO {table_name}(id, category, actual, budget) VALUES(?,?,?,?)''',initial_data)
+
+
+def migration_create_ledgers(cursor):
+    """ Migration 2: creates the transaction ledgers 'expenses_ledger' and 'incomes_ledger'.
+    Every ledger row is one dated transaction against a category. The 'actual' column of the
+    category is a running total of its ledger rows, kept up to date by triggers on insert, update
+    and delete, so summaries read one precomputed value per category instead of every transaction.
+    When a ledger is first created, existing actuals are carried over as opening balances.
+    :param str ledger_name: Name of the ledger table for the category table
+    :param bool ledger_exists: Indicates the ledger was created before and needs no opening balances
+    :returns: Ledger tables and triggers created in the database
+    """
+
+    for table_name in ("expenses", "incomes"):
+        ledger_name = f"{table_name}_ledger"
+        cursor.execute("SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name = ?", (ledger_name,))
+        ledger_exists = cursor.fetchone()[0] > 0
+
+        cursor.execute(f'''CREATE TABLE IF NOT EXISTS {ledger_name}(id INTEGER PRIMARY KEY, category_id INTEGER NOT NULL,
+                           date TEXT NOT NULL, amount REAL NOT NULL, description TEXT)''')
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {ledger_name}_category_idx ON {ledger_name}(category_id, date)")
+
+        if not ledger_exists:
+            # Opening balances are added before the triggers exist so actuals are not counted twice
+            cursor.execute(f'''INSERT INTO {ledger_name}(category_id, date, amount, description)
+                               SELECT id, date('now'), actual, 'Opening balance' FROM {table_name} WHERE actual != 0''')
+
+        cursor.execute(f'''CREATE TRIGGER IF NOT EXISTS {ledger_name}_insert AFTER INSERT ON {ledger_name}
+                           BEGIN
+                               UPDATE {table_name} SET actual = round(actual + NEW.amount, 2) WHERE id = NEW.category_id;
+                           END''')
+        cursor.execute(f'''CREATE TRIGGER IF NOT EXISTS {ledger_name}_delete AFTER DELETE ON {ledger_name}
+                           BEGIN
+                               UPDATE {table_name} SET actual = round(actual - OLD.amount, 2) WHERE id = OLD.category_id;
+                           END''')
+        cursor.execute(f'''CREATE TRIGGER IF NOT EXISTS {ledger_name}_update AFTER UPDATE OF amount, category_id ON {ledger_name}
+                           BEGIN
+                               UPDATE {table_name} SET actual = round(actual - OLD.amount, 2) WHERE id = OLD.category_id;
+                               UPDATE {table_name} SET actual = round(actual + NEW.amount, 2) WHERE id = NEW.category_id;
+                           END''')
+        # Removing a category removes its history with it
+        cursor.execute(f'''CREATE TRIGGER IF NOT EXISTS {table_name}_delete_ledger AFTER DELETE ON {table_name}
+                           BEGIN
+                               DELETE FROM {ledger_name} WHERE category_id = OLD.id;
+                           END''')
+
+
+def migration_unique_categories(cursor):
+    """ Migration 3: adds a unique index on 'category' so lookups and duplicate checks are index seeks.
+    Duplicate categories that slipped in before are merged into the oldest row first: their
+    transactions move across (the ledger trigger moves the amounts) and their budgets are added up.
+    :param str collation: NOCASE when case_insensitive_categories is set, otherwise BINARY
+    :param str keep_ids: Query for the id kept for each distinct category
+    :returns: Unique category indexes created in the database
+    """
+
+    collation = "NOCASE" if case_insensitive_categories else "BINARY"
+
+    for table_name in ("expenses", "incomes"):
+        keep_ids = f"SELECT min(id) FROM {table_name} GROUP BY category COLLATE {collation}"
+
+        cursor.execute(f'''UPDATE {table_name}_ledger
+                           SET category_id = (SELECT min(keep.id) FROM {table_name} keep, {table_name} dup
+                                              WHERE dup.id = {table_name}_ledger.category_id
+                                              AND keep.category = dup.category COLLATE {collation})
+                           WHERE category_id NOT IN ({keep_ids})''')
+        cursor.execute(f'''UPDATE {table_name}
+                           SET budget = (SELECT round(Total(dup.budget), 2) FROM {table_name} dup
+                                         WHERE dup.category = {table_name}.category COLLATE {collation})
+                           WHERE id IN ({keep_ids})''')
+        cursor.execute(f"DELETE FROM {table_name} WHERE id NOT IN ({keep_ids})")
+        cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {table_name}_category_idx ON {table_name}(category COLLATE {collation})")
+
+
+def migration_create_periods(cursor):
+    """ Migration 4: adds monthly periods. '<table>_periods' holds the actual and budget of every
+    category per month ('YYYY-MM'), keyed (period, category_id) so month and range rollups are
+    index range scans that never touch other periods. Triggers keep it in step with the ledger,
+    and give each new period row the category's current budget. Changing a category's budget also
+    sets it for the current month. 'opened_periods' records the months every category has a row
+    in (see open_period()). Existing transactions are rolled up by month, and every month from the
+    first transaction to now is opened with the current budgets.
+    :param str periods_name: Name of the periods table for the category table
+    :param str first_period: Month of the earliest transaction, or the current month
+    :param str this_month: SQL expression for the current month
+    :returns: Period tables and triggers created in the database
+    """
+
+    this_month = "strftime('%Y-%m', 'now', 'localtime')"
+
+    for table_name in ("expenses", "incomes"):
+        ledger_name = f"{table_name}_ledger"
+        periods_name = f"{table_name}_periods"
+
+        cursor.execute(f'''CREATE TABLE {periods_name}(period TEXT NOT NULL, category_id INTEGER NOT NULL,
+                           actual REAL NOT NULL DEFAULT 0, budget REAL NOT NULL DEFAULT 0,
+                           PRIMARY KEY (period, category_id))''')
+        cursor.execute(f'''INSERT INTO {periods_name}(period, category_id, actual, budget)
+                           SELECT substr(l.date, 1, 7), l.category_id, round(Total(l.amount), 2), t.budget
+                           FROM {ledger_name} l JOIN {table_name} t ON t.id = l.category_id
+                           GROUP BY substr(l.date, 1, 7), l.category_id''')
+
+        cursor.execute(f'''CREATE TRIGGER {ledger_name}_insert_period AFTER INSERT ON {ledger_name}
+                           BEGIN
+                               INSERT INTO {periods_name}(period, category_id, actual, budget)
+                               VALUES(substr(NEW.date, 1, 7), NEW.category_id, NEW.amount,
+                                      coalesce((SELECT budget FROM {table_name} WHERE id = NEW.category_id), 0))
+                               ON CONFLICT(period, category_id) DO UPDATE SET actual = round(actual + excluded.actual, 2);
+                           END''')
+        cursor.execute(f'''CREATE TRIGGER {ledger_name}_delete_period AFTER DELETE ON {ledger_name}
+                           BEGIN
+                               UPDATE {periods_name} SET actual = round(actual - OLD.amount, 2)
+                               WHERE period = substr(OLD.date, 1, 7) AND category_id = OLD.category_id;
+                           END''')
+        cursor.execute(f'''CREATE TRIGGER {ledger_name}_update_period AFTER UPDATE OF amount, category_id, date ON {ledger_name}
+                           BEGIN
+                               UPDATE {periods_name} SET actual = round(actual - OLD.amount, 2)
+                               WHERE period = substr(OLD.date, 1, 7) AND category_id = OLD.category_id;
+                               INSERT INTO {periods_name}(period, category_id, actual, budget)
+                               VALUES(substr(NEW.date, 1, 7), NEW.category_id, NEW.amount,
+                                      coalesce((SELECT budget FROM {table_name} WHERE id = NEW.category_id), 0))
+                               ON CONFLICT(period, category_id) DO UPDATE SET actual = round(actual + excluded.actual, 2);
+                           END''')
+        cursor.execute(f'''CREATE TRIGGER {table_name}_insert_period AFTER INSERT ON {table_name}
+                           BEGIN
+                               INSERT OR IGNORE INTO {periods_name}(period, category_id, actual, budget)
+                               VALUES({this_month}, NEW.id, 0, NEW.budget);
+                           END''')
+        cursor.execute(f'''CREATE TRIGGER {table_name}_budget_period AFTER UPDATE OF budget ON {table_name}
+                           BEGIN
+                               INSERT INTO {periods_name}(period, category_id, actual, budget)
+                               VALUES({this_month}, NEW.id, 0, NEW.budget)
+                               ON CONFLICT(period, category_id) DO UPDATE SET budget = excluded.budget;
+                           END''')
+        cursor.execute(f'''CREATE TRIGGER {table_name}_delete_periods AFTER DELETE ON {table_name}
+                           BEGIN
+                               DELETE FROM {periods_name} WHERE category_id = OLD.id;
+                           END''')
+
+    cursor.execute("CREATE TABLE opened_periods(period TEXT PRIMARY KEY) WITHOUT ROWID")
+    cursor.execute('''SELECT min(substr(date, 1, 7)) FROM (SELECT date FROM expenses_ledger UNION ALL
+                                                       SELECT date FROM incomes_ledger)''')
+    current_period = date.today().strftime("%Y-%m")
+    first_period = min(cursor.fetchone()[0] or current_period, current_period)
+    open_period(cursor, first_period)
+    open_period(cursor, current_period)
+
+
+def create_money_triggers(cursor, table_name):
+    """ Creates the triggers that keep a category table's actuals and monthly periods in step with
+    its ledger, using integer cents. Used by migration 5, which replaces the REAL-valued triggers
+    of migrations 2 and 4.
+    :param str this_month: SQL expression for the current month
+    :returns: Ledger, period and category triggers created in the database
+    """
+
+    ledger_name = f"{table_name}_ledger"
+    periods_name = f"{table_name}_periods"
+    this_month = "strftime('%Y-%m', 'now', 'localtime')"
+    add_to_period = f'''INSERT INTO {periods_name}(period, category_id, actual, budget)
+                         VALUES(substr(NEW.date, 1, 7), NEW.category_id, NEW.amount,
+                                coalesce((SELECT budget FROM {table_name} WHERE id = NEW.category_id), 0))
+                         ON CONFLICT(period, category_id) DO UPDATE SET actual = actual + excluded.actual;'''
+    remove_from_period = f'''UPDATE {periods_name} SET actual = actual - OLD.amount
+                              WHERE period = substr(OLD.date, 1, 7) AND category_id = OLD.category_id;'''
+
+    cursor.execute(f'''CREATE TRIGGER {ledger_name}_insert AFTER INSERT ON {ledger_name}
+                       BEGIN
+                           UPDATE {table_name} SET actual = actual + NEW.amount WHERE id = NEW.category_id;
+                           {add_to_period}
+                       END''')
+    cursor.execute(f'''CREATE TRIGGER {ledger_name}_delete AFTER DELETE ON {ledger_name}
+                       BEGIN
+                           UPDATE {table_name} SET actual = actual - OLD.amount WHERE id = OLD.category_id;
+                           {remove_from_period}
+                       END''')
+    cursor.execute(f'''CREATE TRIGGER {ledger_name}_update AFTER UPDATE OF amount, category_id, date ON {ledger_name}
+                       BEGIN
+                           UPDATE {table_name} SET actual = actual - OLD.amount WHERE id = OLD.category_id;
+                           UPDATE {table_name} SET actual = actual + NEW.amount WHERE id = NEW.category_id;
+                           {remove_from_period}
+                           {add_to_period}
+                       END''')
+    cursor.execute(f'''CREATE TRIGGER {table_name}_insert_period AFTER INSERT ON {table_name}
+                       BEGIN
+                           INSERT OR IGNORE INTO {periods_name}(period, category_id, actual, budget)
+                           VALUES({this_month}, NEW.id, 0, NEW.budget);
+                       END''')
+    cursor.execute(f'''CREATE TRIGGER {table_name}_budget_period AFTER UPDATE OF budget ON {table_name}
+                       BEGIN
+                           INSERT INTO {periods_name}(period, category_id, actual, budget)
+                           VALUES({this_month}, NEW.id, 0, NEW.budget)
+                           ON CONFLICT(period, category_id) DO UPDATE SET budget = excluded.budget;
+                       END''')
+    # Removing a category removes its history with it
+    cursor.execute(f'''CREATE TRIGGER {table_name}_delete_ledger AFTER DELETE ON {table_name}
+                       BEGIN
+                           DELETE FROM {ledger_name} WHERE category_id = OLD.id;
+                           DELETE FROM {periods_name} WHERE category_id = OLD.id;
+                       END''')
+
+
+def migration_integer_cents(cursor):
+    """ Migration 5: stores money as INTEGER cents instead of REAL rands, so totals are exact
+    integer sums and each amount takes 1-8 bytes instead of 8. Each table is rebuilt with the new
+    column types (periods as a WITHOUT ROWID table, as it is only ever read by its key), its
+    indexes are recreated and the triggers are replaced by integer versions.
+    :param dict rebuilds: New definition and converting SELECT per table
+    :param list index_sql: Definitions of the indexes on the table being rebuilt
+    :returns: Money columns converted to cents in the database
+    """
+
+    cents = "CAST(round(coalesce({}, 0) * 100) AS INTEGER)"
+
+    for table_name in ("expenses", "incomes"):
+        ledger_name = f"{table_name}_ledger"
+        periods_name = f"{table_name}_periods"
+        rebuilds = {
+            table_name: ("(id INTEGER PRIMARY KEY, category TEXT, actual INTEGER NOT NULL DEFAULT 0, budget INTEGER NOT NULL DEFAULT 0)",
+                         f"SELECT id, category, {cents.format('actual')}, {cents.format('budget')} FROM {table_name}"),
+            ledger_name: ("(id INTEGER PRIMARY KEY, category_id INTEGER NOT NULL, date TEXT NOT NULL, amount INTEGER NOT NULL, description TEXT)",
+                          f"SELECT id, category_id, date, {cents.format('amount')}, description FROM {ledger_name}"),
+            periods_name: ("(period TEXT NOT NULL, category_id INTEGER NOT NULL, actual INTEGER NOT NULL DEFAULT 0, "
+                           "budget INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (period, category_id)) WITHOUT ROWID",
+                           f"SELECT period, category_id, {cents.format('actual')}, {cents.format('budget')} FROM {periods_name}"),
+        }
+
+        # The old triggers would fire on the rebuilt tables with REAL arithmetic, so they go first
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name IN (?, ?, ?)",
+                       (table_name, ledger_name, periods_name))
+        for (trigger_name,) in cursor.fetchall():
+            cursor.execute(f"DROP TRIGGER {trigger_name}")
+
+        for name, (definition, select) in rebuilds.items():
+            cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (name,))
+            index_sql = [row[0] for row in cursor.fetchall()]
+
+            cursor.execute(f"CREATE TABLE {name}_cents{definition}")
+            cursor.execute(f"INSERT INTO {name}_cents {select}")
+            cursor.execute(f"DROP TABLE {name}")
+            cursor.execute(f"ALTER TABLE {name}_cents RENAME TO {name}")
+            for sql in index_sql:
+                cursor.execute(sql)
+
+        create_money_triggers(cursor, table_name)
+
+
+def create_tree_triggers(cursor, table_name):
+    """ Creates the triggers that keep a category table's closure table and subtree rollups in step
+    with its categories. Inserting a category links it below its parent's ancestors, changing an
+    actual or budget adds the difference to the rollup of every ancestor (one closure-table seek),
+    moving a category relinks its whole subtree and moves its rollup across, and removing a
+    category first hands its sub-categories to its own parent.
+    :param str subtree_total: SQL for a rollup column of the category being moved
+    :returns: Closure and rollup triggers created in the database
+    """
+
+    tree_name = f"{table_name}_tree"
+    rollups_name = f"{table_name}_rollups"
+    ancestors = f"SELECT ancestor_id FROM {tree_name} WHERE descendant_id = NEW.id AND depth > 0"
+    subtree_total = f"(SELECT {{0}} FROM {rollups_name} WHERE category_id = NEW.id)"
+    check_parent = f'''SELECT RAISE(ABORT, 'The parent category does not exist.')
+                       WHERE NEW.parent_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM {table_name} WHERE id = NEW.parent_id);'''
+
+    cursor.execute(f'''CREATE TRIGGER {table_name}_check_parent BEFORE INSERT ON {table_name}
+                       BEGIN
+                           {check_parent}
+                       END''')
+    # INSERT OR REPLACE (the 'None' placeholder) replaces the row without firing delete triggers,
+    # so the category's own tree and rollup rows are replaced too
+    cursor.execute(f'''CREATE TRIGGER {table_name}_insert_tree AFTER INSERT ON {table_name}
+                       BEGIN
+                           INSERT OR REPLACE INTO {tree_name}(ancestor_id, descendant_id, depth) VALUES(NEW.id, NEW.id, 0);
+                           INSERT INTO {tree_name}(ancestor_id, descendant_id, depth)
+                           SELECT ancestor_id, NEW.id, depth + 1 FROM {tree_name} WHERE descendant_id = NEW.parent_id;
+                           INSERT OR REPLACE INTO {rollups_name}(category_id, actual, budget) VALUES(NEW.id, NEW.actual, NEW.budget);
+                           UPDATE {rollups_name} SET actual = actual + NEW.actual, budget = budget + NEW.budget
+                           WHERE category_id IN ({ancestors});
+                       END''')
+    cursor.execute(f'''CREATE TRIGGER {table_name}_rollup AFTER UPDATE OF actual, budget ON {table_name}
+                       WHEN NEW.actual != OLD.actual OR NEW.budget != OLD.budget
+                       BEGIN
+                           UPDATE {rollups_name} SET actual = actual + NEW.actual - OLD.actual, budget = budget + NEW.budget - OLD.budget
+                           WHERE category_id IN (SELECT ancestor_id FROM {tree_name} WHERE descendant_id = NEW.id);
+                       END''')
+    cursor.execute(f'''CREATE TRIGGER {table_name}_check_move BEFORE UPDATE OF parent_id ON {table_name}
+                       WHEN NEW.parent_id IS NOT OLD.parent_id
+                       BEGIN
+                           {check_parent}
+                           SELECT RAISE(ABORT, 'A category cannot be moved under itself or one of its sub-categories.')
+                           WHERE EXISTS (SELECT 1 FROM {tree_name} WHERE ancestor_id = NEW.id AND descendant_id = NEW.parent_id);
+                       END''')
+    cursor.execute(f'''CREATE TRIGGER {table_name}_move_tree AFTER UPDATE OF parent_id ON {table_name}
+                       WHEN NEW.parent_id IS NOT OLD.parent_id
+                       BEGIN
+                           UPDATE {rollups_name} SET actual = actual - {subtree_total.format("actual")},
+                                                    budget = budget - {subtree_total.format("budget")}
+                           WHERE category_id IN ({ancestors});
+                           DELETE FROM {tree_name}
+                           WHERE descendant_id IN (SELECT descendant_id FROM {tree_name} WHERE ancestor_id = NEW.id)
+                           AND ancestor_id IN ({ancestors});
+                           INSERT INTO {tree_name}(ancestor_id, descendant_id, depth)
+                           SELECT above.ancestor_id, below.descendant_id, above.depth + below.depth + 1
+                           FROM {tree_name} above, {tree_name} below
+                           WHERE above.descendant_id = NEW.parent_id AND below.ancestor_id = NEW.id;
+                           UPDATE {rollups_name} SET actual = actual + {subtree_total.format("actual")},
+                                                    budget = budget + {subtree_total.format("budget")}
+                           WHERE category_id IN ({ancestors});
+                       END''')
+    cursor.execute(f'''CREATE TRIGGER {table_name}_remove_from_tree BEFORE DELETE ON {table_name}
+                       BEGIN
+                           UPDATE {table_name} SET parent_id = OLD.parent_id WHERE parent_id = OLD.id;
+                       END''')
+    cursor.execute(f'''CREATE TRIGGER {table_name}_delete_tree AFTER DELETE ON {table_name}
+                       BEGIN
+                           UPDATE {rollups_name} SET actual = actual - OLD.actual, budget = budget - OLD.budget
+                           WHERE category_id IN (SELECT ancestor_id FROM {tree_name} WHERE descendant_id = OLD.id AND depth > 0);
+                           DELETE FROM {tree_name} WHERE descendant_id = OLD.id;
+                           DELETE FROM {rollups_name} WHERE category_id = OLD.id;
+                       END''')
+
+
+def migration_category_tree(cursor):
+    """ Migration 6: adds parent and sub-categories. 'parent_id' links a category to its parent
+    (NULL for top-level categories), '<table>_tree' is the closure table holding one row per
+    (ancestor, descendant) pair including each category with itself at depth 0, and
+    '<table>_rollups' holds the actual and budget of each category's whole subtree. Triggers keep
+    both up to date incrementally, so subtotals are read per node instead of walking the tree.
+    Existing categories become top-level categories.
+    :param str tree_name: Name of the closure table for the category table
+    :param str rollups_name: Name of the subtree totals table for the category table
+    :returns: Category hierarchy columns, tables and triggers created in the database
+    """
+
+    for table_name in ("expenses", "incomes"):
+        tree_name = f"{table_name}_tree"
+        rollups_name = f"{table_name}_rollups"
+
+        cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN parent_id INTEGER")
+        cursor.execute(f"CREATE INDEX {table_name}_parent_idx ON {table_name}(parent_id)")
+        cursor.execute(f'''CREATE TABLE {tree_name}(ancestor_id INTEGER NOT NULL, descendant_id INTEGER NOT NULL,
+                           depth INTEGER NOT NULL, PRIMARY KEY (ancestor_id, descendant_id)) WITHOUT ROWID''')
+        cursor.execute(f"CREATE INDEX {tree_name}_descendant_idx ON {tree_name}(descendant_id, depth)")
+        cursor.execute(f'''CREATE TABLE {rollups_name}(category_id INTEGER PRIMARY KEY, actual INTEGER NOT NULL DEFAULT 0,
+                           budget INTEGER NOT NULL DEFAULT 0)''')
+
+        cursor.execute(f"INSERT INTO {tree_name}(ancestor_id, descendant_id, depth) SELECT id, id, 0 FROM {table_name}")
+        cursor.execute(f"INSERT INTO {rollups_name}(category_id, actual, budget) SELECT id, actual, budget FROM {table_name}")
+
+        create_tree_triggers(cursor, table_name)
+
+
+def migration_category_search(cursor):
+    """ Migration 7: adds '<table>_search', an FTS5 index of category names using the trigram
+    tokenizer, so substring and near-match lookups are index queries however many categories
+    there are. Triggers keep it in step as categories are added, renamed and removed. SQLite
+    builds without FTS5 or its trigram tokenizer (3.34+) skip the index, and searches scan the
+    category names instead.
+    :returns: Category search indexes and triggers created in the database, when supported
+    """
+
+    try:
+        cursor.execute("CREATE VIRTUAL TABLE temp.search_probe USING fts5(category, tokenize='trigram')")
+        cursor.execute("DROP TABLE temp.search_probe")
+    except sqlite3.OperationalError:
+        return
+
+    for table_name in ("expenses", "incomes"):
+        search_name = f"{table_name}_search"
+
+        cursor.execute(f"CREATE VIRTUAL TABLE {search_name} USING fts5(category, tokenize='trigram')")
+        cursor.execute(f"INSERT INTO {search_name}(rowid, category) SELECT id, category FROM {table_name}")
+
+        # INSERT OR REPLACE (the 'None' placeholder) replaces the row without firing the delete trigger
+        cursor.execute(f'''CREATE TRIGGER {table_name}_insert_search AFTER INSERT ON {table_name}
+                           BEGIN
+                               DELETE FROM {search_name} WHERE rowid = NEW.id;
+                               INSERT INTO {search_name}(rowid, category) VALUES(NEW.id, NEW.category);
+                           END''')
+        cursor.execute(f'''CREATE TRIGGER {table_name}_rename_search AFTER UPDATE OF category ON {table_name}
+                           BEGIN
+                               UPDATE {search_name} SET category = NEW.category WHERE rowid = NEW.id;
+                           END''')
+        cursor.execute(f'''CREATE TRIGGER {table_name}_delete_search AFTER DELETE ON {table_name}
+                           BEGIN
+                               DELETE FROM {search_name} WHERE rowid = OLD.id;
+                           END''')
+
+
+def migration_change_journal(cursor):
+    """ Migration 8: adds the change journal. 'journal_txns' has one row per journaled transaction
+    (a change, an undo, a redo, a restore, or the compaction marker) and 'journal' the row
+    changes each made, in order, with the rows before and after as JSON. 'journal_snapshots'
+    lists the snapshot files taken for restores older than the journal.
+    :returns: Journal tables created in the database
+    """
+
+    cursor.execute('''CREATE TABLE journal_txns(id INTEGER PRIMARY KEY AUTOINCREMENT, at TEXT NOT NULL, operation TEXT NOT NULL,
+                       kind TEXT NOT NULL, target INTEGER)''')
+    cursor.execute("CREATE INDEX journal_txns_at_idx ON journal_txns(at)")
+    cursor.execute('''CREATE TABLE journal(id INTEGER PRIMARY KEY, txn_id INTEGER NOT NULL, table_name TEXT NOT NULL,
+                       action TEXT NOT NULL, before TEXT, after TEXT)''')
+    cursor.execute("CREATE INDEX journal_txn_idx ON journal(txn_id)")
+    cursor.execute("CREATE TABLE journal_snapshots(id INTEGER PRIMARY KEY, txn_id INTEGER NOT NULL, at TEXT NOT NULL, path TEXT NOT NULL)")
+
+
+# Thresholds (percent of budget) of the alert rules a new database starts with, for every expense
+# category and for total expenses. TRACKER_ALERT_PERCENTS=80,100 by default, empty for none.
+default_alert_percents = [int(percent) for percent in os.environ.get("TRACKER_ALERT_PERCENTS", "80,100").split(",") if percent.strip()]
+
+
+def create_alert_triggers(cursor, table_name):
+    """ Creates the triggers that evaluate alert rules as a category table changes. An alert is
+    raised when an actual rises (or a budget falls) across a rule's threshold, so each crossing
+    alerts once however many writes follow. 'alert_totals' keeps the table's total actual and
+    budget as a running sum for the 'total' rules.
+    :param str rising: SQL condition for a change that can cross a threshold upwards
+    :param str crossed: SQL condition for rule 'r' being crossed from OLD to NEW
+    :returns: Alert triggers created in the database
+    """
+
+    now = "strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')"
+    rising = "NEW.budget > 0 AND (NEW.actual > OLD.actual OR NEW.budget < OLD.budget)"
+    crossed = "NEW.actual * 100 >= NEW.budget * r.percent AND (OLD.budget <= 0 OR OLD.actual * 100 < OLD.budget * r.percent)"
+
+    cursor.execute(f'''CREATE TRIGGER {table_name}_alert AFTER UPDATE OF actual, budget ON {table_name}
+                       WHEN {rising}
+                       BEGIN
+                           INSERT INTO alerts(at, table_name, category_id, category, rule_id, percent, actual, budget)
+                           SELECT {now}, '{table_name}', NEW.id, NEW.category, min(r.id), r.percent, NEW.actual, NEW.budget
+                           FROM alert_rules r
+                           WHERE r.table_name = '{table_name}' AND (r.scope = 'every' OR (r.scope = 'category' AND r.category_id = NEW.id))
+                           AND {crossed}
+                           GROUP BY r.percent;
+                       END''')
+    cursor.execute(f'''CREATE TRIGGER {table_name}_alert_totals AFTER UPDATE OF actual, budget ON {table_name}
+                       WHEN NEW.actual != OLD.actual OR NEW.budget != OLD.budget
+                       BEGIN
+                           UPDATE alert_totals SET actual = actual + NEW.actual - OLD.actual, budget = budget + NEW.budget - OLD.budget
+                           WHERE table_name = '{table_name}';
+                       END''')
+    cursor.execute(f'''CREATE TRIGGER {table_name}_insert_alert_totals AFTER INSERT ON {table_name}
+                       BEGIN
+                           UPDATE alert_totals SET actual = actual + NEW.actual, budget = budget + NEW.budget
+                           WHERE table_name = '{table_name}';
+                       END''')
+    # A removed category's own rules go with it, as its id may be handed out again
+    cursor.execute(f'''CREATE TRIGGER {table_name}_delete_alert_totals AFTER DELETE ON {table_name}
+                       BEGIN
+                           UPDATE alert_totals SET actual = actual - OLD.actual, budget = budget - OLD.budget
+                           WHERE table_name = '{table_name}';
+                           DELETE FROM alert_rules WHERE table_name = '{table_name}' AND category_id = OLD.id;
+                       END''')
+    cursor.execute(f'''CREATE TRIGGER {table_name}_total_alert AFTER UPDATE ON alert_totals
+                       WHEN NEW.table_name = '{table_name}' AND {rising}
+                       BEGIN
+                           INSERT INTO alerts(at, table_name, category_id, category, rule_id, percent, actual, budget)
+                           SELECT {now}, '{table_name}', NULL, NULL, min(r.id), r.percent, NEW.actual, NEW.budget
+                           FROM alert_rules r
+                           WHERE r.table_name = '{table_name}' AND r.scope = 'total' AND {crossed}
+                           GROUP BY r.percent;
+                       END''')
+
+
+def migration_budget_alerts(cursor):
+    """ Migration 9: adds budget alerts. 'alert_rules' holds thresholds as a percent of budget,
+    for one category ('category'), for each category of a table ('every') or for the table's
+    total ('total'). Triggers evaluate them on every change to an actual or budget and append
+    the alerts raised to the 'alerts' outbox, which monitoring reads and acknowledges by id.
+    Expenses start with rules at default_alert_percents.
+    :returns: Alert tables, rules and triggers created in the database
+    """
+
+    cursor.execute('''CREATE TABLE alert_rules(id INTEGER PRIMARY KEY, table_name TEXT NOT NULL,
+                       scope TEXT NOT NULL CHECK (scope IN ('category', 'every', 'total')), category_id INTEGER,
+                       percent INTEGER NOT NULL CHECK (percent > 0))''')
+    cursor.execute("CREATE UNIQUE INDEX alert_rules_idx ON alert_rules(table_name, scope, coalesce(category_id, 0), percent)")
+    # Ids are never reused, so a consumer's last seen id stays valid after acknowledged alerts are deleted
+    cursor.execute('''CREATE TABLE alerts(id INTEGER PRIMARY KEY AUTOINCREMENT, at TEXT NOT NULL, table_name TEXT NOT NULL,
+                       category_id INTEGER, category TEXT, rule_id INTEGER, percent INTEGER NOT NULL,
+                       actual INTEGER NOT NULL, budget INTEGER NOT NULL)''')
+    cursor.execute("CREATE TABLE alert_totals(table_name TEXT PRIMARY KEY, actual INTEGER NOT NULL, budget INTEGER NOT NULL)")
+
+    for table_name in ("expenses", "incomes"):
+        cursor.execute(f"INSERT INTO alert_totals(table_name, actual, budget) SELECT ?, coalesce(sum(actual), 0), coalesce(sum(budget), 0) FROM {table_name}",
+                       (table_name,))
+        create_alert_triggers(cursor, table_name)
+
+    cursor.executemany("INSERT INTO alert_rules(table_name, scope, percent) VALUES('expenses', ?, ?)",
+                       [(scope, percent) for scope in ("every", "total") for percent in default_alert_percents])
+
+
+def migration_actual_index(cursor):
+    """ Migration 10: indexes categories by actual, so the top-N view reads its page straight off
+    the index (largest first, with the id as tie-breaker) instead of sorting the whole table.
+    :returns: Actual indexes created in the database
+    """
+
+    for table_name in ("expenses", "incomes"):
+        cursor.execute(f"CREATE INDEX {table_name}_actual_idx ON {table_name}(actual)")
+
+
+# Ordered list of (version, description, migration function). Append new migrations at the end.
+migrations = [
+    (1, "Create expense and income tables", migration_create_tables),
+    (2, "Create transaction ledgers", migration_create_ledgers),
+    (3, "Add unique category indexes", migration_unique_categories),
+    (4, "Add monthly periods", migration_create_periods),
+    (5, "Store money as integer cents", migration_integer_cents),
+    (6, "Add category hierarchy", migration_category_tree),
+    (7, "Add category search index", migration_category_search),
+    (8, "Add change journal", migration_change_journal),
+    (9, "Add budget alerts", migration_budget_alerts),
+    (10, "Add actual indexes", migration_actual_index),
+]
+
+
+def migrate_database(db, cursor):
+    """ Brings the database schema up to the latest version by running pending migrations in order.
+    :param int current_version: Schema version stored in the database
+    :raises RuntimeError: Raised when a migration fails, after db rollback
+    :returns: Database at the latest schema version and commits db after each migration
+    """
+
+    # Up-to-date databases (the usual case) need no write lock
+    cursor.execute("PRAGMA user_version")
+    if cursor.fetchone()[0] >= migrations[-1][0]:
+        return
+
+    for version, description, migration in migrations:
+        try:
+            # DDL does not open a transaction on its own, so start one to keep the migration atomic.
+            # The version is read inside the write transaction in case another process migrated first.
+            begin_write(db, cursor)
+            cursor.execute("PRAGMA user_version")
+            current_version = cursor.fetchone()[0]
+
+            if version <= current_version:
+                db.rollback()
+                continue
+
+            migration(cursor)
+            cursor.execute(f"PRAGMA user_version = {version}")
+            db.commit()
+
+        except Exception as error_msg:
+            db.rollback()
+            raise RuntimeError(f"Unable to upgrade database to version {version} ({description}): {error_msg}") from error_msg
+
+
+def detect_category_collation(cursor):
+    """ Finds the collation the unique category index was created with.
+    :param str index_sql: Definition of the expenses category index
+    :returns: The WHERE clause to use for category lookups so they match the index
+    """
+
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = 'expenses_category_idx'")
+    index_sql = (cursor.fetchone() or [""])[0]
+
+    return "category = ? COLLATE NOCASE" if "NOCASE" in index_sql.upper() else "category = ?"
+
+
+def detect_search_index(cursor):
+    """ Checks whether the category search index of migration 7 exists.
+    :returns: True when category searches can use the FTS5 trigram index
+    """
+
+    cursor.execute("SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name = 'expenses_search'")
+    return cursor.fetchone()[0] > 0
+
+
+def fts_phrase(text):
+    """ Quotes text as an FTS5 phrase, so punctuation in category names is matched literally. """
+
+    return '"' + text.replace('"', '""') + '"'
+
+
+##############################################################################################################
+# IMPORT FUNCTIONS
+
+# Number of statement rows written per transaction when importing. Larger chunks mean fewer
+# commits (and fsyncs), smaller chunks mean less work lost if a chunk fails.
+import_chunk_size = 10000
+
+# Header names recognised in bank-statement CSV files, in order of preference.
+csv_date_headers = ["date", "transaction date", "posting date", "posted"]
+csv_description_headers = ["description", "narrative", "details", "payee", "memo", "name"]
+csv_amount_headers = ["amount", "value", "transaction amount"]
+csv_debit_headers = ["debit", "debit amount", "withdrawal"]
+csv_credit_headers = ["credit", "credit amount", "deposit"]
+csv_category_headers = ["category"]
+
+# OFX files are SGML-like and do not always close their tags, so match one tag and its value at a time.
+ofx_tag_pattern = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+
+
+def parse_amount(text):
+    """ Converts an amount as written on a bank statement into Money.
+    :param str text: Amount text, e.g. 'R1 200.50', '-45.00' or '(45.00)'
+    :param bool negative: Indicates amount is shown in accounting brackets
+    :raises ValueError: Raised when the text does not contain a number
+    :returns: Amount as Money, negative for money leaving the account
+    """
+
+    text = text.strip()
+    negative = text.startswith("(") and text.endswith(")")
+    text = re.sub(r"[^0-9.\-]", "", text)
+    amount = Money.parse(text)
+
+    return -amount if negative else amount
+
+
+def find_column(header, names):
+    """ Finds the position of the first matching column name in a CSV header.
+    :param list header: Lower-case column names read from the CSV file
+    :param list names: Accepted names for the column, in order of preference
+    :returns: Column index, or None when the column is not present
+    """
+
+    for name in names:
+        if name in header:
+            return header.index(name)
+
+    return None
+
+
+def read_csv_statement(file_path):
+    """ Streams transactions from a bank-statement CSV file one row at a time.
+    The file needs a header row with a date and description column and either an amount
+    column or separate debit and credit columns. A category column is optional.
+    :param str file_path: Path to the CSV file
+    :param list header: Lower-case column names from the first row
+    :raises ValueError: Raised when the required columns cannot be found
+    :returns: Generator of (date, description, amount, category) tuples
+    """
+
+    with open(file_path, newline="", encoding="utf-8-sig") as csv_file:
+        reader = csv.reader(csv_file)
+        header = [column.strip().lower() for column in next(reader, [])]
+
+        date_col = find_column(header, csv_date_headers)
+        description_col = find_column(header, csv_description_headers)
+        amount_col = find_column(header, csv_amount_headers)
+        debit_col = find_column(header, csv_debit_headers)
+        credit_col = find_column(header, csv_credit_headers)
+        category_col = find_column(header, csv_category_headers)
+
+        if description_col is None or (amount_col is None and debit_col is None and credit_col is None):
+            raise ValueError(f"{file_path} needs a description column and an amount (or debit/credit) column.")
+
+        for row in reader:
+            if not any(row):
+                continue
+
+            if amount_col is not None:
+                amount = parse_amount(row[amount_col])
+            else:
+                # Debits leave the account, credits come in
+                debit = row[debit_col] if debit_col is not None else ""
+                credit = row[credit_col] if credit_col is not None else ""
+                amount = (parse_amount(credit) if credit.strip() else Money()) - (abs(parse_amount(debit)) if debit.strip() else Money())
+
+            yield (row[date_col].strip() if date_col is not None else "",
+                   row[description_col].strip(),
+                   amount,
+                   row[category_col].strip() if category_col is not None else "")
+
+
+def read_ofx_statement(file_path):
+    """ Streams transactions from an OFX (or QFX) bank statement one <STMTTRN> block at a time.
+    :param str file_path: Path to the OFX file
+    :param dict transaction: Tag values collected for the transaction being read
+    :returns: Generator of (date, description, amount, category) tuples
+    """
+
+    transaction = None
+
+    with open(file_path, encoding="utf-8", errors="replace") as ofx_file:
+        for line in ofx_file:
+            for closing, tag, value in ofx_tag_pattern.findall(line):
+                tag = tag.upper()
+
+                if tag == "STMTTRN":
+                    if closing and transaction is not None and "TRNAMT" in transaction:
+                        # DTPOSTED looks like 20231025120000.000[+2:SAST], keep the date part
+                        posted = transaction.get("DTPOSTED", "")
+                        posted = f"{posted[0:4]}-{posted[4:6]}-{posted[6:8]}" if len(posted) >= 8 else ""
+                        description = transaction.get("NAME") or transaction.get("MEMO") or ""
+                        yield posted, description, parse_amount(transaction["TRNAMT"]), ""
+                    transaction = None if closing else {}
+
+                elif transaction is not None and not closing and value.strip():
+                    transaction[tag] = value.strip()
+
+
+def read_statement(file_path):
+    """ Picks the CSV or OFX reader based on the file extension.
+    :param str file_path: Path to the statement file
+    :returns: Generator of (date, description, amount, category) tuples
+    """
+
+    if os.path.splitext(file_path)[1].lower() in (".ofx", ".qfx"):
+        return read_ofx_statement(file_path)
+
+    return read_csv_statement(file_path)
+
+
+def load_category_rules(rules_file):
+    """ Loads keyword to category mapping rules from a two-column CSV file (keyword, category).
+    :param str rules_file: Path to the rules file, or None for no rules
+    :returns: List of (lower-case keyword, category) tuples
+    """
+
+    rules = []
+
+    if rules_file:
+        with open(rules_file, newline="", encoding="utf-8-sig") as csv_file:
+            for row in csv.reader(csv_file):
+                if len(row) >= 2 and row[0].strip() and row[0].strip().lower() != "keyword":
+                    rules.append((row[0].strip().lower(), row[1].strip()))
+
+    return rules
+
+
+def normalise_date(text):
+    """ Converts a statement date into ISO format (YYYY-MM-DD) for the ledger.
+    :param str text: Date as written on the statement
+    :param list date_formats: Accepted date layouts, day-first before month-first
+    :returns: ISO date string, or today's date when the text cannot be read
+    """
+
+    date_formats = ["%Y-%m-%d", "%Y/%m/%d", "%d/%m/%Y", "%d-%m-%Y", "%d %b %Y", "%d %B %Y", "%Y%m%d"]
+
+    for date_format in date_formats:
+        try:
+            return datetime.strptime(text.strip(), date_format).date().isoformat()
+        except ValueError:
+            continue
+
+    return date.today().isoformat()
+
+
+def map_statement_rows(rows, category_rules):
+    """ Maps streamed statement rows to the table and category they should be added to.
+    Money leaving the account is an expense and money coming in is income. A category
+    column in the file wins, then the first matching keyword rule, then 'Uncategorised'.
+    :param rows: Iterable of (date, description, amount, category) tuples
+    :param list category_rules: List of (keyword, category) tuples
+    :returns: Generator of (table_name, category, amount, date, description) tuples
+    """
+
+    for row_date, description, amount, category in rows:
+        if amount == 0:
+            continue
+
+        if not category:
+            lower_description = description.lower()
+            category = next((rule_category for keyword, rule_category in category_rules
+                             if keyword in lower_description), "Uncategorised")
+
+        if amount < 0:
+            yield "expenses", category, -amount, normalise_date(row_date), description
+        else:
+            yield "incomes", category, amount, normalise_date(row_date), description
+
+
+##############################################################################################################
+# PERIOD FUNCTIONS
+
+period_pattern = re.compile(r"^\d{4}-(0[1-9]|1[0-2])$")
+
+
+def parse_period(text):
+    """ Checks a month is written as 'YYYY-MM'.
+    :raises ValueError: Raised when the text is not a valid month
+    :returns: The month
+    """
+
+    text = text.strip()
+    if not period_pattern.match(text):
+        raise ValueError(f"{text} is not a month (YYYY-MM).")
+
+    return text
+
+
+def shift_period(period, months):
+    """ Moves a 'YYYY-MM' month forwards or backwards by a number of months.
+    :returns: The shifted month
+    """
+
+    year, month = (int(part) for part in period.split("-"))
+    index = year * 12 + (month - 1) + months
+
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def open_period(cursor, period):
+    """ Opens a month: every category gets a period row carrying its current budget, so monthly
+    rollups see budgets even for categories with no transactions in it. The opened months always
+    form one unbroken run, so the months between 'period' and the run are opened too, with the
+    same budgets (budgets only change through writes, and a write opens its month first).
+    'opened_periods' records the months in the same transaction, so a month is opened once per
+    database and an opening that was rolled back is made again by the next write.
+    :param str period: Month as 'YYYY-MM', the current month or the month of an earlier transaction
+    :param list periods: Months to open
+    :returns: Period rows and 'opened_periods' entries created for the months not opened yet
+    """
+
+    cursor.execute("SELECT 1 FROM opened_periods WHERE period = ?", (period,))
+    if cursor.fetchone():
+        return
+
+    cursor.execute("SELECT min(period), max(period) FROM opened_periods")
+    first_opened, last_opened = cursor.fetchone()
+    periods = [period]
+    if last_opened and period > last_opened:
+        while shift_period(periods[0], -1) > last_opened:
+            periods.insert(0, shift_period(periods[0], -1))
+    elif first_opened and period < first_opened:
+        while shift_period(periods[-1], 1) < first_opened:
+            periods.append(shift_period(periods[-1], 1))
+
+    for table_name in ("expenses", "incomes"):
+        cursor.executemany(f'''INSERT OR IGNORE INTO {table_name}_periods(period, category_id, actual, budget)
+                              SELECT ?, id, 0, budget FROM {table_name}''', [(month,) for month in periods])
+    cursor.executemany("INSERT INTO opened_periods(period) VALUES(?)", [(month,) for month in periods])
+
+
+def open_past_periods(cursor, periods):
+    """ Opens the months of transactions dated before the first opened month, and the months up
+    to it, so back-dated transactions and imports leave no month without its budgets. Later
+    months are opened by the first write made in them.
+    :param set periods: Months of the ledger rows being written
+    :returns: Months before the first opened month opened
+    """
+
+    cursor.execute("SELECT min(period) FROM opened_periods")
+    first_opened = cursor.fetchone()[0]
+    earliest = min(periods, default=None)
+    if first_opened and earliest and earliest < first_opened:
+        open_period(cursor, earliest)
+
+
+def period_range(text, today=None):
+    """ Reads the months a summary should cover.
+    Accepts a month ('2023-10'), a range ('2023-01:2023-06'), a year ('2023') or 'ytd'.
+    :param date today: Date used for 'ytd', defaults to today
+    :raises ValueError: Raised when the text is not a month, range, year or 'ytd'
+    :returns: (first month, last month)
+    """
+
+    text = text.strip().lower()
+    today = today or date.today()
+
+    if text == "ytd":
+        return f"{today.year:04d}-01", today.strftime("%Y-%m")
+    if re.match(r"^\d{4}$", text):
+        return f"{text}-01", f"{text}-12"
+    if ":" in text:
+        start_period, end_period = (parse_period(part) for part in text.split(":", 1))
+        if start_period > end_period:
+            raise ValueError("The first month of a range must come before the last.")
+        return start_period, end_period
+
+    return parse_period(text), parse_period(text)
+
+
+##############################################################################################################
+# SUMMARY FUNCTIONS
+
+def summary_figures(total_income, budget_income, total_expenses, budget_expenses):
+    """ Works out the budget summary figures from income and expense totals.
+    :param Money income_variance: Difference between plan (budget) and actual for income
+    :param Money expense_variance: Difference between budget and actual for all expenses
+    :param Money actual_difference: The real difference between actual income and actual expenses
+    :param Money budget_difference: The difference between planned income and planned (budgeted) expenses
+    :param Money savings_variance: Total deviation from goal
+    :returns: Dictionary of summary figures
+    """
+
+    income_variance = total_income - budget_income
+    expense_variance = budget_expenses - total_expenses
+    actual_difference = total_income - total_expenses
+    budget_difference = budget_income - budget_expenses
+    savings_variance = actual_difference - budget_difference
+
+    return {"total_income": total_income, "budget_income": budget_income, "income_variance": income_variance,
+            "total_expenses": total_expenses, "budget_expenses": budget_expenses, "expense_variance": expense_variance,
+            "actual_difference": actual_difference, "budget_difference": budget_difference,
+            "savings_variance": savings_variance}
+
+
+##############################################################################################################
+# CHANGE JOURNAL
+
+""" Writes made through the Tracker append the rows they change to the journal, in the same
+transaction, so every committed change can be undone, redone, or rolled back to a point in
+time. Only source rows are journaled: categories (name, budget and parent), ledger transactions
+and monthly budgets. Actuals, period actuals and the tree, rollup and search tables follow from
+those through the triggers, both when a change is made and when it is undone. A statement import
+is one journal transaction recording the id ranges of the ledger rows it added, not the rows, and
+undoing it deletes those ranges.
+
+Undo, redo and restore are journaled transactions themselves, so the journal is append-only
+and a restore can be undone too. compact() keeps it bounded: it takes a snapshot file of the
+whole database with the backup API and drops journal transactions older than journal_days. It
+never runs as part of an edit; compact_if_due() runs it once snapshot_changes transactions
+have been journaled.
+Restores within the journal undo the transactions after the time given; older restores load the
+newest snapshot taken before it and redo the journaled transactions from there. Changes made with
+journaling switched off are not in the journal, so undo and restore cannot take them back.
+"""
+
+# TRACKER_JOURNAL=0 switches journaling off, e.g. for bulk loads.
+journal_enabled = os.environ.get("TRACKER_JOURNAL") != "0"
+
+# Days of journal kept by compact(), journaled transactions after which compact_if_due() compacts
+# (0 for never), and number of snapshot files kept.
+journal_days = float(os.environ.get("TRACKER_JOURNAL_DAYS") or 30)
+snapshot_changes = int(os.environ.get("TRACKER_SNAPSHOT_CHANGES") or 500)
+snapshots_kept = int(os.environ.get("TRACKER_SNAPSHOTS_KEPT") or 5)
+
+# Directory for snapshot files, by default '<database file>-snapshots' next to the database.
+snapshot_dir = os.environ.get("TRACKER_SNAPSHOT_DIR")
+
+# Journal timestamps are local times in this format, so they sort as text.
+timestamp_format = "%Y-%m-%d %H:%M:%S.%f"
+
+# Key and journaled columns per kind of table.
+journal_columns = {"category": (("id",), ("id", "category", "budget", "parent_id")),
+                   "ledger": (("id",), ("id", "category_id", "date", "amount", "description")),
+                   "periods": (("period", "category_id"), ("period", "category_id", "budget"))}
+
+
+def journal_kind(table_name):
+    """ Returns the kind of a journaled table: 'category', 'ledger' or 'periods'. """
+
+    for kind in ("ledger", "periods"):
+        if table_name.endswith(f"_{kind}"):
+            return kind
+    return "category"
+
+
+def parse_timestamp(text):
+    """ Reads a date ('YYYY-MM-DD') or date and time ('YYYY-MM-DD HH:MM[:SS]') as a journal timestamp.
+    :raises ValueError: Raised when the text is not a date or date and time
+    :returns: Timestamp in timestamp_format
+    """
+
+    try:
+        return datetime.fromisoformat(text.strip()).strftime(timestamp_format)
+    except ValueError:
+        raise ValueError(f"{text} is not a date (YYYY-MM-DD) or date and time (YYYY-MM-DD HH:MM).")
+
+
+def apply_change(cursor, table_name, action, before, after):
+    """ Applies one journal entry: inserts the 'after' rows, deletes the 'before' rows, or updates
+    rows from 'before' to 'after'. Category rows are inserted with a zero actual, as their ledger
+    rows bring it back, and monthly budgets are upserted, as ledger rows may have recreated the month.
+    Ledger rows dated before the first opened month open their months, as when they were recorded.
+    A 'delete_range' deletes the ledger rows of an id range with one statement. An 'insert_range'
+    holds no rows, so it is never applied here: see Tracker.range_rows().
+    :param str table_name: Journaled table
+    :param str action: 'insert', 'delete', 'update' or 'delete_range'
+    :param list before: Rows (dictionaries of journaled columns) before the change, or the
+                        {"first_id", "last_id"} id range of a 'delete_range'
+    :param list after: Rows after the change
+    """
+
+    kind = journal_kind(table_name)
+    key, columns = journal_columns[kind]
+    where = " AND ".join(f"{column} = ?" for column in key)
+
+    if action == "delete_range":
+        cursor.execute(f"DELETE FROM {table_name} WHERE id BETWEEN ? AND ?", (before["first_id"], before["last_id"]))
+
+    elif action == "delete":
+        cursor.executemany(f"DELETE FROM {table_name} WHERE {where}", [[row[column] for column in key] for row in before])
+
+    elif kind == "periods":
+        cursor.executemany(f'''INSERT INTO {table_name}(period, category_id, budget) VALUES(?,?,?)
+                              ON CONFLICT(period, category_id) DO UPDATE SET budget = excluded.budget''',
+                           [(row["period"], row["category_id"], row["budget"]) for row in after])
+
+    elif action == "update":
+        # Updates only journal the key and the columns they changed
+        for row in after:
+            changed = [column for column in row if column not in key]
+            cursor.execute(f"UPDATE {table_name} SET {', '.join(f'{column} = ?' for column in changed)} WHERE {where}",
+                           [row[column] for column in changed] + [row[column] for column in key])
+
+    else:
+        if kind == "ledger":
+            open_past_periods(cursor, {row["date"][:7] for row in after})
+        cursor.executemany(f"INSERT INTO {table_name}({', '.join(columns)}) VALUES({', '.join('?' * len(columns))})",
+                           [[row[column] for column in columns] for row in after])
+
+
+def inverse_change(action, before, after):
+    """ Returns the journal entry that undoes an entry, as (action, before, after). """
+
+    inverse = {"insert": "delete", "delete": "insert", "update": "update",
+               "insert_range": "delete_range", "delete_range": "insert_range"}
+    return inverse[action], after, before
+
+
+##############################################################################################################
+# TRACKER
+
+# Most names returned by Tracker.search_categories(), and most index candidates it re-ranks for near matches.
+search_limit = 10
+search_candidates = 200
+
+# Smallest similarity (0 to 1) for a near match that does not contain the search text.
+search_cutoff = 0.5
+
+# Categories per page of get_page(). Tables up to this size are shown whole (TRACKER_PAGE_SIZE).
+page_size = int(os.environ.get("TRACKER_PAGE_SIZE") or 50)
+
+
+class Tracker:
+    """ Budget operations on one tracker database, usable without the menu.
+    The connection is opened (and the schema migrated) the first time it is needed and then
+    reused for every call. Methods raise exceptions instead of printing, and each write method
+    commits its own transaction.
+
+    Totals and rendered views are cached in 'summary_cache'. Writes made through the tracker
+    clear the cache with invalidate_summary_cache(), and SQLite's data_version changes when
+    another connection commits, so the cache never serves totals older than the database.
+
+    In-memory mode copies the database into a ':memory:' connection when it opens, so commits
+    cost no disk writes, and checkpoints it back to the file with the backup API: from a timer
+    thread every 'checkpoint_seconds', after 'checkpoint_changes' commits, and on close(). Only
+    one process should use a database in this mode, as checkpoints overwrite the file.
+    :param str db_file: Path to the database file
+    :param bool concurrent: Switches on WAL journaling for use by several processes at once
+    :param bool check_same_thread: False when the tracker is shared by threads one at a time (e.g. a pool)
+    :param bool in_memory: Works on an in-memory copy of the database, see above
+    :param float checkpoint_seconds: Longest time committed changes stay in memory only
+    :param int checkpoint_changes: Most commits kept in memory only
+    :param bool journal: Records every write in the change journal (see CHANGE JOURNAL)
+    """
+
+    def __init__(self, db_file=db_file, concurrent=concurrent_mode, check_same_thread=True,
+                 in_memory=in_memory_mode, checkpoint_seconds=checkpoint_seconds, checkpoint_changes=checkpoint_changes,
+                 journal=journal_enabled):
+        self.db_file = db_file
+        self.concurrent = concurrent
+        self.check_same_thread = check_same_thread
+        self.in_memory = in_memory
+        self.checkpoint_seconds = checkpoint_seconds
+        self.checkpoint_changes = checkpoint_changes
+        self.journal_enabled = journal
+        self.alert_callbacks = []
+        self.alert_seen = 0
+        self.journal_operation = "write"
+        self.journal_txn = None
+        self.summary_cache = {}
+        self.category_match = "category = ?"
+        self.search_index = False
+        self.unsaved_changes = 0
+        self.checkpoint_error = None
+        self.memory_lock = threading.Lock()
+        self.holding_memory_lock = False
+        self._file_db = None
+        self._checkpoint_stop = None
+        self._checkpoint_thread = None
+        self._db = None
+        self._cursor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def db(self):
+        """ Database connection, opened on first use. """
+        if self._db is None:
+            self.connect()
+        return self._db
+
+    @property
+    def cursor(self):
+        """ Cursor on the database connection, opened on first use. """
+        if self._db is None:
+            self.connect()
+        return self._cursor
+
+    def connect(self):
+        """ Opens the connection, brings the schema up to date and reads the category collation.
+        :raises Exception: Raises error when unable to connect or migrate the database
+        :returns: Active database connection
+        """
+
+        if self.in_memory:
+            return self.connect_in_memory()
+
+        db, cursor = create_connection(self.db_file, self.concurrent, self.check_same_thread)
+        try:
+            migrate_database(db, cursor)
+            self.category_match = detect_category_collation(cursor)
+            self.search_index = detect_search_index(cursor)
+        except Exception:
+            db.close()
+            raise
+
+        self._db, self._cursor = db, cursor
+        return db
+
+    def connect_in_memory(self):
+        """ Migrates the database file, loads it into a ':memory:' connection with the backup API
+        and starts the checkpoint timer. The file connection stays open for checkpoints.
+        :raises Exception: Raises error when unable to open, migrate or load the database
+        :returns: Active in-memory database connection
+        """
+
+        # The timer thread checkpoints with both connections, so neither is tied to this thread
+        file_db, file_cursor = create_connection(self.db_file, False, False)
+        try:
+            migrate_database(file_db, file_cursor)
+            db, cursor = create_connection(":memory:", False, False)
+            file_db.backup(db)
+            self.category_match = detect_category_collation(cursor)
+            self.search_index = detect_search_index(cursor)
+        except Exception:
+            file_db.close()
+            raise
+
+        self._file_db = file_db
+        self._db, self._cursor = db, cursor
+        self.unsaved_changes = 0
+
+        self._checkpoint_stop = threading.Event()
+        self._checkpoint_thread = threading.Thread(target=self.checkpoint_timer, name="tracker-checkpoint", daemon=True)
+        self._checkpoint_thread.start()
+        return db
+
+    def checkpoint(self):
+        """ Copies the in-memory database to the file with the backup API, if anything changed.
+        Waits for an open write transaction to finish, so only committed states are saved.
+        :returns: True when a checkpoint was written
+        """
+
+        if not self.in_memory or self._db is None:
+            return False
+
+        with self.memory_lock:
+            if not self.unsaved_changes:
+                return False
+            self._db.backup(self._file_db)
+            self.unsaved_changes = 0
+
+        return True
+
+    def checkpoint_timer(self):
+        """ Checkpoints every checkpoint_seconds until close(). Runs in its own thread. A failed
+        checkpoint is kept in 'checkpoint_error' and retried on the next tick.
+        """
+
+        while not self._checkpoint_stop.wait(self.checkpoint_seconds):
+            try:
+                self.checkpoint()
+                self.checkpoint_error = None
+            except sqlite3.Error as error_msg:
+                self.checkpoint_error = error_msg
+
+    def close(self):
+        """ Closes the connection if it is open. The next call opens it again.
+        In in-memory mode unsaved changes are checkpointed first, then the timer is stopped.
+        :raises sqlite3.Error: Raised when the final checkpoint fails, leaving the connection open
+                               and the timer running so the changes are still saved later
+        """
+
+        if self._checkpoint_thread is not None:
+            self.checkpoint()
+            self._checkpoint_stop.set()
+            self._checkpoint_thread.join()
+            self._checkpoint_thread = None
+            self._file_db.close()
+            self._file_db = None
+
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+            self._cursor = None
+        self.summary_cache.clear()
+
+    def begin_write(self, operation="write"):
+        """ Starts a write transaction, see begin_write(), and opens the current month if no
+        write has yet (see open_period()).
+        In in-memory mode the transaction also holds memory_lock, so checkpoints never copy half a write.
+        :param str operation: Name the transaction is journaled under
+        """
+
+        db, cursor = self.db, self.cursor
+        if self.in_memory:
+            self.memory_lock.acquire()
+            self.holding_memory_lock = True
+
+        try:
+            begin_write(db, cursor)
+        except Exception:
+            self.release_memory_lock()
+            raise
+
+        self.journal_operation = operation
+        self.journal_txn = None
+
+        try:
+            open_period(cursor, date.today().strftime("%Y-%m"))
+        except Exception:
+            self.rollback()
+            raise
+
+    def release_memory_lock(self):
+        if self.holding_memory_lock:
+            self.holding_memory_lock = False
+            self.memory_lock.release()
+
+    def rollback(self):
+        """ Rolls back the open transaction. """
+
+        try:
+            self.db.rollback()
+        finally:
+            self.release_memory_lock()
+        self.journal_txn = None
+
+    def category_key(self, category):
+        """ Returns the form of a category name that the category index compares on, for in-memory lookups.
+        :param str category: Category name
+        :returns: Lower-case name when categories are case-insensitive, otherwise the name unchanged
+        """
+
+        return category.lower() if "NOCASE" in self.category_match else category
+
+    # SUMMARY ENGINE
+
+    def invalidate_summary_cache(self):
+        """ Empties the summary cache. Called after every committed write. """
+
+        self.summary_cache.clear()
+
+    def summary_cache_get(self, key):
+        """ Looks up a cached summary value, discarding the cache if another connection changed the database.
+        :param key: Cache key, e.g. ('totals', table_names) or ('view', table_name)
+        :param int data_version: SQLite's change counter for commits made by other connections
+        :returns: Cached value, or None when it has to be recomputed
+        """
+
+        self.cursor.execute("PRAGMA data_version")
+        data_version = self.cursor.fetchone()[0]
+
+        if self.summary_cache.get("data_version") != data_version:
+            self.summary_cache.clear()
+            self.summary_cache["data_version"] = data_version
+
+        return self.summary_cache.get(key)
+
+    def get_totals(self, table_names=("incomes", "expenses"), start_period=None, end_period=None):
+        """ Calculates total actual and budget for several tables in a single aggregate query.
+        With a period range the totals come from the monthly period tables, read as an index
+        range scan over just those months.
+        :param tuple table_names: Names of the tables to total
+        :param str start_period: First month ('YYYY-MM') to include, or None for all-time totals
+        :param str end_period: Last month to include, defaults to start_period
+        :param str query: One aggregate per table combined with UNION ALL, exact integer sums of cents
+        :returns: Dictionary of table name to (total actual, total budget) as Money
+        """
+
+        end_period = end_period or start_period
+        cache_key = ("totals", tuple(table_names), start_period, end_period)
+        totals = self.summary_cache_get(cache_key)
+
+        if totals is None:
+            if start_period:
+                query = " UNION ALL ".join(f"SELECT '{table_name}', coalesce(sum(actual), 0), coalesce(sum(budget), 0) FROM {table_name}_periods "
+                                           f"WHERE period BETWEEN ? AND ?" for table_name in table_names)
+                self.cursor.execute(query, (start_period, end_period) * len(table_names))
+            else:
+                query = " UNION ALL ".join(f"SELECT '{table_name}', coalesce(sum(actual), 0), coalesce(sum(budget), 0) FROM {table_name}"
+                                           for table_name in table_names)
+                self.cursor.execute(query)
+            totals = {table_name: (Money(actual), Money(budget)) for table_name, actual, budget in self.cursor.fetchall()}
+            self.summary_cache[cache_key] = totals
+
+        return totals
+
+    @measured
+    def get_summary(self, income_table="incomes", expense_table="expenses", start_period=None, end_period=None):
+        """ Calculates the figures shown by budget_summary, all-time or for a range of months.
+        :param str start_period: First month ('YYYY-MM') to include, or None for all-time figures
+        :param str end_period: Last month to include, defaults to start_period
+        :returns: Dictionary of summary figures as Money, see summary_figures()
+        """
+
+        totals = self.get_totals((income_table, expense_table), start_period, end_period)
+
+        return summary_figures(*totals[income_table], *totals[expense_table])
+
+    @measured
+    def compare_years(self, start_period, end_period=None):
+        """ Compares a range of months with the same months one year earlier.
+        :param str start_period: First month ('YYYY-MM') of the range
+        :param str end_period: Last month of the range, defaults to start_period
+        :returns: Dictionary with 'current' and 'previous' summaries and their periods
+        """
+
+        end_period = end_period or start_period
+        previous_start, previous_end = shift_period(start_period, -12), shift_period(end_period, -12)
+
+        return {"current": {"start": start_period, "end": end_period,
+                            **self.get_summary(start_period=start_period, end_period=end_period)},
+                "previous": {"start": previous_start, "end": previous_end,
+                             **self.get_summary(start_period=previous_start, end_period=previous_end)}}
+
+    # QUERIES
+
+    @measured
+    def get_rows(self, table_name):
+        """ Reads every category of an income or expense table.
+        :param str table_name: Name of table to read
+        :returns: List of (id, category, actual, budget) rows, amounts as Money
+        """
+
+        self.cursor.execute(f"SELECT id, category, actual, budget FROM {table_name}")
+        return [(category_id, category, Money(actual), Money(budget)) for category_id, category, actual, budget in self.cursor.fetchall()]
+
+    @measured
+    def get_page(self, table_name, order="id", after=None, limit=None):
+        """ Reads one page of categories with keyset pagination: the page starts after the key of
+        the previous page's last row, so every page is an index range read of 'limit' rows
+        however deep into the table it is.
+        :param str order: 'id' for category order, or 'actual' for the largest actuals first (top-N)
+        :param tuple after: Key returned with the previous page, None for the first page
+        :param int limit: Rows per page, defaults to page_size
+        :raises ValueError: Raised for an unknown order
+        :returns: (list of (id, category, parent category, actual, budget) rows, key of the next page or None)
+        """
+
+        limit = limit or page_size
+        columns = f"SELECT t.id, t.category, p.category, t.actual, t.budget FROM {table_name} t LEFT JOIN {table_name} p ON p.id = t.parent_id"
+
+        if order == "id":
+            self.cursor.execute(f"{columns} WHERE t.id > ? ORDER BY t.id LIMIT ?", ((after or (0,))[0], limit + 1))
+        elif order == "actual" and after is None:
+            self.cursor.execute(f"{columns} ORDER BY t.actual DESC, t.id DESC LIMIT ?", (limit + 1,))
+        elif order == "actual":
+            self.cursor.execute(f"{columns} WHERE (t.actual, t.id) < (?, ?) ORDER BY t.actual DESC, t.id DESC LIMIT ?",
+                                (*after, limit + 1))
+        else:
+            raise ValueError(f"Unknown order {order}. Choose from: id, actual.")
+
+        rows = self.cursor.fetchall()
+        next_key = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_key = (rows[-1][0],) if order == "id" else (rows[-1][3], rows[-1][0])
+
+        return [(category_id, category, parent, Money(actual), Money(budget))
+                for category_id, category, parent, actual, budget in rows], next_key
+
+    def count_categories(self, table_name):
+        """ Counts the categories of a table, cached until the next write. """
+
+        count = self.summary_cache_get(("count", table_name))
+        if count is None:
+            self.cursor.execute(f"SELECT count(*) FROM {table_name}")
+            count = self.summary_cache[("count", table_name)] = self.cursor.fetchone()[0]
+
+        return count
+
+    @measured
+    def get_category(self, table_name, category):
+        """ Looks a category up by name through the unique category index.
+        :param str table_name: Name of the income or expense table
+        :param str category: Name of the category
+        :raises LookupError: Raised when the category does not exist
+        :returns: (id, category, actual, budget) row, amounts as Money
+        """
+
+        self.cursor.execute(f"SELECT id, category, actual, budget FROM {table_name} WHERE {self.category_match}", (category,))
+        row = self.cursor.fetchone()
+
+        if row is None:
+            raise LookupError(f"{category} is not a category in {table_name}.")
+        return row[0], row[1], Money(row[2]), Money(row[3])
+
+    @measured
+    def category_exists(self, table_name, category):
+        """ Checks whether a category exists, as an index seek.
+        :returns: True when the category exists
+        """
+
+        self.cursor.execute(f"SELECT 1 FROM {table_name} WHERE {self.category_match}", (category,))
+        return self.cursor.fetchone() is not None
+
+    @measured
+    def get_history(self, table_name, category_id):
+        """ Reads the ledger of a category, oldest first.
+        :param str table_name: Name of the income or expense table
+        :param int category_id: Primary key of the category
+        :returns: List of (id, date, description, amount) rows, amounts as Money
+        """
+
+        self.cursor.execute(f"SELECT id, date, description, amount FROM {table_name}_ledger WHERE category_id = ? ORDER BY date, id",
+                            (category_id,))
+        return [(ledger_id, txn_date, description, Money(amount)) for ledger_id, txn_date, description, amount in self.cursor.fetchall()]
+
+    @measured
+    def get_tree(self, table_name, start_period=None, end_period=None):
+        """ Reads the categories of a table as a tree, each parent followed by its sub-categories.
+        Subtotals cover a category and everything below it. All-time subtotals are read from the
+        rollups the triggers maintain; for a range of months they come from one join of the
+        closure table with the period rows in range. Either way no query walks the tree.
+        :param str start_period: First month ('YYYY-MM') to include, or None for all-time amounts
+        :param str end_period: Last month to include, defaults to start_period
+        :param dict children: Sub-category ids per parent id, in id order
+        :returns: List of (id, category, depth, actual, budget, subtotal actual, subtotal budget,
+                  number of sub-categories) rows in tree order, amounts as Money
+        """
+
+        end_period = end_period or start_period
+        cache_key = ("tree", table_name, start_period, end_period)
+        rows = self.summary_cache_get(cache_key)
+        if rows is not None:
+            return rows
+
+        self.cursor.execute(f'''SELECT c.id, c.category, c.parent_id, c.actual, c.budget, r.actual, r.budget
+                               FROM {table_name} c JOIN {table_name}_rollups r ON r.category_id = c.id ORDER BY c.id''')
+        categories = {row[0]: list(row[1:]) for row in self.cursor.fetchall()}
+
+        if start_period:
+            for category in categories.values():
+                category[2:] = [0, 0, 0, 0]
+            self.cursor.execute(f'''SELECT category_id, sum(actual), sum(budget) FROM {table_name}_periods
+                                   WHERE period BETWEEN ? AND ? GROUP BY category_id''', (start_period, end_period))
+            for category_id, actual, budget in self.cursor.fetchall():
+                if category_id in categories:
+                    categories[category_id][2:4] = [actual, budget]
+            self.cursor.execute(f'''SELECT t.ancestor_id, sum(p.actual), sum(p.budget)
+                                   FROM {table_name}_periods p JOIN {table_name}_tree t ON t.descendant_id = p.category_id
+                                   WHERE p.period BETWEEN ? AND ? GROUP BY t.ancestor_id''', (start_period, end_period))
+            for category_id, actual, budget in self.cursor.fetchall():
+                if category_id in categories:
+                    categories[category_id][4:6] = [actual, budget]
+
+        children = {}
+        for category_id, (category, parent_id, *amounts) in categories.items():
+            children.setdefault(parent_id if parent_id in categories else None, []).append(category_id)
+
+        # Depth-first, iteratively so deep trees cannot hit the recursion limit
+        rows = []
+        stack = [(category_id, 0) for category_id in reversed(children.get(None, []))]
+        while stack:
+            category_id, depth = stack.pop()
+            category, parent_id, actual, budget, subtotal_actual, subtotal_budget = categories[category_id]
+            rows.append((category_id, category, depth, Money(actual), Money(budget),
+                         Money(subtotal_actual), Money(subtotal_budget), len(children.get(category_id, []))))
+            stack += [(child_id, depth + 1) for child_id in reversed(children.get(category_id, []))]
+
+        self.summary_cache[cache_key] = rows
+        return rows
+
+    @measured
+    def get_groups(self, table_name, start_period=None, end_period=None):
+        """ Reads the subtotals of the categories that have sub-categories, for the budget summary.
+        Only those categories are read, found through the parent index, so the cost follows the
+        number of groups rather than the number of categories. All-time subtotals come from the
+        rollups; for a range of months from the closure table joined with the period rows in range.
+        :param str start_period: First month ('YYYY-MM') to include, or None for all-time amounts
+        :param str end_period: Last month to include, defaults to start_period
+        :param dict children: Sub-group ids per parent id, in id order
+        :returns: List of (id, category, depth, subtotal actual, subtotal budget) rows in tree order, amounts as Money
+        """
+
+        end_period = end_period or start_period
+        cache_key = ("groups", table_name, start_period, end_period)
+        rows = self.summary_cache_get(cache_key)
+        if rows is not None:
+            return rows
+
+        groups = f"SELECT DISTINCT parent_id FROM {table_name} WHERE parent_id IS NOT NULL"
+        if start_period:
+            self.cursor.execute(f'''SELECT c.id, c.category, c.parent_id, coalesce(sum(p.actual), 0), coalesce(sum(p.budget), 0)
+                                   FROM {table_name} c JOIN {table_name}_tree t ON t.ancestor_id = c.id
+                                   LEFT JOIN {table_name}_periods p ON p.category_id = t.descendant_id AND p.period BETWEEN ? AND ?
+                                   WHERE c.id IN ({groups}) GROUP BY c.id ORDER BY c.id''', (start_period, end_period))
+        else:
+            self.cursor.execute(f'''SELECT c.id, c.category, c.parent_id, r.actual, r.budget
+                                   FROM {table_name} c JOIN {table_name}_rollups r ON r.category_id = c.id
+                                   WHERE c.id IN ({groups}) ORDER BY c.id''')
+        categories = {row[0]: row[1:] for row in self.cursor.fetchall()}
+
+        # The parent of a group is a group too, so the groups form a tree of their own
+        children = {}
+        for category_id, (category, parent_id, actual, budget) in categories.items():
+            children.setdefault(parent_id if parent_id in categories else None, []).append(category_id)
+
+        rows = []
+        stack = [(category_id, 0) for category_id in reversed(children.get(None, []))]
+        while stack:
+            category_id, depth = stack.pop()
+            category, parent_id, actual, budget = categories[category_id]
+            rows.append((category_id, category, depth, Money(actual), Money(budget)))
+            stack += [(child_id, depth + 1) for child_id in reversed(children.get(category_id, []))]
+
+        self.summary_cache[cache_key] = rows
+        return rows
+
+    @measured
+    def search_categories(self, table_name, text, limit=search_limit):
+        """ Finds categories whose names match the text, for lookups that missed an exact name.
+        Names equal to the text in any case come first, then names starting with it, names
+        containing it and finally near matches (typos), by similarity. Candidates come from the
+        FTS5 trigram index: a phrase query for names containing the text, then, when those are
+        too few, names sharing any of its trigrams in bm25 order. Texts shorter than a trigram,
+        and texts the index finds nothing for, are compared with the names starting with the
+        same letter. Without the index every name is compared.
+        :param str table_name: Name of the income or expense table
+        :param str text: Full or partial category name, in any case
+        :param int limit: Most names to return
+        :param list candidates: Category names from the index to rank
+        :returns: List of category names, best match first
+        """
+
+        folded = text.strip().casefold()
+        if not folded:
+            return []
+
+        ranked = []
+        if self.search_index and len(folded) >= 3:
+            self.cursor.execute(f"SELECT category FROM {table_name}_search WHERE {table_name}_search MATCH ? "
+                                f"ORDER BY length(category) LIMIT ?", (fts_phrase(folded), search_candidates))
+            candidates = [row[0] for row in self.cursor.fetchall()]
+
+            if len(candidates) < limit:
+                trigrams = sorted({folded[start:start + 3] for start in range(len(folded) - 2)})
+                self.cursor.execute(f"SELECT category FROM {table_name}_search WHERE {table_name}_search MATCH ? ORDER BY rank LIMIT ?",
+                                    (" OR ".join(fts_phrase(trigram) for trigram in trigrams), search_candidates))
+                candidates += [row[0] for row in self.cursor.fetchall()]
+
+            ranked = self.rank_categories(folded, candidates)
+
+        # Short texts, and typos in short names, can share no trigram with the name. Those are
+        # compared with the names that start with the same letter, a range of the category index.
+        if not ranked and self.search_index:
+            bounds = []
+            for first in {folded[0], folded[0].upper()}:
+                bounds += [first, chr(ord(first) + 1)]
+            ranges = " OR ".join(["(category >= ? AND category < ?)"] * (len(bounds) // 2))
+            self.cursor.execute(f"SELECT category FROM {table_name} WHERE {ranges}", bounds)
+            ranked = self.rank_categories(folded, [row[0] for row in self.cursor.fetchall()])
+
+        elif not ranked:
+            self.cursor.execute(f"SELECT category FROM {table_name}")
+            ranked = self.rank_categories(folded, [row[0] for row in self.cursor.fetchall()])
+
+        return [category for *order, category in ranked[:limit]]
+
+    @staticmethod
+    def rank_categories(folded, candidates):
+        """ Orders candidate names for search_categories(), dropping those that are not similar enough.
+        :param str folded: Search text, casefolded
+        :param list candidates: Category names, possibly with duplicates
+        :returns: Sorted list of (kind, -similarity, length, category) tuples
+        """
+
+        matcher = SequenceMatcher()
+        matcher.set_seq2(folded)
+        ranked = []
+
+        for category in dict.fromkeys(candidates):
+            name = category.casefold()
+            if name == folded:
+                ranked.append((0, 0, len(category), category))
+            elif name.startswith(folded):
+                ranked.append((1, 0, len(category), category))
+            elif folded in name:
+                ranked.append((2, 0, len(category), category))
+            else:
+                # A typo in the first word of a longer name is judged on that much of the name
+                similarity = 0
+                for part in {name, name[:len(folded)]}:
+                    matcher.set_seq1(part)
+                    if matcher.real_quick_ratio() >= search_cutoff and matcher.quick_ratio() >= search_cutoff:
+                        similarity = max(similarity, matcher.ratio())
+                if similarity >= search_cutoff:
+                    ranked.append((3, -similarity, len(category), category))
+
+        ranked.sort()
+        return ranked
+
+    # WRITES
+
+    def insert_category(self, table_name, category, parent_id=None):
+        """ Inserts a new category inside an open write transaction (see begin_write) and returns its id.
+        The next id is read and used while the write lock is held, so two processes can never be
+        handed the same id. Does not commit.
+        :param str table_name: Name of the table where category is added
+        :param str category: Name of new income or expense category
+        :param int parent_id: Primary key of the parent category, or None for a top-level category
+        :param str max_query: Query string to find last row
+        :param str status_query: Query string used to find category name that matches id
+        :param str placeholder_query: Query string that replaces the 'None' placeholder row
+        :param str insert_query: Query string that runs to insert new row
+        :param int last_id: Value assigned to last entry primary key in the database table
+        :raises sqlite3.IntegrityError: Raised when the category already exists
+        :returns: Primary key of the new category
+        """
+
+        cursor = self.cursor
+        max_query = f"SELECT max(id) FROM {table_name}"
+        status_query = f"SELECT * FROM {table_name} WHERE id = ?"
+        placeholder_query = f"INSERT OR REPLACE INTO {table_name}(id, category, actual, budget, parent_id) VALUES(?,?,?,?,?)"
+        insert_query = f"INSERT INTO {table_name}(id, category, actual, budget, parent_id) VALUES(?,?,?,?,?)"
+
+        cursor.execute(max_query)
+        last_id = cursor.fetchone()[0] or 0
+        cursor.execute(status_query,(last_id,))
+        table_status = cursor.fetchone()
+
+        # Check if last primary key (id) corresponds to the initial default value
+        # If it's 'None' and nothing has been recorded against it then replace, otherwise add a new row.
+        # Sub-categories always get a new row, as their parent could be the placeholder itself.
+        if (last_id == 1 and table_status[1] == "None" and table_status[3] == 0 and parent_id is None
+                and self.category_key(category) != self.category_key("None")):
+            cursor.execute(f"SELECT count(*) FROM {table_name}_ledger WHERE category_id = 1")
+            placeholder_used = cursor.fetchone()[0] > 0
+        else:
+            placeholder_used = True
+
+        if not placeholder_used:
+            cursor.execute(placeholder_query, [last_id, category, 0, 0, None])
+            self.journal(table_name, "update", [{"id": last_id, "category": table_status[1], "budget": 0, "parent_id": None}],
+                         [{"id": last_id, "category": category, "budget": 0, "parent_id": None}])
+
+        else:
+            last_id +=1
+            cursor.execute(insert_query, [last_id, category, 0, 0, parent_id])
+            self.journal(table_name, "insert", None, [{"id": last_id, "category": category, "budget": 0, "parent_id": parent_id}])
+
+        return last_id
+
+    def commit(self):
+        """ Commits the open transaction and clears the summary cache.
+        In in-memory mode every checkpoint_changes commits are checkpointed to the file straight away.
+        """
+
+        try:
+            self.db.commit()
+            if self.in_memory:
+                self.unsaved_changes += 1
+        finally:
+            self.release_memory_lock()
+        self.invalidate_summary_cache()
+
+        if self.in_memory and self.unsaved_changes >= self.checkpoint_changes:
+            self.checkpoint()
+
+        if self.alert_callbacks:
+            self.deliver_alerts()
+
+        self.journal_txn = None
+
+    @measured
+    def add_category(self, table_name, category, parent=None):
+        """ Adds a category to an income or expense table.
+        :param str parent: Name of the parent category, or None for a top-level category
+        :raises sqlite3.IntegrityError: Raised when the category already exists, after db rollback
+        :raises LookupError: Raised when the parent category does not exist
+        :returns: Primary key of the new category
+        """
+
+        try:
+            self.begin_write("add_category")
+            parent_id = self.get_category(table_name, parent)[0] if parent else None
+            category_id = self.insert_category(table_name, category, parent_id)
+            self.commit()
+            return category_id
+        except Exception:
+            self.rollback()
+            raise
+
+    @measured
+    def move_category(self, table_name, category, parent=None):
+        """ Moves a category, with its sub-categories, under another category. The closure and
+        rollup triggers relink the subtree and move its totals to the new ancestors.
+        :param str parent: Name of the new parent category, or None to make it a top-level category
+        :raises LookupError: Raised when either category does not exist
+        :raises sqlite3.IntegrityError: Raised when the new parent is the category or one of its sub-categories
+        :returns: Primary key of the new parent, or None
+        """
+
+        try:
+            self.begin_write("move_category")
+            category_id = self.get_category(table_name, category)[0]
+            parent_id = self.get_category(table_name, parent)[0] if parent else None
+            self.change_rows(table_name, "update", "id = ?", (category_id,), {"parent_id": parent_id})
+            self.commit()
+            return parent_id
+        except Exception:
+            self.rollback()
+            raise
+
+    @measured
+    def remove_category(self, table_name, category):
+        """ Removes a category and (through the ledger trigger) its transaction history.
+        Its sub-categories move up to its parent.
+        :returns: True when a category was removed
+        """
+
+        try:
+            self.begin_write("remove_category")
+            found = self.journaled_rows(table_name, self.category_match, (category,))
+
+            # Each step is journaled, so an undo brings back the sub-categories, history and monthly budgets.
+            # Without a budget no alert fires while the ledger rows go (or come back on undo).
+            for row in found:
+                self.change_rows(table_name, "update", "parent_id = ?", (row["id"],), {"parent_id": row["parent_id"]})
+                self.change_budget(table_name, row["id"], Money())
+                self.change_rows(f"{table_name}_ledger", "delete", "category_id = ?", (row["id"],))
+                self.change_rows(f"{table_name}_periods", "delete", "category_id = ?", (row["id"],))
+                self.change_rows(table_name, "delete", "id = ?", (row["id"],))
+
+            self.commit()
+            return len(found) > 0
+        except Exception:
+            self.rollback()
+            raise
+
+    def change_budget(self, table_name, category_id, budget):
+        """ Sets a category's budget and journals it. Does not commit.
+        :param Money budget: New budget
+        """
+
+        # The budget trigger also sets this month's budget. Journaling that first means an undo
+        # restores the category's budget and then any budget set for this month alone.
+        self.change_rows(f"{table_name}_periods", "update", "period = ? AND category_id = ?",
+                         (date.today().strftime("%Y-%m"), category_id), {"budget": budget.cents})
+        self.change_rows(table_name, "update", "id = ?", (category_id,), {"budget": budget.cents})
+
+    def open_category_periods(self, table_name, keys):
+        """ Creates the period rows a batch of ledger rows is about to add to, when missing, and
+        journals them, so an undo of the transactions also takes away the months they created.
+        Does not commit.
+        :param set keys: (period, category_id) pairs of the ledger rows
+        """
+
+        new_rows = []
+        for period, category_id in sorted(keys):
+            self.cursor.execute(f'''INSERT OR IGNORE INTO {table_name}_periods(period, category_id, actual, budget)
+                                   SELECT ?, id, 0, budget FROM {table_name} WHERE id = ?''', (period, category_id))
+            if self.cursor.rowcount:
+                new_rows += self.journaled_rows(f"{table_name}_periods", "period = ? AND category_id = ?", (period, category_id))
+
+        if new_rows:
+            self.journal(f"{table_name}_periods", "insert", None, new_rows)
+
+    def record_transaction(self, table_name, category_id, amount, txn_date=None, description=""):
+        """ Appends a transaction to the ledger of an income or expense table. The ledger trigger
+        adds the amount to the category's actual. Does not commit, so callers can group writes.
+        :param str table_name: Name of the income or expense table the category belongs to
+        :param int category_id: Primary key of the category
+        :param amount: Transaction amount in rands (Money or a number), negative to reverse an earlier amount
+        :param str txn_date: Transaction date as YYYY-MM-DD, defaults to today
+        :param str description: Free text describing the transaction
+        :returns: Primary key of the new ledger row
+        """
+
+        txn_date = txn_date or date.today().isoformat()
+        open_past_periods(self.cursor, {txn_date[:7]})
+        amount = Money.parse(amount)
+        self.open_category_periods(table_name, {(txn_date[:7], category_id)})
+        self.cursor.execute(f"INSERT INTO {table_name}_ledger(category_id, date, amount, description) VALUES(?,?,?,?)",
+                            (category_id, txn_date, amount, description))
+        ledger_id = self.cursor.lastrowid
+
+        self.journal(f"{table_name}_ledger", "insert", None, [{"id": ledger_id, "category_id": category_id, "date": txn_date,
+                                                                "amount": amount.cents, "description": description}])
+        return ledger_id
+
+    @measured
+    def add_transaction(self, table_name, category, amount, txn_date=None, description=""):
+        """ Records a dated transaction against a category by name.
+        :raises LookupError: Raised when the category does not exist
+        :returns: Primary key of the new ledger row
+        """
+
+        try:
+            self.begin_write("add_transaction")
+            category_id = self.get_category(table_name, category)[0]
+            ledger_id = self.record_transaction(table_name, category_id, amount, txn_date, description)
+            self.commit()
+            return ledger_id
+        except Exception:
+            self.rollback()
+            raise
+
+    @measured
+    def remove_transaction(self, table_name, category_id, ledger_id):
+        """ Removes a ledger transaction, which subtracts its amount from the category's actual.
+        :returns: True when a transaction was removed
+        """
+
+        try:
+            self.begin_write("remove_transaction")
+            removed = self.change_rows(f"{table_name}_ledger", "delete", "id = ? AND category_id = ?", (ledger_id, category_id)) > 0
+            self.commit()
+            return removed
+        except Exception:
+            self.rollback()
+            raise
+
+    @measured
+    def update_actual(self, table_name, category, new_actual):
+        """ Sets the actual of a category by recording the difference as an adjustment transaction.
+        The current amount is read under the write lock in case another process changed it.
+        :param Money adjustment: Difference between the new and current amount, recorded in the ledger
+        :raises LookupError: Raised when the category does not exist
+        :returns: The adjustment recorded as Money (zero when the amount was unchanged)
+        """
+
+        try:
+            self.begin_write("update_actual")
+            edit_item = self.get_category(table_name, category)
+            adjustment = Money.parse(new_actual) - edit_item[2]
+            if adjustment:
+                # The ledger trigger brings 'actual' up to the new amount
+                self.record_transaction(table_name, edit_item[0], adjustment, description="Adjustment")
+            self.commit()
+            return adjustment
+        except Exception:
+            self.rollback()
+            raise
+
+    @measured
+    def update_goal(self, table_name, category, new_target):
+        """ Sets the budget (expenses) or target (incomes) of a category.
+        :raises LookupError: Raised when the category does not exist
+        :returns: The new target as Money
+        """
+
+        try:
+            self.begin_write("update_goal")
+            category_id = self.get_category(table_name, category)[0]
+            new_target = Money.parse(new_target)
+            self.change_budget(table_name, category_id, new_target)
+            self.commit()
+            return new_target
+        except Exception:
+            self.rollback()
+            raise
+
+    @measured
+    def set_period_budget(self, table_name, category, period, budget):
+        """ Sets the budget (expenses) or target (incomes) of a category for one month only.
+        :param str period: Month as 'YYYY-MM'
+        :raises LookupError: Raised when the category does not exist
+        :returns: The new budget as Money
+        """
+
+        try:
+            self.begin_write("set_period_budget")
+            category_id = self.get_category(table_name, category)[0]
+            budget = Money.parse(budget)
+            period = parse_period(period)
+
+            # A month without a row yet starts from the category's budget, as the triggers would create it
+            self.open_category_periods(table_name, {(period, category_id)})
+            self.change_rows(f"{table_name}_periods", "update", "period = ? AND category_id = ?", (period, category_id),
+                             {"budget": budget.cents})
+            self.commit()
+            return budget
+        except Exception:
+            self.rollback()
+            raise
+
+    @measured
+    def import_statement(self, file_path, rules_file=None, chunk_size=None):
+        """ Imports a bank statement into the expense and income ledgers without prompting.
+        Rows are streamed from the file and written in chunks, one transaction per chunk.
+        Each row becomes a ledger transaction (which adds to the category's actual) and
+        missing categories are created. The whole import is one journal transaction, so
+        one undo takes it back.
+        :param str file_path: Path to the CSV or OFX statement
+        :param str rules_file: Optional CSV file of keyword to category rules
+        :param int chunk_size: Number of statement rows written per transaction
+        :param dict chunk_rows: Statement rows per (table, category) for the current chunk
+        :param dict category_ids: Category ids for the chunk, resolved under the write lock
+        :param int import_txn: Journal transaction of the import, shared by every chunk
+        :raises RuntimeError: Raised when a chunk cannot be written, after db rollback. Earlier chunks stay imported.
+        :returns: Number of statement rows imported and the seconds it took
+        """
+
+        chunk_size = chunk_size or import_chunk_size
+        imported = 0
+        import_txn = None
+        start_time = time.perf_counter()
+
+        try:
+            category_rules = load_category_rules(rules_file)
+            rows = map_statement_rows(read_statement(file_path), category_rules)
+
+            while True:
+                chunk_rows = {}
+                chunk_count = 0
+
+                for table_name, category, amount, row_date, description in rows:
+                    chunk_rows.setdefault((table_name, category), []).append((row_date, amount.cents, description))
+                    chunk_count += 1
+                    if chunk_count == chunk_size:
+                        break
+
+                if chunk_count == 0:
+                    break
+
+                # A chunk only uses a handful of distinct categories, so resolving (or creating) them
+                # inside the write transaction is cheap and stays correct while other processes write.
+                # Every chunk adds to the import's one journal transaction, so one undo takes the import back
+                self.begin_write("import_statement")
+                self.journal_txn = import_txn
+                category_ids = {}
+                for table_name, category in chunk_rows:
+                    self.cursor.execute(f"SELECT id FROM {table_name} WHERE {self.category_match}", (category,))
+                    found = self.cursor.fetchone()
+                    category_ids[(table_name, category)] = found[0] if found else self.insert_category(table_name, category)
+
+                for table_name in ("expenses", "incomes"):
+                    # Ids are given explicitly (the write lock is held), so the chunk's rows form one id
+                    # range, and the journal records that range instead of a copy of every row
+                    self.cursor.execute(f"SELECT coalesce(max(id), 0) FROM {table_name}_ledger")
+                    next_id = self.cursor.fetchone()[0] + 1
+                    table_rows = [(category_ids[key], *row) for key, key_rows in chunk_rows.items()
+                                  if key[0] == table_name for row in key_rows]
+                    ledger_rows = [(ledger_id, *row) for ledger_id, row in enumerate(table_rows, start=next_id)]
+                    if ledger_rows:
+                        self.open_category_periods(table_name, {(row[2][:7], row[1]) for row in ledger_rows})
+                        open_past_periods(self.cursor, {row[2][:7] for row in ledger_rows})
+                        self.cursor.executemany(f"INSERT INTO {table_name}_ledger(id, category_id, date, amount, description) "
+                                                f"VALUES(?,?,?,?,?)", ledger_rows)
+                        self.journal(f"{table_name}_ledger", "insert_range", None,
+                                     {"first_id": next_id, "last_id": next_id + len(ledger_rows) - 1})
+
+                import_txn = self.journal_txn
+                self.commit()
+                imported += chunk_count
+
+        except Exception as error_msg:
+            self.rollback()
+            raise RuntimeError(f"{error_msg} ({imported} rows were imported before the error)") from error_msg
+
+        return imported, time.perf_counter() - start_time
+
+    # CHANGE JOURNAL
+
+    def open_journal_txn(self, kind="change", target=None):
+        """ Adds the journal_txns row of the open write transaction. Does not commit.
+        :param str kind: 'change', 'undo', 'redo', 'restore', 'snapshot' (a snapshot was loaded) or 'compacted'
+        :param int target: Transaction undone or redone, or the snapshot loaded
+        :returns: Id of the journal transaction
+        """
+
+        self.cursor.execute("INSERT INTO journal_txns(at, operation, kind, target) VALUES(?,?,?,?)",
+                            (datetime.now().strftime(timestamp_format), self.journal_operation, kind, target))
+        return self.cursor.lastrowid
+
+    def journal(self, table_name, action, before=None, after=None):
+        """ Appends one change to the journal inside the open write transaction. The first change of
+        a transaction also adds its journal_txns row. Does nothing when journaling is switched off,
+        except for undo, redo and restore, which always journal what they change.
+        :param str table_name: Table that changed
+        :param str action: 'insert', 'delete' or 'update'
+        :param list before: Rows (dictionaries of journaled columns) before the change
+        :param list after: Rows after the change
+        """
+
+        if self.journal_txn is None:
+            if not self.journal_enabled:
+                return
+            self.journal_txn = self.open_journal_txn()
+
+        self.cursor.execute("INSERT INTO journal(txn_id, table_name, action, before, after) VALUES(?,?,?,?,?)",
+                            (self.journal_txn, table_name, action,
+                             None if before is None else json.dumps(before), None if after is None else json.dumps(after)))
+
+    def journaled_rows(self, table_name, where, parameters, columns=None):
+        """ Reads the journaled columns of the rows matching a condition.
+        :param tuple columns: Columns to read, defaults to all journaled columns of the table
+        :returns: List of row dictionaries
+        """
+
+        columns = columns or journal_columns[journal_kind(table_name)][1]
+        self.cursor.execute(f"SELECT {', '.join(columns)} FROM {table_name} WHERE {where}", parameters)
+        return [dict(zip(columns, row)) for row in self.cursor.fetchall()]
+
+    def change_rows(self, table_name, action, where, parameters, changes=None):
+        """ Deletes or updates the rows matching a condition and journals them. Does not commit.
+        :param str action: 'delete' or 'update'
+        :param dict changes: New values of the updated columns
+        :returns: Number of rows changed
+        """
+
+        if action == "delete":
+            before, after = self.journaled_rows(table_name, where, parameters), None
+        else:
+            key = journal_columns[journal_kind(table_name)][0]
+            before = self.journaled_rows(table_name, where, parameters, key + tuple(changes))
+            after = [{**row, **changes} for row in before]
+
+        if before:
+            apply_change(self.cursor, table_name, action, before, after)
+            self.journal(table_name, action, before, after)
+
+        return len(before)
+
+    def replay_change(self, table_name, action, before, after):
+        """ Applies a journal entry for an undo, redo or restore and journals it. A 'delete_range'
+        (the undo of an import) deletes its rows with one statement, and journals the rows it
+        deletes, so that it can be redone and undone in turn. Does not commit.
+        :param str action: 'insert', 'delete', 'update' or 'delete_range'
+        """
+
+        if action == "delete_range":
+            rows = self.journaled_rows(table_name, "id BETWEEN ? AND ?", (before["first_id"], before["last_id"]))
+            apply_change(self.cursor, table_name, action, before, after)
+            if rows:
+                self.journal(table_name, "delete", rows)
+            return
+
+        apply_change(self.cursor, table_name, action, before, after)
+        self.journal(table_name, action, before, after)
+
+    def range_rows(self, table_name, txn_id, first_id, last_id):
+        """ Reads the rows an 'insert_range' of a journal transaction inserted, for redoing it after
+        a snapshot is loaded. Rows deleted since are taken from the first journal entry that
+        deleted them; the others are still in the ledger, as their ids cannot have been reused.
+        :param int txn_id: Journal transaction of the 'insert_range'
+        :returns: List of row dictionaries in id order
+        """
+
+        rows = {}
+        self.cursor.execute('''SELECT before FROM journal WHERE table_name = ? AND action = 'delete' AND txn_id > ?
+                               ORDER BY id DESC''', (table_name, txn_id))
+        for (before,) in self.cursor.fetchall():
+            rows.update((row["id"], row) for row in json.loads(before) if first_id <= row["id"] <= last_id)
+
+        for row in self.journaled_rows(table_name, "id BETWEEN ? AND ?", (first_id, last_id)):
+            rows.setdefault(row["id"], row)
+
+        return [rows[row_id] for row_id in sorted(rows)]
+
+    def journal_entries(self, where, parameters, reverse=False):
+        """ Reads journal entries, in the order they were made or newest first.
+        :returns: List of (table_name, action, before, after) with the rows decoded
+        """
+
+        self.cursor.execute(f'''SELECT j.table_name, j.action, j.before, j.after FROM journal j
+                               JOIN journal_txns t ON t.id = j.txn_id WHERE {where}
+                               ORDER BY j.id {"DESC" if reverse else "ASC"}''', parameters)
+        return [(table_name, action, json.loads(before) if before else None, json.loads(after) if after else None)
+                for table_name, action, before, after in self.cursor.fetchall()]
+
+    def journal_stacks(self):
+        """ Replays the kinds of the journal transactions into undo and redo stacks. A change or
+        restore clears the redo stack, like in an editor, and loading a snapshot clears both.
+        :returns: (undo stack, redo stack) of journal transaction ids, newest last
+        """
+
+        undo_stack, redo_stack = [], []
+        self.cursor.execute("SELECT id, kind, target FROM journal_txns ORDER BY id")
+
+        for txn_id, kind, target in self.cursor.fetchall():
+            if kind in ("change", "restore"):
+                undo_stack.append(txn_id)
+                redo_stack.clear()
+            elif kind == "undo" and target in undo_stack:
+                undo_stack.remove(target)
+                redo_stack.append(target)
+            elif kind == "redo" and target in redo_stack:
+                redo_stack.remove(target)
+                undo_stack.append(target)
+            elif kind == "snapshot":
+                undo_stack.clear()
+                redo_stack.clear()
+
+        return undo_stack, redo_stack
+
+    def replay(self, kind):
+        """ Undoes the newest change on the undo stack, or redoes the newest on the redo stack, as a
+        journaled transaction of its own.
+        :param str kind: 'undo' or 'redo'
+        :raises LookupError: Raised when the stack is empty
+        :returns: Name of the operation undone or redone
+        """
+
+        try:
+            self.begin_write(kind)
+            stack = self.journal_stacks()[0 if kind == "undo" else 1]
+            if not stack:
+                raise LookupError(f"There is nothing to {kind}.")
+
+            self.cursor.execute("SELECT operation FROM journal_txns WHERE id = ?", (stack[-1],))
+            operation = self.cursor.fetchone()[0]
+
+            # A redo reverses the newest undo of the transaction, which holds every row that undo
+            # deleted, including the rows of an import journaled only as an id range
+            if kind == "undo":
+                entries = self.journal_entries("t.id = ?", (stack[-1],), reverse=True)
+            else:
+                self.cursor.execute("SELECT max(id) FROM journal_txns WHERE kind = 'undo' AND target = ?", (stack[-1],))
+                entries = self.journal_entries("t.id = ?", (self.cursor.fetchone()[0],), reverse=True)
+
+            self.journal_txn = self.open_journal_txn(kind, stack[-1])
+            for table_name, action, before, after in entries:
+                self.replay_change(table_name, *inverse_change(action, before, after))
+
+            self.commit()
+            return operation
+        except Exception:
+            self.rollback()
+            raise
+
+    @measured
+    def undo(self):
+        """ Undoes the newest change that has not been undone yet. Several undos step further back.
+        :raises LookupError: Raised when there is nothing to undo
+        :returns: Name of the operation undone, e.g. 'remove_category'
+        """
+
+        return self.replay("undo")
+
+    @measured
+    def redo(self):
+        """ Redoes the newest undone change, until another change is made.
+        :raises LookupError: Raised when there is nothing to redo
+        :returns: Name of the operation redone
+        """
+
+        return self.replay("redo")
+
+    @measured
+    def restore(self, timestamp):
+        """ Brings the data back to how it was at a point in time. While the journal reaches back
+        that far, the transactions committed since are undone, newest first, as one 'restore'
+        transaction that can itself be undone. Older times load the newest snapshot taken at or
+        before the time, see restore_snapshot().
+        :param str timestamp: Date or date and time, see parse_timestamp()
+        :raises ValueError: Raised when the timestamp is not a date or date and time
+        :raises LookupError: Raised when the time is older than the journal and every snapshot
+        :returns: Number of journal transactions undone, or the path of the snapshot loaded
+        """
+
+        at = parse_timestamp(timestamp)
+
+        try:
+            self.begin_write("restore")
+            self.cursor.execute("SELECT max(at) FROM journal_txns WHERE kind = 'compacted'")
+            horizon = self.cursor.fetchone()[0]
+            self.cursor.execute("SELECT count(*) FROM journal_txns WHERE kind = 'snapshot' AND at > ?", (at,))
+            snapshot_loaded = self.cursor.fetchone()[0] > 0
+
+            # Changes before a loaded snapshot belong to the data it replaced, so they cannot be undone
+            if (horizon is None or at >= horizon) and not snapshot_loaded:
+                self.cursor.execute("SELECT count(DISTINCT txn_id) FROM journal j JOIN journal_txns t ON t.id = j.txn_id WHERE t.at > ?",
+                                    (at,))
+                undone = self.cursor.fetchone()[0]
+                entries = self.journal_entries("t.at > ?", (at,), reverse=True)
+
+                if entries:
+                    self.journal_txn = self.open_journal_txn("restore")
+                for table_name, action, before, after in entries:
+                    self.replay_change(table_name, *inverse_change(action, before, after))
+
+                self.commit()
+                return undone
+
+            self.rollback()
+        except Exception:
+            self.rollback()
+            raise
+
+        return self.restore_snapshot(at)
+
+    def restore_snapshot(self, at):
+        """ Loads the newest snapshot taken at or before a time with the backup API, then redoes the
+        journaled transactions between the snapshot and that time, when the journal still has them
+        all. The journal itself is kept: it gets a 'snapshot' transaction marking the load, and
+        snapshots of the data just before and just after the load are taken.
+        :param str at: Timestamp in timestamp_format
+        :raises LookupError: Raised when there is no snapshot from that time or earlier
+        :returns: Path of the snapshot loaded
+        """
+
+        self.cursor.execute("SELECT txn_id, path FROM journal_snapshots WHERE at <= ? ORDER BY at DESC, id DESC", (at,))
+        found = [(txn_id, path) for txn_id, path in self.cursor.fetchall() if os.path.exists(path)]
+        if not found:
+            raise LookupError(f"There is no snapshot from {at[:16]} or earlier to restore.")
+        snapshot_txn, path = found[0]
+
+        # The data being replaced can be restored again from its own snapshot
+        self.snapshot()
+
+        # Redo forward to the time asked for, unless compaction dropped transactions after the snapshot.
+        # Imports are journaled as id ranges, so their rows are read now, before the data is replaced.
+        redo = []
+        self.cursor.execute("SELECT min(id) FROM journal_txns WHERE id > ?", (snapshot_txn,))
+        if self.cursor.fetchone()[0] == snapshot_txn + 1:
+            self.cursor.execute('''SELECT j.txn_id, j.table_name, j.action, j.before, j.after FROM journal j
+                                   JOIN journal_txns t ON t.id = j.txn_id WHERE t.id > ? AND t.at <= ? ORDER BY j.id''',
+                                (snapshot_txn, at))
+            for txn_id, table_name, action, before, after in self.cursor.fetchall():
+                before, after = json.loads(before) if before else None, json.loads(after) if after else None
+                if action == "insert_range":
+                    action, after = "insert", self.range_rows(table_name, txn_id, after["first_id"], after["last_id"])
+                redo.append((table_name, action, before, after))
+
+        # The alerts outbox is kept too, as consumers may have read it already
+        kept_tables = ("journal_txns", "journal", "journal_snapshots", "alerts")
+        for table_name in kept_tables:
+            self.cursor.execute(f"CREATE TEMP TABLE saved_{table_name} AS SELECT * FROM main.{table_name}")
+
+        try:
+            snapshot_db = sqlite3.connect(path)
+            try:
+                if self.in_memory:
+                    with self.memory_lock:
+                        snapshot_db.backup(self.db)
+                        self.unsaved_changes += 1
+                else:
+                    snapshot_db.backup(self.db)
+            finally:
+                snapshot_db.close()
+
+            migrate_database(self.db, self.cursor)
+            self.begin_write("restore")
+            for table_name in kept_tables:
+                self.cursor.execute(f"DELETE FROM main.{table_name}")
+                self.cursor.execute(f"INSERT INTO main.{table_name} SELECT * FROM temp.saved_{table_name}")
+
+            for table_name, action, before, after in redo:
+                apply_change(self.cursor, table_name, action, before, after)
+
+            self.open_journal_txn("snapshot", snapshot_txn)
+            self.commit()
+        except Exception:
+            self.rollback()
+            raise
+        finally:
+            for table_name in kept_tables:
+                self.cursor.execute(f"DROP TABLE IF EXISTS temp.saved_{table_name}")
+            self.category_match = detect_category_collation(self.cursor)
+            self.search_index = detect_search_index(self.cursor)
+            self.invalidate_summary_cache()
+
+        # Later restores to times after the load start from the loaded data
+        self.snapshot()
+        return path
+
+    def snapshot(self):
+        """ Copies the database to a snapshot file with the backup API and lists it in journal_snapshots.
+        A snapshot holds the data as of the newest journal transaction it contains.
+        :raises OSError: Raised when the snapshot directory cannot be created
+        :returns: Path of the snapshot file
+        """
+
+        directory = snapshot_dir or f"{self.db_file}-snapshots"
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"snapshot-{time.time_ns()}.db")
+
+        snapshot_db = sqlite3.connect(path)
+        try:
+            if self.in_memory:
+                with self.memory_lock:
+                    self.db.backup(snapshot_db)
+            else:
+                self.db.backup(snapshot_db)
+            txn_id, at = snapshot_db.execute("SELECT id, at FROM journal_txns ORDER BY id DESC LIMIT 1").fetchone() or (0, None)
+        finally:
+            snapshot_db.close()
+
+        try:
+            self.begin_write("snapshot")
+            self.cursor.execute("INSERT INTO journal_snapshots(txn_id, at, path) VALUES(?,?,?)",
+                                (txn_id, at or datetime.now().strftime(timestamp_format), path))
+            self.commit()
+        except Exception:
+            self.rollback()
+            raise
+
+        return path
+
+    def compact_if_due(self):
+        """ Compacts the journal once snapshot_changes transactions have been journaled since the
+        last snapshot. Cheap to call when nothing is due.
+        :returns: Number of journal transactions dropped, or None when compaction was not due
+        """
+
+        if not snapshot_changes:
+            return None
+
+        self.cursor.execute('''SELECT (SELECT coalesce(max(id), 0) FROM journal_txns)
+                                      - (SELECT coalesce(max(txn_id), 0) FROM journal_snapshots)''')
+        if self.cursor.fetchone()[0] < snapshot_changes:
+            return None
+
+        return self.compact()
+
+    @measured
+    def compact(self, days=None):
+        """ Takes a snapshot, then drops journal transactions older than 'days' and the snapshots
+        beyond snapshots_kept, so the journal and the work of a restore stay bounded. The snapshot
+        copies the whole database, so this runs outside user edits: from the 'compact' command,
+        the server's background task or the menu on exit (see compact_if_due()). Undo does not
+        reach past the dropped transactions.
+        :param float days: Days of journal to keep, defaults to journal_days
+        :returns: Number of journal transactions dropped
+        """
+
+        days = journal_days if days is None else days
+        cutoff = (datetime.now() - timedelta(days=days)).strftime(timestamp_format)
+        self.snapshot()
+
+        try:
+            self.begin_write("compact")
+            self.cursor.execute("SELECT count(*), max(at) FROM journal_txns WHERE at < ? AND kind != 'compacted'", (cutoff,))
+            dropped, horizon = self.cursor.fetchone()
+
+            if dropped:
+                # One marker keeps the time up to which the journal was dropped
+                self.cursor.execute("SELECT max(at) FROM journal_txns WHERE kind = 'compacted'")
+                horizon = max(horizon, self.cursor.fetchone()[0] or horizon)
+                self.cursor.execute("DELETE FROM journal WHERE txn_id IN (SELECT id FROM journal_txns WHERE at < ?)", (cutoff,))
+                self.cursor.execute("DELETE FROM journal_txns WHERE at < ? OR kind = 'compacted'", (cutoff,))
+                self.cursor.execute("INSERT INTO journal_txns(at, operation, kind) VALUES(?, 'compact', 'compacted')", (horizon,))
+
+            self.cursor.execute("SELECT id, path FROM journal_snapshots ORDER BY at DESC, id DESC LIMIT -1 OFFSET ?", (snapshots_kept,))
+            old_snapshots = self.cursor.fetchall()
+            self.cursor.executemany("DELETE FROM journal_snapshots WHERE id = ?", [(snapshot_id,) for snapshot_id, path in old_snapshots])
+            self.commit()
+        except Exception:
+            self.rollback()
+            raise
+
+        for snapshot_id, path in old_snapshots:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+        return dropped
+
+    def get_journal(self, limit=20):
+        """ Lists the newest journal transactions.
+        :returns: List of (id, time, operation, kind, number of changes), newest first
+        """
+
+        self.cursor.execute('''SELECT t.id, substr(t.at, 1, 19), t.operation, t.kind,
+                                      (SELECT count(*) FROM journal j WHERE j.txn_id = t.id)
+                               FROM journal_txns t ORDER BY t.id DESC LIMIT ?''', (limit,))
+        return self.cursor.fetchall()
+
+    # BUDGET ALERTS
+
+    @measured
+    def add_alert_rule(self, table_name, percent, category=None, total=False):
+        """ Adds a threshold rule, evaluated by triggers from the next change on. Without a category
+        the rule applies to each category of the table, or with 'total' to the table's total.
+        :param int percent: Threshold as a whole percent of the budget, e.g. 80
+        :param str category: Category the rule applies to
+        :param bool total: Applies the rule to the table's total actual and budget
+        :raises ValueError: Raised when the percent is not a positive whole number
+        :raises LookupError: Raised when the category does not exist
+        :raises sqlite3.IntegrityError: Raised when the same rule exists already
+        :returns: Id of the new rule
+        """
+
+        if isinstance(percent, bool) or not isinstance(percent, int) or percent <= 0:
+            raise ValueError(f"{percent} is not a whole percent above zero.")
+
+        try:
+            self.begin_write("add_alert_rule")
+            category_id = self.get_category(table_name, category)[0] if category else None
+            scope = "category" if category else "total" if total else "every"
+            self.cursor.execute("INSERT INTO alert_rules(table_name, scope, category_id, percent) VALUES(?,?,?,?)",
+                                (table_name, scope, category_id, percent))
+            rule_id = self.cursor.lastrowid
+            self.commit()
+            return rule_id
+        except Exception:
+            self.rollback()
+            raise
+
+    @measured
+    def remove_alert_rule(self, rule_id):
+        """ Removes a threshold rule.
+        :returns: True when a rule was removed
+        """
+
+        try:
+            self.begin_write("remove_alert_rule")
+            self.cursor.execute("DELETE FROM alert_rules WHERE id = ?", (rule_id,))
+            removed = self.cursor.rowcount > 0
+            self.commit()
+            return removed
+        except Exception:
+            self.rollback()
+            raise
+
+    def get_alert_rules(self):
+        """ Lists the threshold rules.
+        :returns: List of (id, table_name, scope, category name or None, percent)
+        """
+
+        self.cursor.execute('''SELECT r.id, r.table_name, r.scope, coalesce(e.category, i.category), r.percent
+                               FROM alert_rules r
+                               LEFT JOIN expenses e ON r.table_name = 'expenses' AND e.id = r.category_id
+                               LEFT JOIN incomes i ON r.table_name = 'incomes' AND i.id = r.category_id
+                               ORDER BY r.table_name, r.scope, r.category_id, r.percent''')
+        return self.cursor.fetchall()
+
+    def get_alerts(self, after=0, limit=100):
+        """ Reads alerts from the outbox in the order they were raised. Consumers pass the id of
+        the last alert they handled, so nothing is read twice and no summary is recomputed.
+        :param int after: Id of the last alert already handled
+        :param int limit: Most alerts returned
+        :returns: List of alert dictionaries; 'category' is None for alerts on a table's total
+        """
+
+        self.cursor.execute('''SELECT id, at, table_name, category, percent, actual, budget FROM alerts
+                               WHERE id > ? ORDER BY id LIMIT ?''', (after, limit))
+        return [{"id": alert_id, "at": at[:19], "table": table_name, "category": category, "percent": percent,
+                 "actual": Money(actual), "budget": Money(budget)}
+                for alert_id, at, table_name, category, percent, actual, budget in self.cursor.fetchall()]
+
+    @measured
+    def acknowledge_alerts(self, up_to):
+        """ Deletes handled alerts from the outbox, keeping it small.
+        :param int up_to: Id of the last alert handled
+        :returns: Number of alerts deleted
+        """
+
+        try:
+            self.begin_write("acknowledge_alerts")
+            self.cursor.execute("DELETE FROM alerts WHERE id <= ?", (up_to,))
+            deleted = self.cursor.rowcount
+            self.commit()
+            return deleted
+        except Exception:
+            self.rollback()
+            raise
+
+    def on_alert(self, callback):
+        """ Calls 'callback' with each alert raised from now on, after the commit that raised it.
+        Alerts committed by other connections are delivered after this tracker's next commit.
+        :param callable callback: Function taking one alert dictionary, see get_alerts()
+        """
+
+        if not self.alert_callbacks:
+            self.cursor.execute("SELECT coalesce(max(id), 0) FROM alerts")
+            self.alert_seen = self.cursor.fetchone()[0]
+        self.alert_callbacks.append(callback)
+
+    def deliver_alerts(self):
+        """ Passes the alerts raised since the last delivery to the on_alert() callbacks. """
+
+        while True:
+            alerts = self.get_alerts(self.alert_seen)
+            for alert in alerts:
+                self.alert_seen = alert["id"]
+                for callback in self.alert_callbacks:
+                    callback(alert)
+            if len(alerts) < 100:
+                break
+
+
+##############################################################################################################
+# STRESS TEST
+
+def stress_worker(worker_id, operations, tracker):
+    """ Runs one stress test worker: alternately adds a category and records a transaction
+    against a random category, each in its own write transaction.
+    :param int worker_id: Number of this worker, used in category names
+    :param int operations: Number of writes to make
+    :param dict counts: Number of categories added, transactions recorded and failed writes
+    :returns: Dictionary of counts
+    """
+
+    counts = {"added": 0, "updated": 0, "errors": 0}
+
+    for number in range(operations):
+        table_name = random.choice(("expenses", "incomes"))
+
+        try:
+            tracker.begin_write()
+            if number % 2 == 0:
+                tracker.insert_category(table_name, f"Worker {worker_id} category {number}")
+                counts["added"] += 1
+            else:
+                tracker.cursor.execute(f"SELECT id FROM {table_name} ORDER BY random() LIMIT 1")
+                tracker.record_transaction(table_name, tracker.cursor.fetchone()[0], Money(random.randint(1, 10000)),
+                                           description=f"Worker {worker_id}")
+                counts["updated"] += 1
+            tracker.commit()
+
+        except Exception as error_msg:
+            tracker.rollback()
+            counts["errors"] += 1
+
+    return counts
+
+
+def stress_test(workers, operations):
+    """ Runs several worker processes that write to one fresh database at the same time, then
+    checks that no category was lost and every actual still matches its ledger.
+    :param int workers: Number of worker processes
+    :param int operations: Number of writes per worker
+    :param list results: Counts reported by each worker
+    :param dict checks: Consistency checks on the final database
+    :returns: True when every write succeeded and the database is consistent
+    """
+
+    import subprocess
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        env = dict(os.environ, TRACKER_DB=os.path.join(temp_dir, "stress_db"), TRACKER_CONCURRENT="1")
+        worker_command = [sys.executable, os.path.abspath(__file__), "stress-worker"]
+
+        # Create and migrate the database once before the workers start
+        subprocess.run(worker_command + ["0", "0"], env=env, check=True, capture_output=True)
+
+        start_time = time.perf_counter()
+        processes = [subprocess.Popen(worker_command + [str(worker_id), str(operations)], env=env,
+                                      stdout=subprocess.PIPE, text=True)
+                     for worker_id in range(1, workers + 1)]
+        results = [json.loads(process.communicate()[0].strip().splitlines()[-1]) for process in processes]
+        elapsed = time.perf_counter() - start_time
+
+        stress_db = sqlite3.connect(env["TRACKER_DB"])
+        checks = {}
+        added = sum(result["added"] for result in results)
+        found = sum(stress_db.execute(f"SELECT count(*) FROM {table_name} WHERE category LIKE 'Worker %'").fetchone()[0]
+                    for table_name in ("expenses", "incomes"))
+        checks["categories"] = found == added
+        for table_name in ("expenses", "incomes"):
+            mismatches = stress_db.execute(f'''SELECT count(*) FROM {table_name} t WHERE t.actual !=
+                                               (SELECT coalesce(sum(amount), 0) FROM {table_name}_ledger WHERE category_id = t.id)''').fetchone()[0]
+            checks[f"{table_name} actuals"] = mismatches == 0
+        stress_db.close()
+
+    writes = sum(result["added"] + result["updated"] for result in results)
+    errors = sum(result["errors"] for result in results)
+    print(f"{workers} workers made {writes} writes in {elapsed:.2f}s ({writes / elapsed:,.0f} writes/sec), {errors} failed.")
+    print(f"Categories added: {added}, found in database: {found}.")
+    for check, passed in checks.items():
+        print(f"{check}: {'OK' if passed else 'FAILED'}")
+
+    return errors == 0 and all(checks.values())
+
+
+##############################################################################################################
+# DISPLAY FUNCTIONS
+
+""" Tables are rendered through a renderer: TabulateRenderer (the default) or PlainRenderer, a
+fixed-width formatter that needs no third-party package and does a single pass over the rows.
+TRACKER_RENDERER=plain selects it, and set_renderer() swaps in any object with a render()
+method. Large tables are shown a page at a time (see Tracker.get_page), and TRACKER_AUTO_VIEW=0
+stops the menus from showing the table again after every change.
 """
 
-##############################################################################################################
-# IMPORT LIBRARIES
+# Show the table again after each change made from the expense and income menus.
+auto_view = os.environ.get("TRACKER_AUTO_VIEW") != "0"
+
+
+def is_number(text):
+    """ Checks whether text reads as a number, e.g. a pre-formatted total. """
+
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
+
+
+class PlainRenderer:
+    """ Renders fixed-width text tables. Columns of numbers (and Money) are right-aligned with
+    'floatfmt' applied to fractional values, everything else is left-aligned.
+    """
+
+    def render(self, rows, headers, floatfmt=".2f"):
+        """ Renders rows below a header line.
+        :param list rows: Rows of values
+        :param list headers: Column headings
+        :param str floatfmt: Format applied to floats and Money
+        :returns: The table as text
+        """
+
+        numeric = [True] * len(headers)
+        cells = []
+        for row in rows:
+            cell_row = []
+            for column, value in enumerate(row):
+                if isinstance(value, (float, Money)):
+                    cell_row.append(format(value, floatfmt))
+                elif isinstance(value, int) and not isinstance(value, bool):
+                    cell_row.append(str(value))
+                else:
+                    cell_row.append("" if value is None else str(value))
+                    if numeric[column] and cell_row[-1]:
+                        numeric[column] = is_number(cell_row[-1])
+            cells.append(cell_row)
+
+        widths = [max([len(header)] + [len(row[column]) for row in cells]) for column, header in enumerate(headers)]
+        aligns = [str.rjust if is_numeric else str.ljust for is_numeric in numeric]
+
+        lines = ["  ".join(align(header, width) for header, width, align in zip(headers, widths, aligns)).rstrip(),
+                 "  ".join("-" * width for width in widths)]
+        lines += ["  ".join(align(cell, width) for cell, width, align in zip(row, widths, aligns)).rstrip() for row in cells]
+
+        return "\n".join(lines)
+
+
+class TabulateRenderer:
+    """ Renders tables with the tabulate package. """
+
+    def render(self, rows, headers, floatfmt=".2f"):
+        from tabulate import tabulate
+
+        # https://stackoverflow.com/questions/37079957/pythons-tabulate-number-of-decimal
+        # Accessed 16 Sep 2023, Wanted to know how to format numbers using tabulate module
+        # Whitespace is kept so sub-categories stay indented
+        return tabulate(rows, headers=headers, floatfmt=floatfmt, preserve_whitespace=True)
+
+
+renderers = {"plain": PlainRenderer, "tabulate": TabulateRenderer}
+renderer = renderers.get(os.environ.get("TRACKER_RENDERER"), TabulateRenderer)()
+
+
+def set_renderer(new_renderer):
+    """ Chooses how tables are rendered.
+    :param new_renderer: 'plain', 'tabulate' or an object with a render(rows, headers, floatfmt) method
+    :raises ValueError: Raised for an unknown renderer name
+    """
+
+    global renderer
+
+    if isinstance(new_renderer, str):
+        if new_renderer not in renderers:
+            raise ValueError(f"Unknown renderer {new_renderer}. Choose from: {', '.join(renderers)}.")
+        new_renderer = renderers[new_renderer]()
+
+    renderer = new_renderer
+
+
+def render_table(rows, headers, floatfmt=".2f"):
+    """ Renders a table with the current renderer. Without the tabulate package tables are
+    rendered as plain text.
+    :returns: The table as text
+    """
+
+    try:
+        return renderer.render(rows, headers, floatfmt)
+    except ImportError:
+        set_renderer("plain")
+        return renderer.render(rows, headers, floatfmt)
+
+
+@measured
+def view_tables(table_name, tracker):
+    """ Views both expense or income tables in net format.
+    Sub-categories are indented below their parent, and categories with sub-categories also show
+    the subtotal of everything below them. The rendered table is kept in the summary cache, so
+    repeated views cost a cache lookup until the next write.
+    :param str table_name: Name of table to be displayed
+    :param list table: All rows of the specified table
+    :param bool grouped: True when some category has sub-categories, adding the subtotal columns
+    :param tuple totals: Total actual and budget for the table from the summary engine
+    :returns: Tabulate table categories and amounts in readable format
+    """
+
+    cache_key = ("view", table_name)
+    rendered = tracker.summary_cache_get(cache_key)
+
+    # Large tables show their first page only, browse_table() pages through the rest
+    category_count = tracker.count_categories(table_name)
+    if category_count > page_size:
+        if rendered is None:
+            rows = tracker.get_page(table_name)[0]
+            rendered = f"Showing the first {len(rows)} of {category_count} entries in {table_name}:\n" + render_page(table_name, tracker, rows)
+            tracker.summary_cache[cache_key] = rendered
+        print(rendered)
+        print("\n")
+        return
+
+    if rendered is None:
+        tree = tracker.get_tree(table_name)
+        grouped = any(row[7] for row in tree)
+        headers = ["ID","CATEGORY","ACTUAL (RANDS)","BUDGET (RANDS)"]
+
+        table = []
+        for category_id, category, depth, actual, budget, subtotal_actual, subtotal_budget, sub_categories in tree:
+            row = [category_id, "  " * depth + category, actual, budget]
+            if grouped:
+                row += [subtotal_actual, subtotal_budget] if sub_categories else ["", ""]
+            table.append(row)
+
+        actual_total, budget_total = tracker.get_totals((table_name,))[table_name]
+        table.append(["","TOTAL",format(actual_total, ".2f"), format(budget_total, ".2f")])
+
+        if grouped:
+            headers += ["SUBTOTAL ACTUAL", "SUBTOTAL BUDGET"]
+
+        rendered = render_table(table, headers=headers, floatfmt = ".2f")
+        tracker.summary_cache[cache_key] = rendered
+
+    print(f"Showing entries in {table_name}:")
+    print(rendered)
+    print("\n")
+
+
+def render_page(table_name, tracker, rows):
+    """ Renders one page of categories from Tracker.get_page() with the table's totals.
+    :param list rows: (id, category, parent category, actual, budget) rows
+    :returns: The page as text
+    """
+
+    actual_total, budget_total = tracker.get_totals((table_name,))[table_name]
+    table = [[category_id, category, parent or "", actual, budget] for category_id, category, parent, actual, budget in rows]
+    table.append(["", "TOTAL", "", format(actual_total, ".2f"), format(budget_total, ".2f")])
+
+    return render_table(table, headers=["ID", "CATEGORY", "PARENT", "ACTUAL (RANDS)", "BUDGET (RANDS)"], floatfmt=".2f")
+
+
+def view_after_change(table_name, tracker):
+    """ Shows the table again after a change, unless automatic views are switched off. """
+
+    if auto_view:
+        view_tables(table_name, tracker)
+
+
+def toggle_auto_view():
+    """ Switches the table view after each change off or on.
+    :returns: True when the view is now on
+    """
+
+    global auto_view
+    auto_view = not auto_view
+    return auto_view
+
+
+def browse_table(table_name, tracker):
+    """ Shows a table a page at a time, in category order or largest actual first (top-N).
+    Each page is fetched on its own with keyset pagination. Tables that fit on one page are shown whole.
+    :param str order: 'id' for category order or 'actual' for largest actual first
+    :param list page_keys: Keys of the pages shown so far, so 'p' can go back
+    :returns: Visual output of the pages
+    """
+
+    category_count = tracker.count_categories(table_name)
+    if category_count <= page_size:
+        view_tables(table_name, tracker)
+        return
+
+    order = "id"
+    page_keys = [None]
+
+    while True:
+        rows, next_key = tracker.get_page(table_name, order, page_keys[-1])
+        first = (len(page_keys) - 1) * page_size + 1
+        print(f"Showing entries {first}-{first + len(rows) - 1} of {category_count} in {table_name}"
+              f"{', largest actual first' if order == 'actual' else ''}:")
+        print(render_page(table_name, tracker, rows))
+
+        page_choice = input("\nn - Next page, p - Previous page, t - Largest actuals first, c - Category order, q - Back\n").strip().lower()
+
+        if page_choice == "n" and next_key:
+            page_keys.append(next_key)
+        elif page_choice == "n":
+            print("This is the last page.")
+        elif page_choice == "p" and len(page_keys) > 1:
+            page_keys.pop()
+        elif page_choice in ("t", "c"):
+            order = "actual" if page_choice == "t" else "id"
+            page_keys = [None]
+        elif page_choice == "q":
+            break
+
+
+@measured
+def budget_summary(income_table, expense_table, tracker, start_period=None, end_period=None):
+    """ Function calculates difference between income and spend and outputs result.
+    :param str start_period: First month ('YYYY-MM') to summarise, or None for all-time figures
+    :param str end_period: Last month to summarise, defaults to start_period
+    :param dict summary: Totals and variances for income, expenses and savings from the summary engine
+    :param list table: Prepares budget item summary for tabulate function
+    :raises Exception: Raises error message when unable to perform queries
+    :returns: Visual output of budget summary table, and progress towards goals
+    """
+
+    try:
+        # Extract totals from budget and actual fields in expenses and income tables
+        summary = tracker.get_summary(income_table, expense_table, start_period, end_period)
+        income_variance = summary["income_variance"]
+        expense_variance = summary["expense_variance"]
+        savings_variance = summary["savings_variance"]
+
+        # Prepare data for tabulate function
+        table = [["Income:", summary["total_income"], summary["budget_income"], income_variance],
+                ["Expenses:", summary["total_expenses"], summary["budget_expenses"], expense_variance],
+                ["SAVINGS:", summary["actual_difference"], summary["budget_difference"], savings_variance]]
+
+        print(render_table(table, headers = ["CATEGORY", "ACTUAL (RANDS)", "BUDGET (RANDS))", "VARIANCE (RANDS))"], floatfmt = ".2f"))
+        print("\n")
+
+        # Determine if user is ahead or behind on income goals
+        if income_variance < 0:
+            print(f"You have earned R{format(-income_variance, '.2f')} less than planned.")
+        elif income_variance > 0:
+            print(f"You have earned R{format(-income_variance, '.2f')} more than planned. Great!!")
+        elif income_variance == 0:
+            print("Your income is exactly as planned. Spot on!")
+
+         # Determine if user is ahead or behind on expense goals
+        if expense_variance > 0:
+            print(f"You have managed to save R{format(expense_variance, '.2f')} on your expenses! You're on track!")
+        elif expense_variance < 0:
+            print(f"Careful! You have spent R{format(-expense_variance, '.2f')} more than budgeted!")
+        elif expense_variance == 0:
+            print("Your spending matches your budget.")
+
+        # Determine if user is ahead or behind on overall goals
+        if savings_variance < 0:
+            print(f"Between income and expenses, you are R{format(-savings_variance, '.2f')} behind your goal!")
+        elif savings_variance > 0:
+            print(f"Between income and expenses, you are R{format(savings_variance, '.2f')} ahead of your goal! Keep going!")
+        elif savings_variance == 0:
+            print("You are breaking even in terms of your goals. ")
+
+        # Subtotals of categories that have sub-categories, from the precomputed rollups
+        for table_name in (income_table, expense_table):
+            groups = tracker.get_groups(table_name, start_period, end_period)
+            if groups:
+                table = [["  " * depth + category, subtotal_actual, subtotal_budget,
+                          subtotal_actual - subtotal_budget if table_name == income_table else subtotal_budget - subtotal_actual]
+                         for category_id, category, depth, subtotal_actual, subtotal_budget in groups]
+                print(f"\nSubtotals of {table_name} category groups:")
+                print(render_table(table, headers = ["CATEGORY GROUP", "ACTUAL (RANDS)", "BUDGET (RANDS)", "VARIANCE (RANDS)"], floatfmt = ".2f"))
+
+    except Exception as error_msg:
+        print("Unable to extract budget summary.")
+
+
+def period_summary(tracker):
+    """ Shows the budget summary for a month, a range of months, a year or the year to date,
+    followed by the same figures for the same months a year earlier.
+    :param str start_period: First month of the selected range
+    :param str end_period: Last month of the selected range
+    :param dict comparison: Current and previous-year summaries from the summary engine
+    :raises Exception: Raises error message when the period is not valid or queries fail
+    :returns: Visual output of the period budget summary and year-over-year comparison
+    """
+
+    try:
+        start_period, end_period = period_range(input("Enter a month (YYYY-MM), range (YYYY-MM:YYYY-MM), year (YYYY) or 'ytd': "))
+
+        print(f"Budget summary for {start_period} to {end_period}:")
+        budget_summary("incomes", "expenses", tracker, start_period, end_period)
+
+        comparison = tracker.compare_years(start_period, end_period)
+        current, previous = comparison["current"], comparison["previous"]
+        table = [[label, current[key], previous[key], current[key] - previous[key]]
+                 for label, key in (("Income:", "total_income"), ("Expenses:", "total_expenses"), ("SAVINGS:", "actual_difference"))]
+
+        print(f"\nCompared with {previous['start']} to {previous['end']}:")
+        print(render_table(table, headers=["CATEGORY", "THIS PERIOD (RANDS)", "YEAR BEFORE (RANDS)", "CHANGE (RANDS)"], floatfmt=".2f"))
+        print("\n")
+
+    except Exception as error_msg:
+        print(f"Unable to extract period summary. {error_msg}")
+
 
-""" Import sqlite3 and tabulate libraries. Sqlite3 performs database manipulation
-and tabulate is used to represent output in neat and readable format.
-"""
-import sqlite3
-from tabulate import tabulate
-import os
+def forecast_summary(tracker):
+    """ Ranks random what-if scenarios (category cuts and income and spending growth) by the
+    savings they project, using the NumPy forecast engine in tracker_forecast.
+    :param Tracker tracker: Tracker whose categories are forecast
+    :param int months: Number of months to project
+    :param float goal: Optional savings goal in rands
+    :raises Exception: Raises error message when NumPy is missing or the input is not valid
+    :returns: Visual output of the best scenarios
+    """
 
+    try:
+        try:
+            import tracker_forecast
+        except ImportError:
+            print("The forecast needs NumPy. Install it with: pip install numpy")
+            return
 
-##############################################################################################################
-# DATABASE FUNCTIONS
+        months = int(input("How many months would you like to forecast? ").strip() or 12)
+        goal = input("Enter a savings goal (or leave blank): ").strip()
+        goal = float(Money.parse(goal)) if goal else None
 
-# Reference the path to the database file.
-# https://note.nkmk.me/en/python-script-file-path/
-# Accessed on 25 October 2023, wanted to know more about relative file referencing
-# and include the db in folder.
-db_file = os.path.join(os.path.dirname(__file__), 'tracker_db')
+        results, elapsed, scenario_count = tracker_forecast.forecast(tracker, months=months, goal=goal)
+        tracker_forecast.print_forecast(results, months)
+        print(f"\nRanked {scenario_count} scenarios in {elapsed * 1000:.1f} ms.\n")
 
+    except Exception as error_msg:
+        print(f"Unable to forecast savings. {error_msg}")
 
-def create_connection(db_file):
-    """Attempt connecting to budget database and return error if unable.
-    :param db: Database object
-    :param cursor: Cursor object
-    :param bool using_app: Indicates whether app is in use
-    :raises Exception: Raises error when unable to connect
-    :returns: Active database connection, cursor and app_status is True
+
+def alert_message(alert):
+    """ Describes an alert from the outbox in a sentence.
+    :param dict alert: Alert as returned by Tracker.get_alerts()
+    :returns: Alert message
     """
-    
-    db = None
-    
-    try:
-        db = sqlite3.connect(db_file)
-        cursor = db.cursor()
-        using_app = True
-        
-    except Exception as e:
-        print(e)
-        print("Could not connect to database. Exiting app. ")
-        exit()
-        
-    # Database is closed upon exit of main menu
-    return db, cursor, using_app
 
+    goal = "budget" if alert["table"] == "expenses" else "target"
+    subject = f"Total {alert['table']} have" if alert["category"] is None else f"{alert['category']} has"
 
-# Assign variable and objects by calling create_connection function.
-db, cursor, menu_status = create_connection(db_file)
+    return (f"Alert: {subject} reached {alert['percent']}% of the {goal} "
+            f"(R{alert['actual']:.2f} of R{alert['budget']:.2f}).")
 
 
-def create_expense_table(db, cursor):
-    """ Creates a table called 'expense_table' in the database if nothing currently exists
-    or ignores if table does exist.
-    :param list initial_data: Dummy-data to initialise table
-    :raises Exception: Raises error when unable to create table and does db rollback.
-    :returns: Expense table created in database 'db' and commits db
+def view_alerts(tracker):
+    """ Shows the alerts raised since they were last viewed (and clears them from the outbox),
+    then the threshold rules, and lets the user add or remove a rule.
+    :param list alerts: Unacknowledged alerts from the outbox
+    :param str rule_choice: 'a' to add a rule, 'r' to remove one, blank to go back
+    :raises Exception: Raises error message when the input is not valid
+    :returns: Visual output of alerts and rules
     """
-    
+
     try:
-        cursor.execute('''CREATE TABLE IF NOT EXISTS expenses(id INTEGER PRIMARY KEY, category TEXT, actual REAL, budget REAL)''')
-        initial_data = [[1,"None", 0, 0]]
-    
-        # https://stackoverflow.com/questions/29721656/most-efficient-way-to-do-a-sql-insert-if-not-exists
-        # Accessed 29 Sep 2023, How to ignore if data already exists. 
-        cursor.executemany('''INSERT OR IGNORE INTO expenses(id, category, actual, budget) VALUES(?,?,?,?)''',initial_data)
-        db.commit()
-        
+        alerts = tracker.get_alerts(limit=1000)
+        if alerts:
+            for alert in alerts:
+                print(f"{alert['at']}  {alert_message(alert)}")
+            tracker.acknowledge_alerts(alerts[-1]["id"])
+        else:
+            print("There are no new alerts.")
+
+        print("\nAlert rules:")
+        print(render_table([[rule_id, table_name, category or ("(total)" if scope == "total" else "(each category)"), f"{percent}%"]
+                        for rule_id, table_name, scope, category, percent in tracker.get_alert_rules()],
+                       headers=["ID", "TABLE", "CATEGORY", "THRESHOLD"]))
+
+        rule_choice = input("\nEnter 'a' to add a rule, 'r' to remove one, or leave blank to go back: ").strip().lower()
+
+        if rule_choice == "a":
+            table_name = "incomes" if input("Expenses or incomes (e/i)? ").strip().lower() == "i" else "expenses"
+            percent = int(input("Alert at what percent of the budget? ").strip())
+            category = input("Enter a category, 'total' for the table's total, or leave blank for each category: ").strip()
+            total = category.lower() == "total"
+            tracker.add_alert_rule(table_name, percent, None if total else category or None, total)
+            print(f"Added an alert at {percent}% of the budget.")
+
+        elif rule_choice == "r":
+            rule_id = int(input("Enter the ID of the rule to remove: ").strip())
+            if tracker.remove_alert_rule(rule_id):
+                print(f"Removed alert rule {rule_id}.")
+            else:
+                print(f"There is no alert rule {rule_id}.")
+
     except Exception as error_msg:
-        db.rollback()
-        print("Unexpected error. Table might already exist")
+        print(f"Unable to update alerts. {error_msg}")
+
 
+##############################################################################################################
+# MENU ACTIONS
 
-def create_income_table(db, cursor):
-    """ Creates a table called 'income_table" in the database if nothing currently exists
-    or ignores if table does exist
-    param list initial_data: Dummy-data to initialise table.
-    :returns: Income table created in database 'db' and commits db
+def find_category(table_name, tracker, prompt):
+    """ Asks for a category and looks it up. When the name does not match exactly, the closest
+    names from the category search are offered to pick from.
+    :param str prompt: Question asked for the category name
+    :param list matches: Ranked category names similar to the one entered
+    :raises LookupError: Raised when the category is not found and no suggestion is picked
+    :returns: (id, category, actual, budget) row of the category
     """
-    
+
+    category = input(prompt)
+
     try:
-        cursor.execute('''CREATE TABLE IF NOT EXISTS incomes(id INTEGER PRIMARY KEY, category TEXT, actual REAL, budget REAL )''')
-        initial_data = [[1,"None", 0, 0]]
-    
-        cursor.executemany('''INSERT OR IGNORE INTO incomes(id, category, actual, budget) VALUES(?,?,?,?)''',initial_data)
-        db.commit()
-        
-    except Exception as error_msg:
-        db.rollback()
-        print("Unexpected error. Table might already exist")
+        return tracker.get_category(table_name, category)
+    except LookupError:
+        matches = tracker.search_categories(table_name, category)
+        if not matches:
+            raise
+
+    print(f"{category} is not a category in {table_name}. Did you mean:")
+    for number, match in enumerate(matches, start=1):
+        print(f"{number} - {match}")
 
+    choice = input("Enter a number to pick a category, or anything else to cancel: ").strip()
+    if choice.isdigit() and 1 <= int(choice) <= len(matches):
+        return tracker.get_category(table_name, matches[int(choice) - 1])
+
+    raise LookupError(f"{category} is not a category in {table_name}.")
+
+
+def search_categories(table_name, tracker):
+    """ Searches categories by full or partial name, allowing for typos
+    :param str text: Text to search for
+    :param list matches: Ranked category names matching the text
+    :returns: Visual output of the matching categories and their amounts
+    """
+
+    try:
+        text = input("Enter part of a category name to search for: ")
+        matches = tracker.search_categories(table_name, text)
+
+        if matches:
+            table = [tracker.get_category(table_name, category) for category in matches]
+            print(render_table(table, headers=["ID", "CATEGORY", "ACTUAL (RANDS)", "BUDGET (RANDS)"], floatfmt=".2f"))
+        else:
+            print(f"No categories in {table_name} match {text}.")
 
-create_expense_table(db, cursor)
-create_income_table(db,cursor)
+    except Exception as error_msg:
+        print(f"Unable to search categories. {error_msg}")
 
 
-def add_category(table_name, db, cursor):
+def add_category(table_name, tracker):
     """ Adds a category to either an income or expense table
     :param str table_name: Name of the table where category is added
-    :param str new_addition: Name of new income or expense category 
-    :param str max_query: Query string to find last row
-    :param str status_query: Query string used to find category name that matches id
-    :param str insert_query: Query string that runs to insert new row
-    :param int last_id: Value assigned to last entry primary key in the database table
+    :param str new_addition: Name of new income or expense category
+    :param str parent: Name of the parent category, blank for a top-level category
     :returns: A new income or expense category added to either the income or expense table
     """
-    
-    max_query = f"SELECT max(id) FROM {table_name}"
-    status_query = f"SELECT * FROM {table_name} WHERE id = ?"
-    insert_query = f"INSERT OR REPLACE INTO {table_name}(id, category, actual, budget) VALUES(?,?,?,?)"
-    
+
     new_addition = None
-    
-    try: 
-        
-        check_query = f"SELECT category FROM {table_name}"
-        cursor.execute(check_query)
-        category_list = cursor.fetchall()
-        clean_category_list = [item[0] for item in category_list]
-        
+
+    try:
+
         while True:
             # Implementing loop to ensure user enters category that does not already exist
             new_addition = input("Please enter the category you would like to add:")
-            if new_addition in clean_category_list:
+            if tracker.category_exists(table_name, new_addition):
                 # The user might want to change fonts to assign different meaning to the category
                 print(f"That category already exists in {table_name}. Change the category or font.")
             else:
                 break
-        
-        cursor.execute(max_query)
-        last_id = cursor.fetchone()[0]
-        last_id = int(last_id)
-        cursor.execute(status_query,(last_id,))
-        table_status = cursor.fetchone()[1]
-        
-        # Check if last primary key (id) corresponds to the initial default value
-        # If it's 'None' then replace, otherwise add a new row.
-        if last_id == 1 and table_status == "None":
-            new_category = [last_id, new_addition, 0, 0]
-            cursor.execute(insert_query, new_category)
-            
-        else:
-            last_id +=1
-            new_category = [last_id, new_addition, 0, 0]
-            cursor.execute(insert_query, new_category)
 
-        db.commit()
-        
+        parent = input("Enter the parent category to add it under (or leave blank): ").strip()
+        tracker.add_category(table_name, new_addition, parent or None)
+
+    except Exception as error_msg:
+        print(f"Unable to create category. {error_msg}")
+
+
+def move_category(table_name, tracker):
+    """ Moves an income or expense category, with its sub-categories, under another category
+    :param str category: Name of category to be moved
+    :param str parent: Name of the new parent category, blank to make it a top-level category
+    :raises Exception: Error raised when a category is not found or the move would create a loop
+    :returns: Income or expense table with the category in its new place
+    """
+
+    try:
+        category = find_category(table_name, tracker, "Which category would you like to move? ")[1]
+        parent = input("Enter the new parent category (or leave blank for a top-level category): ").strip()
+
+        tracker.move_category(table_name, category, parent or None)
+        print(f"{category} is now {'under ' + parent if parent else 'a top-level category'}.")
+
     except Exception as error_msg:
-        db.rollback()
-        print("Unable to create category.")
+        print(f"Unable to move category. {error_msg}")
 
 
-def remove_category(table_name, db, cursor):
+def remove_category(table_name, tracker):
     """ Removes an income or expense category from either the income or expense table
     :param str category: Name of category to be removed from table
-    :param str delete_query: String query to delete category from given table name
     :param str table_name: Name of relevant table to be modified in the database
-    :raises Exception: Error raised when unable to execute query or find category and does db rollback
-    :returns: Income or expense table where relevant category has been removed and commits database
+    :raises Exception: Error raised when unable to execute query or find category
+    :returns: Income or expense table where relevant category has been removed
     """
     category = None
-    
+
     try:
-        category = input("What category would you like to remove?")
-        delete_query = f"DELETE FROM {table_name} WHERE category = ?"
-        
+        category = find_category(table_name, tracker, "What category would you like to remove?")[1]
+
         user_confirm = input(f"Are you sure you want to remove: {category}?. Type 'Y' to confirm, or anything else to abort.").lower()
-        
-        if user_confirm == "y":  
-            cursor.execute(delete_query, (category,))
+
+        if user_confirm == "y":
+            tracker.remove_category(table_name, category)
             print(f"You have removed category: {category} from {table_name}. ")
-            db.commit()
         else:
             print("No changes made.")
-        
+
     except Exception as error_msg:
-        db.rollback()
         print("Unable to remove category.")
 
 
-def update_actual(table_name, db, cursor):
+def update_actual(table_name, tracker):
     """ Changes the amount currently allocated to an income or expense item
     :param str table_name: Name of relevant income or expense table to be modified
     :param str category: Name of category where amount is to be updated
-    :param str query: String query to select data from table specified
     :param float new_actual: The updated amount to be allocated to the expense or income item
-    :param str update_query: Query string to set new values for specified category and table
-    :raises Exception: Error message when unable to update amount and does db rollback
-    :returns: Updated income or expense amount in relevant table and commits db
-    """ 
+    :raises Exception: Error message when unable to update amount
+    :returns: Adjustment transaction recorded against the category (which updates its actual)
+    """
 
     print("Displaying category items:")
-    view_tables(table_name, cursor)
-    
+    view_tables(table_name, tracker)
+
     category = None
-    
+
     try:
-        category = input("Specify the category where you want to update amount: ")
-        query = f"SELECT * FROM {table_name} WHERE category = ?"
-        cursor.execute(query, (category,))
-        edit_item = cursor.fetchone()
+        edit_item = find_category(table_name, tracker, "Specify the category where you want to update amount: ")
+        category = edit_item[1]
         print(f"You are making changes to {edit_item[1]} and amount of R{edit_item[2]}")
-        
+
         while True:
             try:
-                new_actual = float(input("Specify the new amount: "))
+                new_actual = Money.parse(input("Specify the new amount: ").strip())
                 break
             except Exception:
                 print("Please enter a valid number.")
-        
-        new_actual = round(new_actual, 2)
-        update_query = f"UPDATE {table_name} SET actual = ? WHERE category = ?"
-        cursor.execute(update_query, (new_actual, category))
-        db.commit()
-        
+
+        tracker.update_actual(table_name, category, new_actual)
+
     except Exception as error_msg:
-        db.rollback()
         print("Unable to update. Please enter a valid category (case sensitive).")
 
 
-def update_goal(table_name, db, cursor):
+def update_goal(table_name, tracker):
     """ This function allows a user to enter goals, i.e.: budgets for expenses
     and targets for income categories
     :param str table_name: Name of relevant income or expense table to be modified
     :param str category: Name of category where amount is to be updated
-    :param str query: String query to select data from table specified
     :param float new_target: The updated budget / target value to be allocated to the category
-    :param str update_query: Query string to set new target for specified category and table
-    :raises Exception: Error message when unable to update amount and does db rollback
-    :returns: Updated income or expense target in relevant table and commits db
+    :raises Exception: Error message when unable to update amount
+    :returns: Updated income or expense target in relevant table
     """
-    
+
     print("Displaying category items:")
-    view_tables(table_name, cursor)
-    
+    view_tables(table_name, tracker)
+
     category = None
-    
+
     try:
-        category = input("Specify the category where you want to update goals: ")
-        query = f"SELECT * FROM {table_name} WHERE category = ?"
-        cursor.execute(query, (category,))
-        edit_item = cursor.fetchone()
+        edit_item = find_category(table_name, tracker, "Specify the category where you want to update goals: ")
+        category = edit_item[1]
         print(f"You are making changes to {edit_item[1]} and current target of R{edit_item[3]}")
-        
+
         while True:
             try:
-                new_target = float(input("Specify the new target value: "))
+                new_target = Money.parse(input("Specify the new target value: ").strip())
                 break
             except Exception:
                 print("Please enter a valid number.")
-        
-        new_target = round(new_target, 2)
-        update_query = f"UPDATE {table_name} SET budget = ? WHERE category = ?"
-        cursor.execute(update_query, (new_target, category))
-        db.commit()
-        
+
+        tracker.update_goal(table_name, category, new_target)
+
     except Exception as error_msg:
-        db.rollback()
         print("Unable to update. Please enter a valid category (case sensitive).")
 
 
-def view_tables(table_name, cursor):
-    """ Views both expense or income tables in net format.
-    :param str table_name: Name of table to be displayed
-    :param str query: String query to retrieve all data from specified table
-    :param str get_total: String query to get total of amounts
-    :returns: Tabulate table categories and amounts in readable format
+def update_period_goal(table_name, tracker):
+    """ Sets the budget (expenses) or target (incomes) of a category for a single month,
+    leaving the category's standing budget and other months unchanged.
+    :param str table_name: Name of relevant income or expense table to be modified
+    :param str category: Name of category where the monthly goal is to be set
+    :param str period: Month the goal applies to (YYYY-MM)
+    :param float new_target: The budget / target value for that month
+    :raises Exception: Error message when unable to update amount
+    :returns: Updated monthly goal in the relevant periods table
     """
-    
-    query = f"SELECT * FROM {table_name}"
-    get_total_actual = f"SELECT Total(actual) from {table_name}"
-    get_total_budget = f"SELECT Total(budget) from {table_name}"
-    
-    cursor.execute(query)
-    table = cursor.fetchall()
-    
-    cursor.execute(get_total_actual)
-    actual_total = cursor.fetchone()[0]
-    actual_total = format(float(actual_total), ".2f")
-    
-    cursor.execute(get_total_budget)
-    budget_total = cursor.fetchone()[0]
-    budget_total = format(float(budget_total), ".2f")
-    
-    table.append(["","TOTAL",actual_total, budget_total])
-        
-    print(f"Showing entries in {table_name}:")
-    
-    # https://stackoverflow.com/questions/37079957/pythons-tabulate-number-of-decimal
-    # Accessed 16 Sep 2023, Wanted to know how to format numbers using tabulate module
-    print(tabulate(table, headers=["ID","CATEGORY","ACTUAL (RANDS)","BUDGET (RANDS)"], floatfmt = ".2f"))
-    print("\n")  
 
+    category = None
 
-def budget_summary(income_table, expense_table, db, cursor):
-    """ Function calculates difference between income and spend and outputs result.
-    :param str query_total_income: Query to calculate total actual from income table
-    :param str query_budget_income: Query to calculate total budget from income table
-    :param str query_total_expenses: Query to calculate total actuals from expenses table
-    :param str query_budget_expenses: Query to calculate total budgets from expense table
-    :param float total_income: Sum of actual income amounts
-    :param float budget_income: Sum of budget for all income categories
-    :param float total_expenses: Sum of all actual expenses
-    :param float budget_expenses: Sum of budget for all expense categories
-    :param float income_variance: Difference between plan (budget) and actual for income
-    :param float expense_variance: Difference between budget and actual for all expenses
-    :param float actual_difference: The real difference between actual income and actual expenses
-    :param float budget_difference: The difference between planned income and planned (budgeted) expenses
-    :param float savings_variance: Total deviation from goal
-    :param list table: Prepares budget item summary for tabulate function
-    :raises Exception: Raises error message when unable to perform queries
-    :returns: Visual output of budget summary table, and progress towards goals
+    try:
+        edit_item = find_category(table_name, tracker, "Specify the category where you want to set a monthly goal: ")
+        category = edit_item[1]
+
+        while True:
+            try:
+                period = parse_period(input("Specify the month (YYYY-MM): "))
+                break
+            except ValueError as error_msg:
+                print(error_msg)
+
+        while True:
+            try:
+                new_target = Money.parse(input(f"Specify the target value for {edit_item[1]} in {period}: ").strip())
+                break
+            except Exception:
+                print("Please enter a valid number.")
+
+        tracker.set_period_budget(table_name, category, period, new_target)
+        print(f"The {period} target for {edit_item[1]} is now R{format(new_target, '.2f')}.")
+
+    except Exception as error_msg:
+        print("Unable to update. Please enter a valid category (case sensitive).")
+
+
+def add_transaction(table_name, tracker):
+    """ Records a dated transaction against an income or expense category
+    :param str table_name: Name of relevant income or expense table
+    :param str category: Name of category the transaction belongs to
+    :param float amount: Transaction amount added to the category's actual
+    :param str txn_date: Date of the transaction, blank for today
+    :raises Exception: Error message when unable to record transaction
+    :returns: Transaction added to the ledger
     """
-    
-    query_total_income = f"SELECT Total(actual) FROM {income_table}"
-    query_budget_income = f"SELECT Total(budget) FROM {income_table}"
-    
-    query_total_expenses = f"SELECT Total(actual) FROM {expense_table}"
-    query_budget_expenses = f"SELECT Total(budget) FROM {expense_table}"
-    
-    try: 
-        
-        # Extract totals from budget and actual fields in expenses and income tables
-        cursor.execute(query_total_income)
-        total_income = cursor.fetchone()[0]
-            
-        cursor.execute(query_budget_income)
-        budget_income = cursor.fetchone()[0]
-            
-        cursor.execute(query_total_expenses)
-        total_expenses = cursor.fetchone()[0]
-                
-        cursor.execute(query_budget_expenses)
-        budget_expenses = cursor.fetchone()[0]
-
-        income_variance = total_income - budget_income
-        expense_variance = budget_expenses - total_expenses
-        actual_difference = total_income - total_expenses
-        budget_difference = budget_income - budget_expenses
-        savings_variance = actual_difference - budget_difference
-        
-        # Prepare data for tabulate function      
-        table = [["Income:", total_income, budget_income, income_variance],
-                ["Expenses:", total_expenses, budget_expenses, expense_variance],
-                ["SAVINGS:", actual_difference, budget_difference, savings_variance]]
-                
-        print(tabulate(table, headers = ["CATEGORY", "ACTUAL (RANDS)", "BUDGET (RANDS))", "VARIANCE (RANDS))"], floatfmt = ".2f"))
+
+    print("Displaying category items:")
+    view_tables(table_name, tracker)
+
+    try:
+        category = find_category(table_name, tracker, "Specify the category of the transaction: ")[1]
+
+        while True:
+            try:
+                amount = Money.parse(input("Specify the transaction amount: ").strip())
+                break
+            except Exception:
+                print("Please enter a valid number.")
+
+        while True:
+            txn_date = input("Specify the transaction date (YYYY-MM-DD) or leave blank for today: ").strip()
+            try:
+                txn_date = datetime.strptime(txn_date, "%Y-%m-%d").date().isoformat() if txn_date else None
+                break
+            except ValueError:
+                print("Please enter a valid date.")
+
+        description = input("Describe the transaction (optional): ").strip()
+        tracker.add_transaction(table_name, category, amount, txn_date, description)
+
+    except Exception as error_msg:
+        print("Unable to record transaction. Please enter a valid category (case sensitive).")
+
+
+def view_history(table_name, tracker):
+    """ Shows the transaction history of a category and optionally removes a transaction.
+    Removing a transaction subtracts its amount from the category's actual.
+    :param str table_name: Name of relevant income or expense table
+    :param str category: Name of category whose history is shown
+    :param list history: Ledger rows for the category, oldest first
+    :param str remove_id: Ledger id of a transaction to remove, blank to keep all
+    :raises Exception: Error message when unable to read or remove transactions
+    :returns: Tabulated transaction history
+    """
+
+    try:
+        category_id, category = find_category(table_name, tracker, "Specify the category whose history you want to see: ")[:2]
+
+        history = tracker.get_history(table_name, category_id)
+        print(render_table(history, headers=["ID", "DATE", "DESCRIPTION", "AMOUNT (RANDS)"], floatfmt=".2f"))
         print("\n")
-        
-        # Determine if user is ahead or behind on income goals
-        if income_variance < 0:
-            print(f"You have earned R{format(-income_variance, '.2f')} less than planned.")
-        elif income_variance > 0:
-            print(f"You have earned R{format(-income_variance, '.2f')} more than planned. Great!!")
-        elif income_variance == 0:
-            print("Your income is exactly as planned. Spot on!")
-         
-         # Determine if user is ahead or behind on expense goals       
-        if expense_variance > 0:
-            print(f"You have managed to save R{format(expense_variance, '.2f')} on your expenses! You're on track!")
-        elif expense_variance < 0:
-            print(f"Careful! You have spent R{format(-expense_variance, '.2f')} more than budgeted!")
-        elif expense_variance == 0:
-            print("Your spending matches your budget.")
-         
-        # Determine if user is ahead or behind on overall goals       
-        if savings_variance < 0:
-            print(f"Between income and expenses, you are R{format(-savings_variance, '.2f')} behind your goal!")
-        elif savings_variance > 0:
-            print(f"Between income and expenses, you are R{format(savings_variance, '.2f')} ahead of your goal! Keep going!")
-        elif savings_variance == 0:
-            print("You are breaking even in terms of your goals. ")
-        
+
+        remove_id = input("Enter the ID of a transaction to remove, or leave blank to continue: ").strip()
+        if remove_id:
+            if tracker.remove_transaction(table_name, category_id, int(remove_id)):
+                print(f"Removed transaction {remove_id} from {category}.")
+            else:
+                print("No changes made.")
+
     except Exception as error_msg:
-        print("Unable to extract budget summary.")
+        print("Unable to show history. Please enter a valid category (case sensitive).")
+
+
+def import_statement(file_path, tracker, rules_file=None):
+    """ Imports a bank statement and reports how fast it went.
+    :param str file_path: Path to the CSV or OFX statement
+    :param str rules_file: Optional CSV file of keyword to category rules
+    :raises Exception: Error message when the statement cannot be imported
+    :returns: Number of statement rows imported
+    """
+
+    try:
+        imported, elapsed = tracker.import_statement(file_path, rules_file)
+
+    except Exception as error_msg:
+        print(error_msg)
+        print("Unable to import statement.")
+        return 0
+
+    rate = imported / elapsed if elapsed > 0 else 0
+    print(f"Imported {imported} rows from {file_path} in {elapsed:.2f}s ({rate:,.0f} rows/sec).")
+
+    return imported
+
+
+def undo_change(tracker, kind="undo"):
+    """ Undoes the last change, or redoes the last undone change.
+    :param str kind: 'undo' or 'redo'
+    :raises Exception: Error message when there is nothing to undo or redo
+    :returns: Name of the operation undone or redone, or None
+    """
+
+    try:
+        operation = tracker.undo() if kind == "undo" else tracker.redo()
+        print(f"{'Undid' if kind == 'undo' else 'Redid'} {operation.replace('_', ' ')}.")
+        return operation
+
+    except Exception as error_msg:
+        print(error_msg)
+        return None
+
+
+def restore_to(tracker, timestamp=None):
+    """ Lists the latest journaled changes and restores the data to a date and time.
+    :param str timestamp: Date or date and time to restore to, asked for when not given
+    :raises Exception: Error message when the time is not valid or too old to restore
+    :returns: Visual output of the restore
+    """
+
+    try:
+        if timestamp is None:
+            print(render_table(tracker.get_journal(), headers=["ID", "TIME", "OPERATION", "KIND", "CHANGES"]))
+            timestamp = input("Enter the date and time to restore to (YYYY-MM-DD HH:MM:SS): ").strip()
+
+        restored = tracker.restore(timestamp)
+        if isinstance(restored, int):
+            print(f"Undid {restored} transactions. Undo restores the changes again.")
+        else:
+            print(f"Loaded snapshot {restored}.")
+
+    except Exception as error_msg:
+        print(f"Unable to restore. {error_msg}")
 
 
 ##############################################################################################################
 # SUB MENU FUNCTIONS
 
 
-def expense_menu():
+def expense_menu(tracker):
     """ Display the expense management sub-menu.
     :param bool expense_management: Indicates true when menu is active
     :param str user_choice: Selected menu option
     :returns: The menu option selected by the user
-    """ 
-    
+    """
+
     expense_management = True
-    
+
     # Loop stays in expense management sub-menu until exited.
     while expense_management:
-        
+
         user_choice = input('''\nWould you like to:
 a - Add expense categories
 u - Update expense actual
+t - Record an expense transaction
+h - View expense transaction history
 g - Update expense budget
+b - Set an expense budget for one month
+m - Move expense category under another category
 r - Remove expense category
+s - Search expense categories
 v - View expense categories, amounts and total
 q - Exit expense management\n''').lower()
-        
+
         if user_choice == "a":
-            print("You have selected to add an expense category.") 
-            add_category("expenses", db, cursor)
-            view_tables("expenses", cursor)
-        
+            print("You have selected to add an expense category.")
+            add_category("expenses", tracker)
+            view_after_change("expenses", tracker)
+
         elif user_choice == "u":
             print("You have selected to update an expense amount.")
-            update_actual("expenses", db, cursor)
-            view_tables("expenses", cursor)
-            
+            update_actual("expenses", tracker)
+            view_after_change("expenses", tracker)
+
+        elif user_choice == "t":
+            print("You have selected to record an expense transaction.")
+            add_transaction("expenses", tracker)
+            view_after_change("expenses", tracker)
+
+        elif user_choice == "h":
+            print("You have selected to view expense transaction history.")
+            view_history("expenses", tracker)
+
         elif user_choice == "g":
             print("You have selected to enter a new budget for an item.")
-            update_goal("expenses", db, cursor)
-            view_tables("expenses",cursor)
-        
+            update_goal("expenses", tracker)
+            view_after_change("expenses", tracker)
+
+        elif user_choice == "b":
+            print("You have selected to set a budget for one month.")
+            update_period_goal("expenses", tracker)
+
+        elif user_choice == "m":
+            print("You have selected to move an expense category.")
+            move_category("expenses", tracker)
+            view_after_change("expenses", tracker)
+
         elif user_choice == "r":
             print("You have selected to remove an expense category.")
-            remove_category("expenses", db, cursor)
-            view_tables("expenses", cursor)
-        
+            remove_category("expenses", tracker)
+            view_after_change("expenses", tracker)
+
+        elif user_choice == "s":
+            print("You have selected to search expense categories.")
+            search_categories("expenses", tracker)
+
         elif user_choice == "v":
             print("You have selected to view your expense summary.")
-            view_tables("expenses", cursor)           
-        
+            browse_table("expenses", tracker)
+
         elif user_choice == "q":
             print("Exiting expense management.")
-            expense_management = False 
+            expense_management = False
 
         else:
             # Activates when no valid menu option is selected
             print("Please select a valid menu option.")
-    
+
     return user_choice
 
 
-def income_menu():
+def income_menu(tracker):
     """ Display the income management sub-menu.
     :param bool income_management: Indicates true when menu is active
     :param str user_choice: Selected menu option
     :returns: The menu option selected by the user
-    """ 
-    # INSERT FUNCTION DOCSTRING INFORMATION HERE
-    
+    """
+
     income_management = True
-    
+
     # Loop stays in income management menu until exited.
     while income_management:
         user_choice = input('''\nWould you like to:
 a - Add income categories
 u - Update income actual
+t - Record an income transaction
+h - View income transaction history
 g - Update income targets
+b - Set an income target for one month
+m - Move income category under another category
 r - Remove income category
+s - Search income categories
 v - View income categories, amounts and total
 q - Exit income management\n''').lower()
-        
+
         if user_choice == "a":
             print("You have selected to add an income category.")
-            add_category("incomes", db, cursor)
-            view_tables("incomes", cursor)
-       
+            add_category("incomes", tracker)
+            view_after_change("incomes", tracker)
+
         elif user_choice == "u":
             print("You have selected to update an income amount.")
-            update_actual("incomes", db, cursor)
-            view_tables("incomes", cursor)
-            
+            update_actual("incomes", tracker)
+            view_after_change("incomes", tracker)
+
+        elif user_choice == "t":
+            print("You have selected to record an income transaction.")
+            add_transaction("incomes", tracker)
+            view_after_change("incomes", tracker)
+
+        elif user_choice == "h":
+            print("You have selected to view income transaction history.")
+            view_history("incomes", tracker)
+
         elif user_choice == "g":
             print("You have selected to enter a new target for an income category.")
-            update_goal("incomes", db, cursor)
-            view_tables("incomes",cursor)
-        
+            update_goal("incomes", tracker)
+            view_after_change("incomes", tracker)
+
+        elif user_choice == "b":
+            print("You have selected to set a target for one month.")
+            update_period_goal("incomes", tracker)
+
+        elif user_choice == "m":
+            print("You have selected to move an income category.")
+            move_category("incomes", tracker)
+            view_after_change("incomes", tracker)
+
         elif user_choice == "r":
             print("You have selected to remove an income category.")
-            remove_category("incomes", db, cursor)
-            view_tables("incomes", cursor)
-        
+            remove_category("incomes", tracker)
+            view_after_change("incomes", tracker)
+
+        elif user_choice == "s":
+            print("You have selected to search income categories.")
+            search_categories("incomes", tracker)
+
         elif user_choice == "v":
             print("You have selected to view your income summary.")
-            view_tables("incomes", cursor)
-        
+            browse_table("incomes", tracker)
+
         elif user_choice == "q":
             print("Exiting income management.")
-            income_management = False 
+            income_management = False
 
         else:
             # Activates when no valid menu option is selected
             print("Please select a valid menu option.")
-    
-    return user_choice 
+
+    return user_choice
 
 
 ##############################################################################################################
 # MAIN MENU
 
 
-''' Main Menu provides user with options to enter expense or income menus, 
-view budget summary or quit programme.'''
+def main(argv=None, tracker=None):
+    """ Main Menu provides user with options to enter expense or income menus,
+    view budget summary or quit programme. Command line arguments run a task without the menu:
+    'import <statement> [rules]', 'undo', 'redo', 'restore <date and time>', 'compact',
+    'stress [workers] [operations]' and 'stress-worker <id> <operations>'.
+    :param list argv: Command line arguments, defaults to sys.argv[1:]
+    :param Tracker tracker: Tracker to use, e.g. a tenant's from tracker_tenants, defaults to one on db_file
+    :param bool menu_status: User changes status to False when selecting 'Exit' option
+    :returns: Exit status of the programme
+    """
+
+    argv = sys.argv[1:] if argv is None else argv
+
+    # The stress test runs on its own temporary database, so the app's database is never opened:
+    # python tracker_app.py stress [workers] [operations]
+    if argv and argv[0] == "stress":
+        stress_passed = stress_test(int(argv[1]) if len(argv) > 1 else 8,
+                                    int(argv[2]) if len(argv) > 2 else 500)
+        return 0 if stress_passed else 1
+
+    tracker = tracker or Tracker()
+
+    # Started by stress_test for each worker process, with TRACKER_DB pointing at the test database
+    if len(argv) > 2 and argv[0] == "stress-worker":
+        with tracker:
+            print(json.dumps(stress_worker(int(argv[1]), int(argv[2]), tracker)))
+        return 0
+
+    try:
+        tracker.connect()
+    except Exception as e:
+        print(e)
+        print("Could not connect to database. Exiting app. ")
+        return 1
+
+    # Non-interactive import: python tracker_app.py import <statement.csv|ofx> [rules.csv]
+    if len(argv) > 1 and argv[0] == "import":
+        imported = import_statement(argv[1], tracker, argv[2] if len(argv) > 2 else None)
+        tracker.close()
+        return 0 if imported else 1
+
+    # Change journal: python tracker_app.py undo|redo|compact, or restore <YYYY-MM-DD[ HH:MM:SS]>
+    if argv and argv[0] in ("undo", "redo"):
+        operation = undo_change(tracker, argv[0])
+        tracker.close()
+        return 0 if operation else 1
+
+    if len(argv) > 1 and argv[0] == "restore":
+        restore_to(tracker, " ".join(argv[1:]))
+        tracker.close()
+        return 0
 
-menu_status = True      # User changes status to False when selecting 'Exit' option. 
+    if argv and argv[0] == "compact":
+        print(f"Dropped {tracker.compact()} journal transactions.")
+        tracker.close()
+        return 0
 
-user_choice = ""
+    # Alerts raised by the menu's own changes are shown straight after them
+    tracker.on_alert(lambda alert: print(alert_message(alert)))
 
-# Loops over menu options and enters sub-menu items based on selection. 
-while menu_status:
-    user_choice = input('''\nMain Menu Options:
+    menu_status = True      # User changes status to False when selecting 'Exit' option.
+
+    user_choice = ""
+
+    # Loops over menu options and enters sub-menu items based on selection.
+    while menu_status:
+        user_choice = input('''\nMain Menu Options:
 e - View expense management menu
 i - View income management menu
 g - View progress against goals
-q - Exit 
+p - View progress for a month, range or year to date
+a - View budget alerts and alert rules
+d - Switch the table view after each change off or on
+f - Forecast savings scenarios
+m - Import bank statement (CSV/OFX)
+u - Undo the last change
+r - Redo the last undone change
+t - Restore to an earlier date and time
+s - Show query metrics
+q - Exit
 
 Enter selection:\n''').lower()
-    
-    if user_choice == "e":
-       print("You have selected the expense menu.") 
-       user_choice = expense_menu()         # Calls the expense sub-menu function. 
-       
-    elif user_choice == "i":
-        print("You have selected the income menu.") 
-        user_choice = income_menu()         # Calls the income sub-menu function. 
-        
-    elif user_choice == "g":
-        print("You have selected to view your budget summary.") 
-        budget_summary("incomes","expenses", db, cursor)        # Calls the budget summary function
-        
-    elif user_choice == "q": 
-        # Set menu_status to false on exit to exit menu while-loop and programme.    
-        menu_status = False
-        print("Exiting programme. Good bye!")
-        db.close()
-    
-    else:
-        # Activates when no valid menu options are selected
-        print("Please select a valid menu option.")
+
+        if user_choice == "e":
+            print("You have selected the expense menu.")
+            user_choice = expense_menu(tracker)         # Calls the expense sub-menu function.
+
+        elif user_choice == "i":
+            print("You have selected the income menu.")
+            user_choice = income_menu(tracker)         # Calls the income sub-menu function.
+
+        elif user_choice == "g":
+            print("You have selected to view your budget summary.")
+            budget_summary("incomes","expenses", tracker)        # Calls the budget summary function
+
+        elif user_choice == "p":
+            print("You have selected to view progress for a period.")
+            period_summary(tracker)
+
+        elif user_choice == "a":
+            print("You have selected to view budget alerts.")
+            view_alerts(tracker)
+
+        elif user_choice == "d":
+            print(f"The table view after each change is now {'on' if toggle_auto_view() else 'off'}.")
+
+        elif user_choice == "f":
+            print("You have selected to forecast savings scenarios.")
+            forecast_summary(tracker)
+
+        elif user_choice == "m":
+            print("You have selected to import a bank statement.")
+            statement_file = input("Enter the path to the CSV or OFX statement: ").strip()
+            rules_file = input("Enter the path to a keyword,category rules CSV (or leave blank): ").strip()
+            import_statement(statement_file, tracker, rules_file or None)
+
+        elif user_choice == "u":
+            undo_change(tracker, "undo")
+
+        elif user_choice == "r":
+            undo_change(tracker, "redo")
+
+        elif user_choice == "t":
+            print("You have selected to restore an earlier date and time.")
+            restore_to(tracker)
+
+        elif user_choice == "s":
+            if tracker_metrics.registry.enabled:
+                tracker_metrics.print_report()
+            else:
+                print("Query metrics are switched off. Restart with TRACKER_METRICS=1 to collect them.")
+
+        elif user_choice == "q":
+            # Set menu_status to false on exit to exit menu while-loop and programme.
+            menu_status = False
+            try:
+                if tracker.compact_if_due() is not None:
+                    print("Compacted the change journal.")
+            except (OSError, sqlite3.Error) as error_msg:
+                print(f"Unable to compact the change journal. {error_msg}")
+            if tracker.in_memory:
+                print("Saving changes to disk.")
+            print("Exiting programme. Good bye!")
+            tracker.close()
+
+        else:
+            # Activates when no valid menu options are selected
+            print("Please select a valid menu option.")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
 
 
 ##############################################################################################################
-# END OF CODE     
+# END OF CODE
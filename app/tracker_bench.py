@@ -0,0 +1,347 @@
+# TRACKER BENCHMARKS
+""" Benchmarks for the tracker's hot paths: view_tables, budget_summary, add_category and
+update_actual, on synthetic databases of increasing size, and a comparison of money stored as
+REAL rands with money stored as integer cents (speed, exactness and size of totals).
+
+The generator copies tracker_db and fills the copy with synthetic categories and dated
+transactions (1k, 100k and 1M of each by default). Operations are timed by calling them
+directly, never through input(), and the results are written to a JSON file so runs can be
+compared for regressions.
+
+Usage:
+    python tracker_bench.py [--sizes 1000,100000,1000000] [--money-rows 1000000] [--output bench_results.json]
+                            [--data-dir DIR] [--compare previous.json]
+"""
+
+##############################################################################################################
+# IMPORT LIBRARIES
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from tracker_app import Money, Tracker, budget_summary, db_file, import_chunk_size, page_size, render_page, view_tables
+from tracker_server import percentile
+
+
+##############################################################################################################
+# DATA GENERATOR
+
+# Fixed seed so every run benchmarks the same data.
+random_seed = 2023
+
+# Transactions are spread over this many days before today, so period rollups have history.
+history_days = 730
+
+
+def synthetic_categories(first_id, count, prefix):
+    """ Yields synthetic category rows (id, category, actual, budget), amounts in cents. Actuals
+    start at 0 and are filled in by the ledger triggers as transactions are added.
+    """
+
+    for offset in range(count):
+        yield first_id + offset, f"{prefix} {offset:07d}", 0, random.randint(10000, 500000)
+
+
+def synthetic_transactions(category_ids, count):
+    """ Yields synthetic ledger rows (category_id, date, amount in cents, description) over the last two years. """
+
+    today = date.today()
+
+    for number in range(count):
+        txn_date = today - timedelta(days=random.randrange(history_days))
+        yield random.choice(category_ids), txn_date.isoformat(), random.randint(100, 50000), f"Synthetic {number}"
+
+
+def write_rows(tracker, query, rows, chunk_size=import_chunk_size):
+    """ Inserts rows from a generator in chunks, one write transaction per chunk. """
+
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            tracker.begin_write()
+            tracker.cursor.executemany(query, chunk)
+            tracker.commit()
+            chunk = []
+
+    if chunk:
+        tracker.begin_write()
+        tracker.cursor.executemany(query, chunk)
+        tracker.commit()
+
+
+def generate_database(target_db, size, source_db=db_file):
+    """ Creates a copy of the tracker database holding 'size' synthetic categories and 'size'
+    synthetic transactions. Nine in ten of each are expenses and the rest incomes, as in a
+    typical budget. No alerts are raised for the synthetic data.
+    :param str target_db: Path of the database to create
+    :param int size: Number of categories and of transactions to add
+    :param str source_db: Database copied as the starting point
+    :returns: Seconds taken to generate the data
+    """
+
+    start_time = time.perf_counter()
+    random.seed(random_seed)
+
+    if os.path.exists(source_db):
+        shutil.copyfile(source_db, target_db)
+
+    with Tracker(target_db) as tracker:
+        expense_count = max(1, size * 9 // 10)
+        split = {"expenses": expense_count, "incomes": max(1, size - expense_count)}
+
+        # Alert rules are set aside while the data is written, so the generation time measures the
+        # ledger and rollup triggers only, and are put back for the operations benchmarked
+        tracker.begin_write()
+        tracker.cursor.execute("SELECT id, table_name, scope, category_id, percent FROM alert_rules")
+        alert_rules = tracker.cursor.fetchall()
+        tracker.cursor.execute("DELETE FROM alert_rules")
+        tracker.commit()
+
+        for table_name, count in split.items():
+            tracker.cursor.execute(f"SELECT coalesce(max(id), 0) + 1 FROM {table_name}")
+            first_id = tracker.cursor.fetchone()[0]
+            write_rows(tracker, f"INSERT INTO {table_name}(id, category, actual, budget) VALUES(?,?,?,?)",
+                       synthetic_categories(first_id, count, f"Bench {table_name}"))
+
+            tracker.cursor.execute(f"SELECT id FROM {table_name}")
+            category_ids = [row[0] for row in tracker.cursor.fetchall()]
+            write_rows(tracker, f"INSERT INTO {table_name}_ledger(category_id, date, amount, description) VALUES(?,?,?,?)",
+                       synthetic_transactions(category_ids, count))
+
+        write_rows(tracker, "INSERT INTO alert_rules(id, table_name, scope, category_id, percent) VALUES(?,?,?,?,?)",
+                   alert_rules)
+        tracker.cursor.execute("ANALYZE")
+
+    return time.perf_counter() - start_time
+
+
+##############################################################################################################
+# BENCHMARKS
+
+def view_every_page(table_name, tracker):
+    """ Views a whole table: tables larger than a page are rendered page by page in category order,
+    the way browse_table() walks them, so the view benchmark still covers every row.
+    """
+
+    if tracker.count_categories(table_name) <= page_size:
+        view_tables(table_name, tracker)
+        return
+
+    next_key = None
+    while True:
+        rows, next_key = tracker.get_page(table_name, "id", next_key, page_size)
+        print(render_page(table_name, tracker, rows))
+        if next_key is None:
+            break
+
+
+def time_operation(operation, repeat, time_budget, setup=None):
+    """ Times an operation several times.
+    Stops early once 'time_budget' seconds have been spent, so slow operations on large databases
+    still finish, but always runs at least once.
+    :param operation: Callable taking the run number
+    :param setup: Optional callable run (untimed) before every run, e.g. to clear caches
+    :returns: List of seconds per run
+    """
+
+    timings = []
+    started = time.perf_counter()
+
+    for run in range(repeat):
+        if setup:
+            setup()
+        start_time = time.perf_counter()
+        operation(run)
+        timings.append(time.perf_counter() - start_time)
+        if time.perf_counter() - started > time_budget:
+            break
+
+    return timings
+
+
+def summarise_timings(size, operation, timings):
+    """ Reduces a list of timings to the figures stored in the results file. """
+
+    timings = sorted(timings)
+
+    return {"size": size, "operation": operation, "runs": len(timings),
+            "min_ms": round(timings[0] * 1000, 3),
+            "median_ms": round(statistics.median(timings) * 1000, 3),
+            "p95_ms": round(percentile(timings, 0.95) * 1000, 3),
+            "mean_ms": round(statistics.fmean(timings) * 1000, 3)}
+
+
+def benchmark_database(test_db, size, repeat, time_budget):
+    """ Times the hot paths on a generated database. Display functions print into a discarded
+    buffer, so terminal speed is not measured. Cold runs clear the summary cache first.
+    :returns: List of result dictionaries, one per operation
+    """
+
+    results = []
+    sink = io.StringIO()
+
+    def discard_output(function, *args):
+        with contextlib.redirect_stdout(sink):
+            function(*args)
+        sink.seek(0)
+        sink.truncate()
+
+    with Tracker(test_db) as tracker:
+        tracker.cursor.execute("SELECT category FROM expenses ORDER BY id LIMIT 1000")
+        existing = [row[0] for row in tracker.cursor.fetchall()]
+
+        operations = [
+            ("view_tables", lambda run: discard_output(view_every_page, "expenses", tracker), tracker.invalidate_summary_cache),
+            ("view_tables_cached", lambda run: discard_output(view_tables, "expenses", tracker), None),
+            ("budget_summary", lambda run: discard_output(budget_summary, "incomes", "expenses", tracker), tracker.invalidate_summary_cache),
+            ("add_category", lambda run: tracker.add_category("expenses", f"Bench new {time.time_ns()} {run}"), None),
+            ("update_actual", lambda run: tracker.update_actual("expenses", existing[run % len(existing)], run * 1.25), None),
+        ]
+
+        for name, operation, setup in operations:
+            timings = time_operation(operation, repeat, time_budget, setup)
+            results.append(summarise_timings(size, name, timings))
+            print(f"{size:>9} {name:<20} {results[-1]['median_ms']:>12.3f} {results[-1]['runs']:>6}")
+
+    return results
+
+
+def run_benchmarks(sizes, repeat=20, time_budget=10.0, data_dir=None, source_db=db_file, money_rows=()):
+    """ Generates (or reuses) a database per size and benchmarks it, then compares REAL and
+    integer-cents money storage.
+    :param list sizes: Numbers of synthetic categories and transactions
+    :param list money_rows: Numbers of amounts for the money storage comparison
+    :param int repeat: Most runs per operation
+    :param float time_budget: Seconds after which an operation stops repeating
+    :param str data_dir: Directory to keep generated databases in for reuse, or None for a temporary one
+    :returns: Results document with environment details, generation times and timings
+    """
+
+    report = {"created": datetime.now().isoformat(timespec="seconds"),
+              "python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+              "platform": platform.platform(), "generate_seconds": {}, "results": [], "money": []}
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        data_dir = data_dir or temp_dir
+        os.makedirs(data_dir, exist_ok=True)
+
+        print(f"{'SIZE':>9} {'OPERATION':<20} {'MEDIAN (MS)':>12} {'RUNS':>6}")
+        for size in sizes:
+            generated_db = os.path.join(data_dir, f"tracker_db_{size}")
+            if not os.path.exists(generated_db):
+                report["generate_seconds"][str(size)] = round(generate_database(generated_db, size, source_db), 2)
+
+            # Benchmarks write to the database, so each run works on a fresh copy
+            test_db = os.path.join(temp_dir, "bench_db")
+            shutil.copyfile(generated_db, test_db)
+            report["results"].extend(benchmark_database(test_db, size, repeat, time_budget))
+            os.remove(test_db)
+
+        for rows in money_rows:
+            report["money"].extend(benchmark_money(rows, min(repeat, 5), time_budget))
+
+    return report
+
+
+def benchmark_money(rows, repeat=5, time_budget=10.0):
+    """ Compares money stored as REAL rands with money stored as INTEGER cents on 'rows' amounts:
+    how long SQLite takes to total them, whether the total is exact, and the size of the database.
+    The same random amounts go into both databases, and the exact total is worked out in Python.
+    :param int rows: Number of amounts
+    :returns: List of two result dictionaries, one per storage type
+    """
+
+    random.seed(random_seed)
+    amounts = [random.randint(1, 10_000_000) for number in range(rows)]
+    exact_total = Money(sum(amounts))
+    results = []
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for storage, column_type, total_query, to_stored in (
+                ("real", "REAL", "SELECT Total(amount) FROM amounts", lambda cents: cents / 100),
+                ("integer_cents", "INTEGER", "SELECT sum(amount) FROM amounts", lambda cents: cents)):
+            test_db = os.path.join(temp_dir, f"{storage}_db")
+            connection = sqlite3.connect(test_db)
+            connection.execute(f"CREATE TABLE amounts(id INTEGER PRIMARY KEY, amount {column_type} NOT NULL)")
+            connection.executemany("INSERT INTO amounts(amount) VALUES(?)", ((to_stored(cents),) for cents in amounts))
+            connection.commit()
+
+            total = connection.execute(total_query).fetchone()[0]
+            timings = time_operation(lambda run: connection.execute(total_query).fetchone(), repeat, time_budget)
+            connection.close()
+
+            total = Money.parse(total) if storage == "real" else Money(total)
+            result = summarise_timings(rows, f"sum_{storage}", timings)
+            result.update({"total": str(total), "exact_total": str(exact_total), "exact": total == exact_total,
+                           "error": str(total - exact_total), "file_bytes": os.path.getsize(test_db)})
+            results.append(result)
+            print(f"{rows:>9} {result['operation']:<20} {result['median_ms']:>12.3f} {result['runs']:>6}"
+                  f"  error R{result['error']}, {result['file_bytes']:,} bytes")
+
+    return results
+
+
+def compare_reports(previous, current):
+    """ Prints the change in median time per size and operation against an earlier results file. """
+
+    earlier = {(result["size"], result["operation"]): result["median_ms"]
+               for result in previous["results"] + previous.get("money", [])}
+
+    print(f"\n{'SIZE':>9} {'OPERATION':<20} {'BEFORE (MS)':>12} {'NOW (MS)':>12} {'CHANGE':>8}")
+    for result in current["results"] + current.get("money", []):
+        before = earlier.get((result["size"], result["operation"]))
+        if before:
+            change = (result["median_ms"] - before) / before * 100
+            print(f"{result['size']:>9} {result['operation']:<20} {before:>12.3f} {result['median_ms']:>12.3f} {change:>+7.1f}%")
+
+
+##############################################################################################################
+# MAIN
+
+def main(argv=None):
+    """ Runs the benchmarks from the command line and writes the results file. """
+
+    parser = argparse.ArgumentParser(description="Benchmarks for the budget tracker.")
+    parser.add_argument("--sizes", default="1000,100000,1000000", help="Comma-separated numbers of categories and transactions")
+    parser.add_argument("--repeat", type=int, default=20, help="Most runs per operation")
+    parser.add_argument("--time-budget", type=float, default=10.0, help="Seconds after which an operation stops repeating")
+    parser.add_argument("--money-rows", default="1000000", help="Comma-separated numbers of amounts for the REAL vs integer cents comparison ('' to skip)")
+    parser.add_argument("--db", default=db_file, help="Database copied as the starting point (default: the app's tracker_db)")
+    parser.add_argument("--data-dir", help="Keep generated databases here and reuse them on later runs")
+    parser.add_argument("--output", default="bench_results.json", help="Results file (JSON)")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    money_rows = [int(rows) for rows in args.money_rows.split(",") if rows.strip()]
+    report = run_benchmarks(sizes, args.repeat, args.time_budget, args.data_dir, args.db, money_rows)
+
+    with open(args.output, "w") as results_file:
+        json.dump(report, results_file, indent=2)
+    print(f"Results written to {args.output}.")
+
+    if args.compare:
+        with open(args.compare) as previous_file:
+            compare_reports(json.load(previous_file), report)
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
+
+
+##############################################################################################################
+# END OF CODE
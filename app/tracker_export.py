@@ -0,0 +1,377 @@
+# TRACKER EXPORT
+""" Streaming export of tracker data for reporting jobs.
+
+Rows are read with fetchmany() through a generator and written as they arrive, so memory use
+stays the same however large a table is. Sources are the category tables, their ledgers and
+monthly periods, and the summary figures. Formats:
+
+    csv       Header row, then one line per row
+    jsonl     One JSON object per line (JSON Lines)
+    columnar  Compact binary: the rows are cut into blocks and each block stores its columns one
+              after the other, zlib-compressed (see write_columnar for the layout). read_columnar()
+              streams the rows back.
+
+Usage:
+    python tracker_export.py <source> <csv|jsonl|columnar> [--output FILE] [--period 2024-01:2024-06] [--db tracker_db]
+    python tracker_export.py --list
+"""
+
+##############################################################################################################
+# IMPORT LIBRARIES
+
+import argparse
+import csv
+import json
+import struct
+import sys
+import zlib
+from array import array
+
+from tracker_app import Money, Tracker, db_file, period_range
+
+
+##############################################################################################################
+# SOURCES
+
+# Rows fetched per fetchmany() call, and rows per block in the columnar format.
+export_batch_size = 1000
+columnar_block_size = 16384
+
+
+def ledger_source(table_name):
+    return {"query": f"SELECT l.id, l.category_id, t.category, l.date, l.amount, l.description "
+                     f"FROM {table_name}_ledger l JOIN {table_name} t ON t.id = l.category_id "
+                     f"WHERE l.date BETWEEN ? AND ? ORDER BY l.id",
+            "columns": [("id", "int"), ("category_id", "int"), ("category", "text"), ("date", "text"),
+                        ("amount", "money"), ("description", "text")],
+            "filter": "date"}
+
+
+def periods_source(table_name):
+    return {"query": f"SELECT p.period, p.category_id, t.category, p.actual, p.budget "
+                     f"FROM {table_name}_periods p JOIN {table_name} t ON t.id = p.category_id "
+                     f"WHERE p.period BETWEEN ? AND ? ORDER BY p.period, p.category_id",
+            "columns": [("period", "text"), ("category_id", "int"), ("category", "text"),
+                        ("actual", "money"), ("budget", "money")],
+            "filter": "period"}
+
+
+# Everything that can be exported. Each source has a query, its columns with their types, and
+# the kind of period filter it takes ('date' for ledgers, 'period' for monthly data, None for none).
+# 'money' columns are read as integer cents and written as rands (CSV, JSON Lines) or cents (columnar).
+export_sources = {
+    "expenses": {"query": "SELECT id, category, parent_id, actual, budget FROM expenses ORDER BY id",
+                 "columns": [("id", "int"), ("category", "text"), ("parent_id", "int"), ("actual", "money"), ("budget", "money")],
+                 "filter": None},
+    "incomes": {"query": "SELECT id, category, parent_id, actual, budget FROM incomes ORDER BY id",
+                "columns": [("id", "int"), ("category", "text"), ("parent_id", "int"), ("actual", "money"), ("budget", "money")],
+                "filter": None},
+    "expenses_ledger": ledger_source("expenses"),
+    "incomes_ledger": ledger_source("incomes"),
+    "expenses_periods": periods_source("expenses"),
+    "incomes_periods": periods_source("incomes"),
+    # Budget summary per month, read from the period tables in index order
+    "monthly_summary": {"query": "SELECT period, sum(total_income), sum(budget_income), sum(total_expenses), sum(budget_expenses) "
+                                 "FROM (SELECT period, actual AS total_income, budget AS budget_income, 0 AS total_expenses, 0 AS budget_expenses "
+                                 "      FROM incomes_periods WHERE period BETWEEN ? AND ? "
+                                 "      UNION ALL "
+                                 "      SELECT period, 0, 0, actual, budget FROM expenses_periods WHERE period BETWEEN ? AND ?) "
+                                 "GROUP BY period ORDER BY period",
+                        "columns": [("period", "text"), ("total_income", "money"), ("budget_income", "money"),
+                                    ("total_expenses", "money"), ("budget_expenses", "money")],
+                        "filter": "period"},
+}
+
+
+def stream_rows(cursor, query, parameters=(), batch_size=export_batch_size):
+    """ Yields the rows of a query, fetching them in batches.
+    :param sqlite3.Cursor cursor: Cursor used only for this export
+    :param int batch_size: Rows fetched per fetchmany() call
+    :returns: Generator of row tuples
+    """
+
+    cursor.execute(query, parameters)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield from rows
+
+
+def export_rows(tracker, source, period=None):
+    """ Streams the rows of an export source.
+    :param Tracker tracker: Tracker whose database is exported
+    :param str source: Name of a source in export_sources, or 'summary' for the budget summary figures
+    :param str period: Optional month, range, year or 'ytd' (see period_range) for ledger and period sources
+    :raises ValueError: Raised for unknown sources and invalid periods
+    :returns: (columns, row generator)
+    """
+
+    if source == "summary":
+        if period:
+            start_period, end_period = period_range(period)
+            summary = tracker.get_summary(start_period=start_period, end_period=end_period)
+        else:
+            summary = tracker.get_summary()
+        return [(name, "money") for name in summary], iter([tuple(amount.cents for amount in summary.values())])
+
+    if source not in export_sources:
+        raise ValueError(f"Unknown export source {source}. Choose from: summary, {', '.join(export_sources)}.")
+
+    details = export_sources[source]
+    start_period, end_period = period_range(period) if period else ("0000-01", "9999-12")
+    if details["filter"] == "date":
+        parameters = (f"{start_period}-01", f"{end_period}-31")
+    elif details["filter"] == "period":
+        parameters = (start_period, end_period) * details["query"].count("BETWEEN")
+    else:
+        parameters = ()
+
+    # A separate cursor, so the export can be read lazily while the tracker is used for other queries
+    return details["columns"], stream_rows(tracker.db.cursor(), details["query"], parameters)
+
+
+##############################################################################################################
+# WRITERS
+
+def rands(columns, rows, convert):
+    """ Converts the cents in the money columns of each row to rands with 'convert'.
+    :returns: Generator of rows, the rows unchanged when there are no money columns
+    """
+
+    money_indexes = [index for index, (name, kind) in enumerate(columns) if kind == "money"]
+    if not money_indexes:
+        return rows
+
+    def converted():
+        for row in rows:
+            row = list(row)
+            for index in money_indexes:
+                if row[index] is not None:
+                    row[index] = convert(Money(row[index]))
+            yield row
+
+    return converted()
+
+
+def write_csv(columns, rows, output):
+    """ Writes rows as CSV with a header line. Money is written with two decimals.
+    :param output: Text file opened with newline=''
+    :returns: Number of rows written
+    """
+
+    writer = csv.writer(output)
+    writer.writerow([name for name, kind in columns])
+
+    count = 0
+    for row in rands(columns, rows, str):
+        writer.writerow(row)
+        count += 1
+
+    return count
+
+
+def write_jsonl(columns, rows, output):
+    """ Writes rows as JSON Lines, one object per row. Money is written as a number of rands.
+    :param output: Text file
+    :returns: Number of rows written
+    """
+
+    names = [name for name, kind in columns]
+
+    count = 0
+    for row in rands(columns, rows, float):
+        output.write(json.dumps(dict(zip(names, row))))
+        output.write("\n")
+        count += 1
+
+    return count
+
+
+# File signature of the columnar format.
+columnar_magic = b"TRKCOL1\n"
+
+# Stand-ins for NULL in the columnar format: text length, integer value. Reals use NaN.
+null_text_length = 0xFFFFFFFF
+null_integer = -(2 ** 63)
+
+
+def encode_column(kind, values):
+    """ Packs one column of a block into bytes.
+    Integers and money (in cents) are int64 and reals float64, little-endian. Text is a uint32 length per value
+    followed by the UTF-8 bytes of every value.
+    """
+
+    if kind in ("int", "money"):
+        packed = array("q", (null_integer if value is None else value for value in values))
+    elif kind == "real":
+        packed = array("d", (float("nan") if value is None else value for value in values))
+    else:
+        encoded = [None if value is None else str(value).encode() for value in values]
+        lengths = array("I", (null_text_length if value is None else len(value) for value in encoded))
+        if sys.byteorder != "little":
+            lengths.byteswap()
+        return lengths.tobytes() + b"".join(value for value in encoded if value is not None)
+
+    if sys.byteorder != "little":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def decode_column(kind, data, count):
+    """ Unpacks one column of a block written by encode_column. """
+
+    if kind in ("int", "money", "real"):
+        values = array("d" if kind == "real" else "q")
+        values.frombytes(data)
+        if sys.byteorder != "little":
+            values.byteswap()
+        if kind == "int":
+            return [None if value == null_integer else value for value in values]
+        if kind == "money":
+            return [None if value == null_integer else Money(value) for value in values]
+        return [None if value != value else value for value in values]
+
+    lengths = array("I")
+    lengths.frombytes(data[:count * 4])
+    if sys.byteorder != "little":
+        lengths.byteswap()
+
+    values, offset = [], count * 4
+    for length in lengths:
+        if length == null_text_length:
+            values.append(None)
+        else:
+            values.append(data[offset:offset + length].decode())
+            offset += length
+    return values
+
+
+def write_block(output, columns, block):
+    """ Writes one block: uint32 row count, then per column a uint32 size and the compressed column. """
+
+    output.write(struct.pack("<I", len(block)))
+    for index, (name, kind) in enumerate(columns):
+        compressed = zlib.compress(encode_column(kind, [row[index] for row in block]))
+        output.write(struct.pack("<I", len(compressed)))
+        output.write(compressed)
+
+
+def write_columnar(columns, rows, output, block_size=columnar_block_size):
+    """ Writes rows in the compact columnar format.
+    Layout: the signature, a uint32 header size and a JSON header listing the columns and their
+    types, then blocks of up to 'block_size' rows (see write_block), then a zero row count.
+    Only one block is held in memory at a time.
+    :param output: Binary file
+    :returns: Number of rows written
+    """
+
+    header = json.dumps({"columns": [[name, kind] for name, kind in columns]}).encode()
+    output.write(columnar_magic)
+    output.write(struct.pack("<I", len(header)))
+    output.write(header)
+
+    count, block = 0, []
+    for row in rows:
+        block.append(row)
+        if len(block) >= block_size:
+            write_block(output, columns, block)
+            count += len(block)
+            block = []
+
+    if block:
+        write_block(output, columns, block)
+        count += len(block)
+    output.write(struct.pack("<I", 0))
+
+    return count
+
+
+def read_columnar(source):
+    """ Streams rows back from a file in the columnar format, one block in memory at a time.
+    Money columns are read back as Money.
+    :param source: Binary file
+    :raises ValueError: Raised when the file is not in the columnar format
+    :returns: (columns, row generator)
+    """
+
+    if source.read(len(columnar_magic)) != columnar_magic:
+        raise ValueError("Not a tracker columnar export.")
+    header_size = struct.unpack("<I", source.read(4))[0]
+    columns = [tuple(column) for column in json.loads(source.read(header_size))["columns"]]
+
+    def blocks():
+        while True:
+            count = struct.unpack("<I", source.read(4))[0]
+            if count == 0:
+                return
+            values = []
+            for name, kind in columns:
+                size = struct.unpack("<I", source.read(4))[0]
+                values.append(decode_column(kind, zlib.decompress(source.read(size)), count))
+            yield from zip(*values)
+
+    return columns, blocks()
+
+
+# Writer and whether it needs a binary file, per format name.
+export_formats = {"csv": (write_csv, False), "jsonl": (write_jsonl, False), "columnar": (write_columnar, True)}
+
+
+def export(tracker, source, export_format, output_file=None, period=None):
+    """ Exports a source to a file (or standard output) without loading it into memory.
+    :param str export_format: 'csv', 'jsonl' or 'columnar'
+    :param str output_file: Path to write to, or None for standard output
+    :raises ValueError: Raised for unknown sources, formats and invalid periods
+    :returns: Number of rows written
+    """
+
+    if export_format not in export_formats:
+        raise ValueError(f"Unknown export format {export_format}. Choose from: {', '.join(export_formats)}.")
+
+    writer, binary = export_formats[export_format]
+    columns, rows = export_rows(tracker, source, period)
+
+    if output_file is None:
+        return writer(columns, rows, sys.stdout.buffer if binary else sys.stdout)
+
+    with open(output_file, "wb") if binary else open(output_file, "w", newline="", encoding="utf-8") as output:
+        return writer(columns, rows, output)
+
+
+##############################################################################################################
+# MAIN
+
+def main(argv=None):
+    """ Exports from the command line. Row counts go to standard error so output can be piped. """
+
+    parser = argparse.ArgumentParser(description="Streaming export of budget tracker data.")
+    parser.add_argument("source", nargs="?", help="Table or summary to export (see --list)")
+    parser.add_argument("format", nargs="?", default="csv", choices=list(export_formats))
+    parser.add_argument("--output", help="File to write (default: standard output)")
+    parser.add_argument("--period", help="Month, range (YYYY-MM:YYYY-MM), year or 'ytd' for ledger, period and summary data")
+    parser.add_argument("--db", default=db_file, help="Database file (default: the app's tracker_db)")
+    parser.add_argument("--list", action="store_true", help="List the export sources")
+    args = parser.parse_args(argv)
+
+    if args.list or not args.source:
+        print("\n".join(["summary", *export_sources]))
+        return 0
+
+    try:
+        with Tracker(args.db) as tracker:
+            count = export(tracker, args.source, args.format, args.output, args.period)
+    except ValueError as error_msg:
+        print(error_msg, file=sys.stderr)
+        return 1
+
+    print(f"Exported {count} rows from {args.source}.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
+
+
+##############################################################################################################
+# END OF CODE
@@ -0,0 +1,332 @@
+# TRACKER METRICS
+""" Query-level instrumentation for the tracker.
+
+When switched on, connections made by create_connection() use an instrumented connection whose
+cursors time every SQL statement (execute plus fetching its rows) and count the rows it returned
+or changed. Statements are grouped by the operation that ran them ('view_tables',
+'budget_summary', 'update_actual', ...), which is set by the @measured decorator on the
+tracker's operations. Operation latencies and statement latencies go into fixed-bucket
+histograms, so recording costs a bisect and a few additions under a lock.
+
+Switch on with TRACKER_METRICS=1. TRACKER_METRICS_FILE=<path> writes a report when the process
+exits: Prometheus text format when the path ends in '.prom', otherwise JSON. Reports are also
+available on demand through report_json() and report_prometheus().
+"""
+
+##############################################################################################################
+# IMPORT LIBRARIES
+
+import atexit
+import contextvars
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+
+
+##############################################################################################################
+# REGISTRY
+
+# Upper bounds (seconds) of the histogram buckets. The last bucket catches everything slower.
+latency_buckets = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Name of the operation currently running in this thread or task, set by @measured.
+current_operation = contextvars.ContextVar("current_operation", default="other")
+
+
+class Histogram:
+    """ Latency histogram with fixed buckets, plus count, sum and rows.
+    :param list counts: Observations per bucket, the last entry counting those above every bound
+    """
+
+    __slots__ = ("counts", "count", "total", "rows")
+
+    def __init__(self):
+        self.counts = [0] * (len(latency_buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.rows = 0
+
+    def observe(self, seconds, rows=0):
+        self.counts[bisect_left(latency_buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.rows += rows
+
+    def quantile(self, fraction):
+        """ Estimates a quantile as the upper bound of the bucket that contains it. Quantiles above
+        every bound are reported as the largest bound, a lower limit, so reports stay valid JSON. """
+
+        target = fraction * self.count
+        running = 0
+        for bound, count in zip(latency_buckets + latency_buckets[-1:], self.counts):
+            running += count
+            if running >= target and count:
+                return bound
+        return 0.0
+
+    def to_dict(self):
+        return {"count": self.count, "sum_seconds": round(self.total, 6), "rows": self.rows,
+                "p50_seconds": self.quantile(0.50), "p99_seconds": self.quantile(0.99),
+                "buckets": dict(zip([str(bound) for bound in latency_buckets] + ["+Inf"], self.counts))}
+
+
+class MetricsRegistry:
+    """ Collected statement and operation histograms, shared by every instrumented connection.
+    :param dict statements: (operation, statement) to Histogram
+    :param dict operations: Operation name to Histogram
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.started = time.time()
+        self.statements = {}
+        self.operations = {}
+        self.lock = threading.Lock()
+
+    def observe_statement(self, operation, statement, seconds, rows):
+        key = (operation, statement)
+        with self.lock:
+            histogram = self.statements.get(key)
+            if histogram is None:
+                histogram = self.statements[key] = Histogram()
+            histogram.observe(seconds, rows)
+
+    def observe_operation(self, operation, seconds):
+        with self.lock:
+            histogram = self.operations.get(operation)
+            if histogram is None:
+                histogram = self.operations[operation] = Histogram()
+            histogram.observe(seconds)
+
+    def reset(self):
+        with self.lock:
+            self.statements.clear()
+            self.operations.clear()
+            self.started = time.time()
+
+
+registry = MetricsRegistry()
+
+
+def enable(report_file=None):
+    """ Switches instrumentation on for connections created from now on.
+    :param str report_file: Optional path the report is written to when the process exits
+    """
+
+    registry.enabled = True
+    if report_file:
+        atexit.register(write_report, report_file)
+
+
+def measured(function):
+    """ Decorator that names the operation for the statements run inside it and records its latency.
+    Nested operations keep the outer name for statements, so the SQL run by get_totals inside
+    view_tables counts towards view_tables. When metrics are off it only checks a flag.
+    """
+
+    name = function.__name__
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not registry.enabled:
+            return function(*args, **kwargs)
+
+        token = current_operation.set(name) if current_operation.get() == "other" else None
+        start_time = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            registry.observe_operation(name, time.perf_counter() - start_time)
+            if token is not None:
+                current_operation.reset(token)
+
+    return wrapper
+
+
+##############################################################################################################
+# INSTRUMENTED CONNECTION
+
+@functools.lru_cache(maxsize=512)
+def normalise_statement(sql):
+    """ Collapses whitespace so the same statement always has the same label. """
+
+    return " ".join(sql.split())
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """ Cursor that times statements and counts their rows.
+    SQLite produces rows while they are fetched, so a SELECT is timed from execute until its rows
+    are exhausted (or the next statement starts) and counted by the rows actually fetched.
+    :param tuple pending: (operation, statement, seconds, rows) of the statement still being fetched
+    """
+
+    pending = None
+
+    def finish(self):
+        """ Records the statement in progress, if any. """
+
+        if self.pending is not None:
+            registry.observe_statement(*self.pending)
+            self.pending = None
+
+    def timed(self, method, sql, parameters):
+        self.finish()
+        start_time = time.perf_counter()
+        method(sql, parameters)
+        elapsed = time.perf_counter() - start_time
+
+        self.pending = (current_operation.get(), normalise_statement(sql), elapsed, 0)
+        if self.description is None:
+            # Statements without a result set are finished once executed
+            self.pending = self.pending[:3] + (max(self.rowcount, 0),)
+            self.finish()
+        return self
+
+    def execute(self, sql, parameters=()):
+        return self.timed(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.timed(super().executemany, sql, seq_of_parameters)
+
+    def fetched(self, elapsed, rows):
+        """ Adds fetch time and fetched rows to the statement in progress. """
+
+        if self.pending is not None:
+            operation, statement, seconds, count = self.pending
+            self.pending = (operation, statement, seconds + elapsed, count + rows)
+
+    def fetchone(self):
+        start_time = time.perf_counter()
+        row = super().fetchone()
+        self.fetched(time.perf_counter() - start_time, row is not None)
+        if row is None:
+            self.finish()
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        start_time = time.perf_counter()
+        rows = super().fetchmany(size)
+        self.fetched(time.perf_counter() - start_time, len(rows))
+        if len(rows) < size:
+            self.finish()
+        return rows
+
+    def fetchall(self):
+        start_time = time.perf_counter()
+        rows = super().fetchall()
+        self.fetched(time.perf_counter() - start_time, len(rows))
+        self.finish()
+        return rows
+
+    def close(self):
+        self.finish()
+        super().close()
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """ Connection whose cursors are instrumented and whose commits are timed. """
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def commit(self):
+        start_time = time.perf_counter()
+        super().commit()
+        registry.observe_statement(current_operation.get(), "COMMIT", time.perf_counter() - start_time, 0)
+
+
+##############################################################################################################
+# REPORTS
+
+def report_json():
+    """ Returns the collected metrics as a JSON-serialisable dictionary, slowest statements first. """
+
+    with registry.lock:
+        statements = [{"operation": operation, "statement": statement, **histogram.to_dict()}
+                      for (operation, statement), histogram in registry.statements.items()]
+        operations = {operation: histogram.to_dict() for operation, histogram in registry.operations.items()}
+
+    statements.sort(key=lambda entry: entry["sum_seconds"], reverse=True)
+
+    return {"since": registry.started, "buckets": list(latency_buckets), "operations": operations, "statements": statements}
+
+
+def prometheus_label(value):
+    """ Escapes a Prometheus label value. """
+
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def prometheus_histogram(lines, name, labels, histogram):
+    """ Appends the bucket, sum and count lines of one histogram. """
+
+    running = 0
+    for bound, count in zip([str(bound) for bound in latency_buckets] + ["+Inf"], histogram.counts):
+        running += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {running}')
+    lines.append(f"{name}_sum{{{labels}}} {histogram.total:.6f}")
+    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+
+def report_prometheus():
+    """ Returns the collected metrics in the Prometheus text exposition format. """
+
+    lines = ["# HELP tracker_operation_seconds Latency of tracker operations.",
+             "# TYPE tracker_operation_seconds histogram"]
+
+    with registry.lock:
+        for operation, histogram in sorted(registry.operations.items()):
+            prometheus_histogram(lines, "tracker_operation_seconds", f'operation="{prometheus_label(operation)}"', histogram)
+
+        lines += ["# HELP tracker_sql_statement_seconds Latency of SQL statements, including fetching their rows.",
+                  "# TYPE tracker_sql_statement_seconds histogram"]
+        rows = []
+        for (operation, statement), histogram in sorted(registry.statements.items()):
+            labels = f'operation="{prometheus_label(operation)}",statement="{prometheus_label(statement)}"'
+            prometheus_histogram(lines, "tracker_sql_statement_seconds", labels, histogram)
+            rows.append(f"tracker_sql_rows_total{{{labels}}} {histogram.rows}")
+
+    lines += ["# HELP tracker_sql_rows_total Rows returned or changed by SQL statements.",
+              "# TYPE tracker_sql_rows_total counter"] + rows
+
+    return "\n".join(lines) + "\n"
+
+
+def write_report(report_file):
+    """ Writes the report to a file: Prometheus text for '.prom' files, otherwise JSON. """
+
+    with open(report_file, "w") as output:
+        if report_file.endswith(".prom"):
+            output.write(report_prometheus())
+        else:
+            json.dump(report_json(), output, indent=2, allow_nan=False)
+
+
+def print_report(limit=10):
+    """ Prints the operations and the slowest statements by total time. """
+
+    report = report_json()
+
+    print(f"{'OPERATION':<22} {'CALLS':>7} {'TOTAL (MS)':>11} {'P50 (MS)':>9} {'P99 (MS)':>9}")
+    for operation, figures in sorted(report["operations"].items(), key=lambda item: -item[1]["sum_seconds"]):
+        print(f"{operation:<22} {figures['count']:>7} {figures['sum_seconds'] * 1000:>11.2f} "
+              f"{figures['p50_seconds'] * 1000:>9.2f} {figures['p99_seconds'] * 1000:>9.2f}")
+
+    print(f"\n{'OPERATION':<22} {'CALLS':>7} {'TOTAL (MS)':>11} {'ROWS':>9}  STATEMENT")
+    for entry in report["statements"][:limit]:
+        print(f"{entry['operation']:<22} {entry['count']:>7} {entry['sum_seconds'] * 1000:>11.2f} "
+              f"{entry['rows']:>9}  {entry['statement'][:70]}")
+
+
+# Switched on from the environment when the module is first imported
+if os.environ.get("TRACKER_METRICS") == "1":
+    enable(os.environ.get("TRACKER_METRICS_FILE"))
+
+
+##############################################################################################################
+# END OF CODE
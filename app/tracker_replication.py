@@ -0,0 +1,397 @@
+# TRACKER REPLICATION
+""" Incremental replication of a tracker database to a standby, for reporting and disaster recovery.
+
+The change journal (see CHANGE JOURNAL in tracker_app) already records every change in commit
+order, keyed by a transaction id that only grows, so it doubles as the change-capture table.
+replicate() ships the journal transactions after the sink's position in batches of at most
+'batch_size' transactions. Each batch is applied together with the new position in one
+transaction, so an interrupted run resumes where the last batch ended. Only the journaled source
+rows travel: the standby's own triggers rebuild actuals, monthly periods, rollups, the search
+index and alerts.
+
+A sink is first seeded with a full copy made with SQLite's backup API, which never blocks the
+writers of a WAL database. Later syncs only ship changes, unless the standby has fallen behind
+journal compaction or the source loaded a snapshot, in which case it is seeded again. Changes
+made with journaling switched off (TRACKER_JOURNAL=0) are not replicated.
+
+Sinks:
+    StandbySink     A standby tracker database file, usable with Tracker for reporting.
+    JsonLinesSink   Appends each transaction as one JSON line, the messages a remote consumer
+                    would receive, after a base copy of the database.
+
+Usage:
+    python tracker_replication.py sync <standby_db> [--db tracker_db] [--batch 500] [--sink standby|jsonl]
+    python tracker_replication.py watch <standby_db> [--interval 5]
+    python tracker_replication.py status <standby_db>
+    python tracker_replication.py compare <standby_db>
+"""
+
+##############################################################################################################
+# IMPORT LIBRARIES
+
+import abc
+import argparse
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+from tracker_app import (Tracker, apply_change, begin_write, create_connection, db_file, migrate_database,
+                         open_period, timestamp_format)
+
+
+##############################################################################################################
+# CHANGE FEED
+
+# Journal transactions shipped per batch (TRACKER_REPLICATION_BATCH).
+replication_batch = int(os.environ.get("TRACKER_REPLICATION_BATCH") or 500)
+
+# Source rows compared by compare(), per table. Derived tables follow from these.
+compared_tables = {"expenses": "id, category, actual, budget, parent_id",
+                   "incomes": "id, category, actual, budget, parent_id",
+                   "expenses_ledger": "id, category_id, date, amount, description",
+                   "incomes_ledger": "id, category_id, date, amount, description",
+                   "expenses_periods": "period, category_id, actual, budget",
+                   "incomes_periods": "period, category_id, actual, budget"}
+
+
+class ResyncNeeded(Exception):
+    """ Raised when the journal cannot bring a sink up to date and it has to be seeded again. """
+
+
+def source_name(tracker):
+    """ Identifies a source database by its absolute path. """
+
+    return os.path.abspath(tracker.db_file)
+
+
+def read_batch(tracker, position, batch_size=replication_batch):
+    """ Reads the journal transactions after a position, in one statement so the batch is consistent.
+    :param Tracker tracker: Source tracker
+    :param int position: Id of the last journal transaction the sink has
+    :param int batch_size: Most transactions read
+    :raises ResyncNeeded: Raised when compaction dropped transactions the sink has not had, or the
+                          source loaded a snapshot
+    :returns: List of transactions: dictionaries of txn_id, at, kind and changes. An import's
+              'insert_range' is shipped as the 'insert' of the rows in its id range.
+    """
+
+    # Transaction ids are consecutive until compaction drops some, so a batch is an id range
+    tracker.cursor.execute('''SELECT t.id, t.at, t.kind, j.table_name, j.action, j.before, j.after
+                              FROM journal_txns t LEFT JOIN journal j ON j.txn_id = t.id
+                              WHERE t.id > ? AND t.id <= ? ORDER BY t.id, j.id''', (position, position + batch_size))
+    batch = []
+
+    for txn_id, at, kind, table_name, action, before, after in tracker.cursor.fetchall():
+        if not batch or batch[-1]["txn_id"] != txn_id:
+            if txn_id != (batch[-1]["txn_id"] if batch else position) + 1:
+                raise ResyncNeeded(f"Journal transactions after {position} were compacted away.")
+            if kind == "snapshot":
+                raise ResyncNeeded(f"The source loaded a snapshot at {at[:19]}.")
+            batch.append({"txn_id": txn_id, "at": at, "kind": kind, "changes": []})
+        if action == "insert_range":
+            id_range = json.loads(after)
+            batch[-1]["changes"].append((table_name, "insert", None,
+                                         tracker.range_rows(table_name, txn_id, id_range["first_id"], id_range["last_id"])))
+        elif table_name is not None:
+            batch[-1]["changes"].append((table_name, action, json.loads(before) if before else None,
+                                         json.loads(after) if after else None))
+
+    if not batch:
+        tracker.cursor.execute("SELECT coalesce(max(id), 0) FROM journal_txns")
+        if tracker.cursor.fetchone()[0] > position:
+            raise ResyncNeeded(f"Journal transactions after {position} were compacted away.")
+
+    return batch
+
+
+def copy_database(tracker, target_db):
+    """ Copies the source database into another connection with the backup API.
+    :returns: Id of the newest journal transaction in the copy, its replication position
+    """
+
+    if tracker.in_memory:
+        with tracker.memory_lock:
+            tracker.db.backup(target_db)
+    else:
+        tracker.db.backup(target_db)
+
+    return target_db.execute("SELECT coalesce(max(id), 0) FROM journal_txns").fetchone()[0]
+
+
+##############################################################################################################
+# SINKS
+
+class ReplicationSink(abc.ABC):
+    """ Where replicated changes go. position() says how far the sink is, reset() seeds it with a
+    full copy and apply() adds a batch and its new position atomically. A sink missing any of
+    them cannot be created.
+    """
+
+    @abc.abstractmethod
+    def position(self, source):
+        """ Returns the id of the last journal transaction the sink has from 'source', or None
+        when it has nothing from that source yet. """
+
+    @abc.abstractmethod
+    def reset(self, tracker):
+        """ Seeds the sink with a full copy of the source and returns the copy's position. """
+
+    @abc.abstractmethod
+    def apply(self, source, batch):
+        """ Adds a batch of journal transactions and moves the position to the last of them. """
+
+    def close(self):
+        pass
+
+
+class StandbySink(ReplicationSink):
+    """ Applies changes to a standby tracker database. The position is kept in the standby's
+    'replication_state' table, written in the same transaction as each batch. The standby uses
+    WAL journaling so reports can read it while batches are applied.
+    :param str path: Path to the standby database file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.db, self.cursor = create_connection(path, concurrent=True)
+        migrate_database(self.db, self.cursor)
+        self.cursor.execute('''CREATE TABLE IF NOT EXISTS replication_state(source TEXT PRIMARY KEY, txn_id INTEGER NOT NULL,
+                               synced_at TEXT NOT NULL)''')
+
+    def position(self, source):
+        self.cursor.execute("SELECT txn_id FROM replication_state WHERE source = ?", (source,))
+        row = self.cursor.fetchone()
+        return row[0] if row else None
+
+    def reset(self, tracker):
+        position = copy_database(tracker, self.db)
+
+        # The copy brings the source's journal; the standby starts its own from the position
+        migrate_database(self.db, self.cursor)
+        begin_write(self.db, self.cursor)
+        try:
+            for table_name in ("journal", "journal_txns", "journal_snapshots"):
+                self.cursor.execute(f"DELETE FROM {table_name}")
+            self.cursor.execute('''CREATE TABLE IF NOT EXISTS replication_state(source TEXT PRIMARY KEY, txn_id INTEGER NOT NULL,
+                                   synced_at TEXT NOT NULL)''')
+            self.cursor.execute("DELETE FROM replication_state")
+            self.save_position(source_name(tracker), position)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
+        return position
+
+    def apply(self, source, batch):
+        begin_write(self.db, self.cursor)
+        try:
+            for txn in batch:
+                if txn["kind"] == "compacted":
+                    continue
+                # The source opened the month of each change before making it
+                open_period(self.cursor, txn["at"][:7])
+                for table_name, action, before, after in txn["changes"]:
+                    apply_change(self.cursor, table_name, action, before, after)
+            self.save_position(source, batch[-1]["txn_id"])
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
+    def save_position(self, source, txn_id):
+        self.cursor.execute('''INSERT INTO replication_state(source, txn_id, synced_at) VALUES(?,?,?)
+                               ON CONFLICT(source) DO UPDATE SET txn_id = excluded.txn_id, synced_at = excluded.synced_at''',
+                            (source, txn_id, datetime.now().strftime(timestamp_format)))
+
+    def close(self):
+        self.db.close()
+
+
+class JsonLinesSink(ReplicationSink):
+    """ Appends each journal transaction to a JSON Lines file, as a remote consumer would receive
+    them. reset() writes a base copy of the database to '<path>.base.db' and starts the file with
+    a 'base' line. The position is kept in '<path>.position', replaced atomically after each
+    batch. A crash between the two can repeat a batch, so consumers skip transaction ids they
+    have seen.
+    :param str path: Path to the JSON Lines file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.position_file = f"{path}.position"
+
+    def position(self, source):
+        try:
+            with open(self.position_file, encoding="utf-8") as position_file:
+                state = json.load(position_file)
+        except FileNotFoundError:
+            return None
+
+        return state["txn_id"] if state["source"] == source else None
+
+    def reset(self, tracker):
+        base_path = f"{self.path}.base.db"
+        if os.path.exists(base_path):
+            os.remove(base_path)
+
+        base_db = sqlite3.connect(base_path)
+        try:
+            position = copy_database(tracker, base_db)
+        finally:
+            base_db.close()
+
+        with open(self.path, "w", encoding="utf-8") as output:
+            output.write(json.dumps({"type": "base", "path": base_path, "txn_id": position}) + "\n")
+        self.save_position(source_name(tracker), position)
+        return position
+
+    def apply(self, source, batch):
+        with open(self.path, "a", encoding="utf-8") as output:
+            for txn in batch:
+                output.write(json.dumps({"type": "txn", "txn_id": txn["txn_id"], "at": txn["at"], "kind": txn["kind"],
+                                         "changes": [{"table": table_name, "action": action, "before": before, "after": after}
+                                                     for table_name, action, before, after in txn["changes"]]}) + "\n")
+            output.flush()
+            os.fsync(output.fileno())
+
+        self.save_position(source, batch[-1]["txn_id"])
+
+    def save_position(self, source, txn_id):
+        with open(f"{self.position_file}.tmp", "w", encoding="utf-8") as position_file:
+            json.dump({"source": source, "txn_id": txn_id}, position_file)
+        os.replace(f"{self.position_file}.tmp", self.position_file)
+
+
+##############################################################################################################
+# REPLICATION
+
+def replicate(tracker, sink, batch_size=replication_batch, max_batches=None):
+    """ Brings a sink up to date with the source, one bounded batch at a time. A sink with nothing
+    from this source, or one the journal can no longer bring up to date, is seeded with a full copy first.
+    :param Tracker tracker: Source tracker
+    :param ReplicationSink sink: Where the changes go
+    :param int batch_size: Most journal transactions per batch
+    :param int max_batches: Stop after this many batches, None to catch up completely
+    :returns: Dictionary with the number of transactions and batches shipped, whether the sink
+              was seeded, and the final position
+    """
+
+    source = source_name(tracker)
+    position = sink.position(source)
+    result = {"transactions": 0, "batches": 0, "seeded": False}
+
+    if position is None:
+        position = sink.reset(tracker)
+        result["seeded"] = True
+
+    while max_batches is None or result["batches"] < max_batches:
+        try:
+            batch = read_batch(tracker, position, batch_size)
+        except ResyncNeeded:
+            position = sink.reset(tracker)
+            result["seeded"] = True
+            continue
+
+        if not batch:
+            break
+
+        sink.apply(source, batch)
+        position = batch[-1]["txn_id"]
+        result["transactions"] += len(batch)
+        result["batches"] += 1
+
+    result["position"] = position
+    return result
+
+
+def compare(source_path, standby_path):
+    """ Compares the source rows of two tracker databases table by table.
+    :returns: List of the tables whose rows differ
+    """
+
+    connection = sqlite3.connect(":memory:")
+    try:
+        connection.execute("ATTACH DATABASE ? AS source", (source_path,))
+        connection.execute("ATTACH DATABASE ? AS standby", (standby_path,))
+        differing = []
+
+        for table_name, columns in compared_tables.items():
+            # EXCEPT binds left to right, so each direction is its own subquery
+            query = (f"SELECT (SELECT count(*) FROM (SELECT {columns} FROM source.{table_name} EXCEPT SELECT {columns} FROM standby.{table_name}))"
+                     f" + (SELECT count(*) FROM (SELECT {columns} FROM standby.{table_name} EXCEPT SELECT {columns} FROM source.{table_name}))")
+            if connection.execute(query).fetchone()[0]:
+                differing.append(table_name)
+    finally:
+        connection.close()
+
+    return differing
+
+
+def make_sink(kind, path):
+    """ Creates a sink by name: 'standby' (a database file) or 'jsonl'.
+    :raises ValueError: Raised for an unknown sink
+    """
+
+    if kind == "standby":
+        return StandbySink(path)
+    if kind == "jsonl":
+        return JsonLinesSink(path)
+    raise ValueError(f"Unknown sink {kind}. Choose from: standby, jsonl.")
+
+
+##############################################################################################################
+# MAIN
+
+def main(argv=None):
+    """ Syncs, watches, reports on and checks a standby from the command line. """
+
+    parser = argparse.ArgumentParser(description="Incremental replication of the budget tracker database.")
+    parser.add_argument("command", choices=["sync", "watch", "status", "compare"])
+    parser.add_argument("standby", help="Standby database file (or JSON Lines file for --sink jsonl)")
+    parser.add_argument("--db", default=db_file, help="Source database file (default: the app's tracker_db)")
+    parser.add_argument("--sink", default="standby", choices=["standby", "jsonl"], help="Kind of standby")
+    parser.add_argument("--batch", type=int, default=replication_batch, help="Journal transactions per batch")
+    parser.add_argument("--interval", type=float, default=5, help="Seconds between syncs (watch)")
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        differing = compare(args.db, args.standby)
+        print(f"Tables that differ: {', '.join(differing)}" if differing else "The standby matches the source.")
+        return 1 if differing else 0
+
+    with Tracker(args.db) as tracker:
+        sink = make_sink(args.sink, args.standby)
+        try:
+            if args.command == "status":
+                tracker.cursor.execute("SELECT coalesce(max(id), 0) FROM journal_txns")
+                latest = tracker.cursor.fetchone()[0]
+                position = sink.position(source_name(tracker))
+                print("The standby has not been seeded." if position is None else
+                      f"Standby position {position}, source at {latest} ({latest - position} transactions behind).")
+                return 0
+
+            while True:
+                start_time = time.perf_counter()
+                result = replicate(tracker, sink, args.batch)
+                print(f"{'Seeded the standby and shipped' if result['seeded'] else 'Shipped'} {result['transactions']} "
+                      f"transactions in {result['batches']} batches ({time.perf_counter() - start_time:.2f}s), "
+                      f"position {result['position']}.")
+                if args.command == "sync":
+                    return 0
+                time.sleep(args.interval)
+
+        except KeyboardInterrupt:
+            return 0
+        finally:
+            sink.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
+
+
+##############################################################################################################
+# END OF CODE
@@ -0,0 +1,520 @@
+# TRACKER SERVER
+""" JSON HTTP service over the tracker database, so dashboards and other services can read and
+update budget state without the terminal menu. Built on asyncio from the standard library.
+
+SQLite calls are blocking, so they run on a bounded thread pool. Each thread borrows a Tracker
+(one open connection each) from a fixed-size pool and gives it back afterwards, so requests
+never open the database themselves.
+
+Endpoints (table is 'expenses' or 'incomes'):
+    GET  /summary                       budget_summary figures
+    GET  /summary?period=2024-03        figures for a month, range (2024-01:2024-06), year or 'ytd',
+                                        with the same months a year earlier under "previous"
+    GET  /tables/<table>                view_tables rows and totals
+    GET  /tables/<table>/search?q=fue   ranked category names matching 'fue', with typos (&limit=10)
+    GET  /metrics                       query metrics in Prometheus text format (TRACKER_METRICS=1)
+    GET  /alerts?after=0                budget alerts raised after alert id 'after' (&limit=100)
+    POST /alerts/acknowledge            {"up_to": 42}                           acknowledge_alerts
+    POST /tables/<table>/categories     {"category": "Fuel"}                    add_category
+    POST /tables/<table>/actual         {"category": "Fuel", "amount": 850}     update_actual
+    POST /tables/<table>/goal           {"category": "Fuel", "target": 900}     update_goal
+
+Usage:
+    python tracker_server.py serve [--host 127.0.0.1] [--port 8080] [--db tracker_db] [--pool 4]
+    python tracker_server.py loadtest [--requests 2000] [--concurrency 1,8,32,128]
+"""
+
+##############################################################################################################
+# IMPORT LIBRARIES
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import queue
+import shutil
+import sqlite3
+import tempfile
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import tracker_metrics
+from tracker_app import Money, Tracker, db_file, period_range, search_limit
+
+
+##############################################################################################################
+# CONNECTION POOL
+
+# Tables the endpoints accept. Table names end up in SQL, so nothing else may get through.
+table_names = ("expenses", "incomes")
+
+# Largest request body accepted, in bytes.
+max_body_size = 64 * 1024
+
+# Largest amount or target accepted, in rands. Larger values cannot be kept exact to the cent.
+max_amount = 10 ** 13
+
+# Seconds between checks whether the change journal is due for compaction (TRACKER_COMPACT_SECONDS, 0 for never).
+compact_seconds = float(os.environ.get("TRACKER_COMPACT_SECONDS") or 60)
+
+
+class TrackerPool:
+    """ Fixed-size pool of Tracker connections with a thread pool of the same size to use them.
+    Trackers are created up front and reused, and a thread only ever holds one at a time.
+    :param str db_file: Path to the database file
+    :param int size: Number of connections and worker threads
+    """
+
+    def __init__(self, db_file, size=4):
+        self.size = size
+        self.executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="tracker")
+        self.trackers = queue.Queue()
+
+        for _ in range(size):
+            # WAL mode lets the pooled connections read while one of them writes
+            tracker = Tracker(db_file, concurrent=True, check_same_thread=False)
+            tracker.connect()
+            self.trackers.put(tracker)
+
+    def call(self, operation, *args):
+        """ Runs operation(tracker, *args) with a borrowed tracker. Runs on a pool thread. """
+
+        tracker = self.trackers.get()
+        try:
+            return operation(tracker, *args)
+        finally:
+            self.trackers.put(tracker)
+
+    async def run(self, operation, *args):
+        """ Runs operation(tracker, *args) on the thread pool without blocking the event loop.
+        :returns: Whatever the operation returns
+        """
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.call, operation, *args)
+
+    def close(self):
+        """ Waits for running operations and closes every connection. """
+
+        self.executor.shutdown(wait=True)
+        while not self.trackers.empty():
+            self.trackers.get().close()
+
+
+##############################################################################################################
+# ENDPOINTS
+
+class HttpError(Exception):
+    """ Error turned into a JSON error response with the given HTTP status. """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def read_table(tracker, table_name):
+    """ Rows and totals of a table, as shown by view_tables. """
+
+    actual_total, budget_total = tracker.get_totals((table_name,))[table_name]
+    rows = [{"id": category_id, "category": category, "actual": actual, "budget": budget}
+            for category_id, category, actual, budget in tracker.get_rows(table_name)]
+
+    return {"table": table_name, "rows": rows, "total_actual": actual_total, "total_budget": budget_total}
+
+
+def required(body, field, kind):
+    """ Reads a required field from a JSON request body.
+    :raises HttpError: 400 when the field is missing or has the wrong type
+    :returns: The field value
+    """
+
+    value = body.get(field)
+    if isinstance(value, bool) or not isinstance(value, kind):
+        raise HttpError(HTTPStatus.BAD_REQUEST, f"'{field}' is required.")
+
+    return value
+
+
+def required_amount(body, field):
+    """ Reads a required amount of money from a JSON request body. JSON allows NaN and Infinity,
+    which would otherwise reach the database.
+    :raises HttpError: 400 when the field is missing, not a finite number or larger than max_amount
+    :returns: The amount
+    """
+
+    value = required(body, field, (int, float))
+    if not math.isfinite(value) or abs(value) > max_amount:
+        raise HttpError(HTTPStatus.BAD_REQUEST, f"'{field}' must be a finite amount of at most {max_amount} rands.")
+
+    return value
+
+
+async def route(pool, method, target, body):
+    """ Runs the operation for a request.
+    :param TrackerPool pool: Connection pool used for database calls
+    :param str method: HTTP method
+    :param str target: Request path, with optional query string
+    :param dict body: Parsed JSON body for POST requests
+    :raises HttpError: Raised for unknown routes, tables or categories and invalid bodies
+    :returns: HTTP status and JSON-serialisable response
+    """
+
+    url = urlsplit(target)
+    path, query = url.path, parse_qs(url.query)
+    parts = [part for part in path.split("/") if part]
+
+    if method == "GET" and parts == ["summary"]:
+        if "period" not in query:
+            return HTTPStatus.OK, await pool.run(Tracker.get_summary)
+        try:
+            start_period, end_period = period_range(query["period"][0])
+        except ValueError as error_msg:
+            raise HttpError(HTTPStatus.BAD_REQUEST, str(error_msg))
+        return HTTPStatus.OK, await pool.run(Tracker.compare_years, start_period, end_period)
+
+    if method == "GET" and parts == ["metrics"]:
+        if not tracker_metrics.registry.enabled:
+            raise HttpError(HTTPStatus.NOT_FOUND, "Query metrics are switched off (TRACKER_METRICS=1).")
+        return HTTPStatus.OK, tracker_metrics.report_prometheus()
+
+    if method == "GET" and parts == ["alerts"]:
+        try:
+            after = int(query.get("after", [0])[0])
+            limit = int(query.get("limit", [100])[0])
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "after and limit must be whole numbers.")
+        return HTTPStatus.OK, {"alerts": await pool.run(Tracker.get_alerts, after, max(1, min(limit, 1000)))}
+
+    if method == "POST" and parts == ["alerts", "acknowledge"]:
+        deleted = await pool.run(Tracker.acknowledge_alerts, required(body, "up_to", int))
+        return HTTPStatus.OK, {"acknowledged": deleted}
+
+    if len(parts) < 2 or parts[0] != "tables":
+        raise HttpError(HTTPStatus.NOT_FOUND, f"No endpoint at {path}.")
+
+    table_name = parts[1]
+    if table_name not in table_names:
+        raise HttpError(HTTPStatus.NOT_FOUND, f"Unknown table {table_name}.")
+
+    if method == "GET" and len(parts) == 2:
+        return HTTPStatus.OK, await pool.run(read_table, table_name)
+
+    if method == "GET" and parts[2:] == ["search"]:
+        text = query.get("q", [""])[0]
+        try:
+            limit = int(query.get("limit", [search_limit])[0])
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "limit must be a whole number.")
+        matches = await pool.run(Tracker.search_categories, table_name, text, max(1, min(limit, 100)))
+        return HTTPStatus.OK, {"query": text, "matches": matches}
+
+    if method == "POST" and len(parts) == 3 and parts[2] in ("categories", "actual", "goal"):
+        category = required(body, "category", str)
+
+        if parts[2] == "categories":
+            category_id = await pool.run(Tracker.add_category, table_name, category)
+            return HTTPStatus.CREATED, {"id": category_id, "category": category}
+
+        if parts[2] == "actual":
+            amount = required_amount(body, "amount")
+            adjustment = await pool.run(Tracker.update_actual, table_name, category, amount)
+            return HTTPStatus.OK, {"category": category, "actual": Money.parse(amount), "adjustment": adjustment}
+
+        if parts[2] == "goal":
+            target = required_amount(body, "target")
+            budget = await pool.run(Tracker.update_goal, table_name, category, target)
+            return HTTPStatus.OK, {"category": category, "budget": budget}
+
+    raise HttpError(HTTPStatus.NOT_FOUND, f"No endpoint for {method} {path}.")
+
+
+##############################################################################################################
+# HTTP SERVER
+
+async def read_request(reader):
+    """ Reads one HTTP/1.1 request from a client connection.
+    :returns: (method, target, headers, body bytes), or None when the client closed the connection
+    """
+
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+
+    try:
+        method, target, version = request_line.decode("latin-1").split()
+    except ValueError:
+        raise HttpError(HTTPStatus.BAD_REQUEST, "Malformed request line.")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length", 0) or 0)
+    except ValueError:
+        raise HttpError(HTTPStatus.BAD_REQUEST, "Content-Length must be a whole number.")
+    if length < 0:
+        raise HttpError(HTTPStatus.BAD_REQUEST, "Content-Length cannot be negative.")
+    if length > max_body_size:
+        raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large.")
+    body = await reader.readexactly(length) if length else b""
+
+    return method.upper(), target, headers, body
+
+
+def json_default(value):
+    """ Writes Money as a JSON number of rands. """
+
+    if isinstance(value, Money):
+        return float(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def build_response(status, payload, keep_alive):
+    """ Serialises a JSON response, or a plain text one when the payload is a string. """
+
+    if isinstance(payload, str):
+        body, content_type = payload.encode(), "text/plain; version=0.0.4"
+    else:
+        body, content_type = json.dumps(payload, default=json_default).encode(), "application/json"
+    head = (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+
+    return head.encode("latin-1") + body
+
+
+async def handle_client(pool, reader, writer):
+    """ Serves requests on one client connection until it closes (HTTP/1.1 keep-alive). """
+
+    try:
+        while True:
+            # A request that could not be read leaves the stream out of step, so its error closes the connection
+            keep_alive = False
+            try:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, raw_body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+
+                try:
+                    body = json.loads(raw_body) if raw_body else {}
+                except ValueError:
+                    raise HttpError(HTTPStatus.BAD_REQUEST, "Body is not valid JSON.")
+                if not isinstance(body, dict):
+                    raise HttpError(HTTPStatus.BAD_REQUEST, "Body must be a JSON object.")
+
+                status, payload = await route(pool, method, target, body)
+
+            except HttpError as error_msg:
+                status, payload = error_msg.status, {"error": str(error_msg)}
+            except LookupError as error_msg:
+                status, payload = HTTPStatus.NOT_FOUND, {"error": str(error_msg)}
+            except sqlite3.IntegrityError:
+                status, payload = HTTPStatus.CONFLICT, {"error": "That category already exists."}
+            except asyncio.IncompleteReadError:
+                break
+            except Exception:
+                # Details stay in the server's output, clients only learn that the request failed
+                traceback.print_exc()
+                status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Internal server error."}
+
+            writer.write(build_response(status, payload, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def start_server(pool, host="127.0.0.1", port=8080):
+    """ Starts listening. Port 0 picks a free port.
+    :returns: asyncio Server; server.sockets[0].getsockname() holds the address
+    """
+
+    # A deep listen backlog stops bursts of new clients waiting on SYN retries
+    return await asyncio.start_server(lambda reader, writer: handle_client(pool, reader, writer), host, port,
+                                      backlog=1024)
+
+
+async def compact_journal(pool, interval=compact_seconds):
+    """ Compacts the change journal in the background when it is due, so the database copy it
+    takes never holds up a request's write.
+    """
+
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            dropped = await pool.run(Tracker.compact_if_due)
+            if dropped is not None:
+                print(f"Compacted the change journal, dropping {dropped} transactions.")
+        except (OSError, sqlite3.Error) as error_msg:
+            print(f"Unable to compact the change journal. {error_msg}")
+
+
+async def serve(db_path, host, port, pool_size):
+    """ Runs the service until interrupted. """
+
+    pool = TrackerPool(db_path, pool_size)
+    server = await start_server(pool, host, port)
+    print(f"Serving {db_path} on http://{host}:{server.sockets[0].getsockname()[1]} with {pool_size} connections.")
+    compaction = asyncio.create_task(compact_journal(pool)) if compact_seconds else None
+
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if compaction:
+            compaction.cancel()
+        pool.close()
+
+
+##############################################################################################################
+# LOAD TEST
+
+def percentile(sorted_values, fraction):
+    """ Nearest-rank percentile of an already sorted list. """
+
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def load_client(host, port, requests, latencies, client_id):
+    """ Sends requests over one keep-alive connection, in a mix of reads and writes:
+    summary and table views, with every fourth request updating an actual.
+    :param list latencies: Seconds per request, appended to
+    """
+
+    reader, writer = await asyncio.open_connection(host, port)
+
+    try:
+        for number in range(requests):
+            if number % 4 == 3:
+                body = json.dumps({"category": "Load test", "amount": (client_id * 1000 + number) / 100}).encode()
+                request = (f"POST /tables/expenses/actual HTTP/1.1\r\nHost: {host}\r\n"
+                           f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n").encode() + body
+            else:
+                path = "/summary" if number % 2 == 0 else "/tables/incomes"
+                request = f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode()
+
+            start_time = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+
+            status_line = await reader.readline()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start_time)
+
+            if not status_line.startswith(b"HTTP/1.1 2"):
+                raise RuntimeError(f"Load test request failed: {status_line.decode().strip()}")
+
+    finally:
+        writer.close()
+
+
+async def load_test(source_db, total_requests, concurrency_levels, pool_size):
+    """ Starts the service on loopback against a copy of the database and measures latency and
+    throughput at several client concurrency levels.
+    :param str source_db: Database to copy for the test, so the real one is not changed
+    :param int total_requests: Requests sent at each concurrency level
+    :param list concurrency_levels: Numbers of simultaneous client connections to test
+    :returns: List of result dictionaries, one per concurrency level
+    """
+
+    results = []
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        test_db = os.path.join(temp_dir, "tracker_db")
+        if os.path.exists(source_db):
+            shutil.copyfile(source_db, test_db)
+
+        pool = TrackerPool(test_db, pool_size)
+        await pool.run(lambda tracker: tracker.category_exists("expenses", "Load test")
+                       or tracker.add_category("expenses", "Load test"))
+        server = await start_server(pool, "127.0.0.1", 0)
+        host, port = server.sockets[0].getsockname()[:2]
+
+        try:
+            for concurrency in concurrency_levels:
+                latencies = []
+                per_client = max(1, total_requests // concurrency)
+                start_time = time.perf_counter()
+                await asyncio.gather(*(load_client(host, port, per_client, latencies, client_id)
+                                       for client_id in range(concurrency)))
+                elapsed = time.perf_counter() - start_time
+
+                latencies.sort()
+                results.append({"concurrency": concurrency, "requests": len(latencies),
+                                "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+                                "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+                                "requests_per_sec": round(len(latencies) / elapsed, 1)})
+        finally:
+            server.close()
+            await server.wait_closed()
+            pool.close()
+
+    return results
+
+
+##############################################################################################################
+# MAIN
+
+def main(argv=None):
+    """ Runs the service or the load test from the command line. """
+
+    parser = argparse.ArgumentParser(description="JSON HTTP service for the budget tracker.")
+    parser.add_argument("command", choices=["serve", "loadtest"])
+    parser.add_argument("--db", default=db_file, help="Database file (default: the app's tracker_db)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--pool", type=int, default=4, help="Number of pooled connections and worker threads")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per concurrency level (loadtest)")
+    parser.add_argument("--concurrency", default="1,8,32,128", help="Comma-separated client counts (loadtest)")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        try:
+            asyncio.run(serve(args.db, args.host, args.port, args.pool))
+        except KeyboardInterrupt:
+            print("Server stopped.")
+        return 0
+
+    levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+    results = asyncio.run(load_test(args.db, args.requests, levels, args.pool))
+
+    print(f"{'CONCURRENCY':>12} {'REQUESTS':>9} {'P50 (MS)':>9} {'P99 (MS)':>9} {'REQ/SEC':>9}")
+    for result in results:
+        print(f"{result['concurrency']:>12} {result['requests']:>9} {result['p50_ms']:>9.2f} "
+              f"{result['p99_ms']:>9.2f} {result['requests_per_sec']:>9.1f}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
+
+
+##############################################################################################################
+# END OF CODE
@@ -0,0 +1,322 @@
+# TRACKER TENANTS
+""" Multi-tenant mode: one SQLite database file per tenant (a household or business unit), kept
+in a tenants directory, with a router that hands out a Tracker per tenant and a consolidated
+summary across every tenant's database.
+
+The consolidated summary reads each shard's totals either by ATTACHing a batch of shard files to
+one connection (cheap for a handful of tenants), or by fanning the shards out over a process
+pool so a rollup over hundreds of files uses every core. Totals are integer cents, so adding the
+shards up is exact.
+
+Usage:
+    python tracker_tenants.py list [--dir tenants]
+    python tracker_tenants.py create <tenant>
+    python tracker_tenants.py menu <tenant>
+    python tracker_tenants.py summary [--period ytd] [--method auto|attach|process] [--workers N]
+"""
+
+##############################################################################################################
+# IMPORT LIBRARIES
+
+import argparse
+import os
+import re
+import sqlite3
+import urllib.parse
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import tracker_app
+from tracker_app import Money, Tracker, concurrent_mode, period_range, render_table, summary_figures
+
+
+##############################################################################################################
+# TENANT ROUTER
+
+# Directory holding one database file per tenant. TRACKER_TENANTS_DIR points it elsewhere.
+tenants_dir = os.environ.get("TRACKER_TENANTS_DIR") or os.path.join(os.path.dirname(__file__), "tenants")
+
+# File extension of tenant databases.
+tenant_extension = ".db"
+
+# Tenant names become file names, so only plain names are accepted (no paths or dots at the start).
+tenant_pattern = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+
+
+def check_tenant(tenant):
+    """ Checks a tenant name is safe to use as a file name.
+    :raises ValueError: Raised for names with path separators, leading dots or other characters
+    :returns: The tenant name
+    """
+
+    if not isinstance(tenant, str) or not tenant_pattern.match(tenant):
+        raise ValueError(f"{tenant!r} is not a valid tenant name (letters, digits, '_', '-' and '.').")
+
+    return tenant
+
+
+class TenantRouter:
+    """ Routes each tenant to its own database file and keeps a bounded number of Trackers open.
+    Trackers are reused until 'max_open' tenants have one, then the least recently used is closed.
+    :param str directory: Directory of tenant databases, created when missing
+    :param bool concurrent: Open tenant databases in WAL mode for use by several processes
+    :param int max_open: Most tenant connections kept open at once
+    """
+
+    def __init__(self, directory=None, concurrent=concurrent_mode, max_open=32):
+        self.directory = directory or tenants_dir
+        self.concurrent = concurrent
+        self.max_open = max_open
+        self.open_trackers = OrderedDict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def path(self, tenant):
+        """ Returns the database file of a tenant. """
+
+        return os.path.join(self.directory, check_tenant(tenant) + tenant_extension)
+
+    def exists(self, tenant):
+        return os.path.exists(self.path(tenant))
+
+    def tenants(self):
+        """ Lists the tenants that have a database, sorted by name. """
+
+        if not os.path.isdir(self.directory):
+            return []
+
+        return sorted(name[:-len(tenant_extension)] for name in os.listdir(self.directory)
+                      if name.endswith(tenant_extension) and tenant_pattern.match(name[:-len(tenant_extension)]))
+
+    def tracker(self, tenant, create=False):
+        """ Returns the (connected) Tracker for a tenant.
+        :param bool create: Create the tenant's database when it does not exist yet
+        :raises LookupError: Raised when the tenant has no database and 'create' is False
+        :returns: Tracker on the tenant's database
+        """
+
+        tracker = self.open_trackers.get(tenant)
+        if tracker is not None:
+            self.open_trackers.move_to_end(tenant)
+            return tracker
+
+        path = self.path(tenant)
+        if not create and not os.path.exists(path):
+            raise LookupError(f"{tenant} is not a tenant.")
+
+        os.makedirs(self.directory, exist_ok=True)
+        tracker = Tracker(path, concurrent=self.concurrent)
+        tracker.connect()
+        self.open_trackers[tenant] = tracker
+
+        while len(self.open_trackers) > self.max_open:
+            self.open_trackers.popitem(last=False)[1].close()
+
+        return tracker
+
+    def create(self, tenant):
+        """ Creates (and migrates) a tenant's database.
+        :raises FileExistsError: Raised when the tenant already exists
+        :returns: Tracker on the new database
+        """
+
+        if self.exists(tenant):
+            raise FileExistsError(f"{tenant} already exists.")
+
+        return self.tracker(tenant, create=True)
+
+    def close(self):
+        """ Closes every open tenant connection. """
+
+        while self.open_trackers:
+            self.open_trackers.popitem()[1].close()
+
+
+##############################################################################################################
+# CONSOLIDATED SUMMARY
+
+# Shards per ATTACH batch. SQLite allows 10 attached databases by default.
+attach_batch_size = 10
+
+
+def totals_query(schemas, start_period=None, end_period=None):
+    """ Builds one UNION ALL query totalling the incomes and expenses of several attached shards.
+    :param list schemas: Schema names of the shards ('main' for a connection's own database)
+    :returns: (SQL, parameters); rows are (position in 'schemas', table name, actual, budget) in cents
+    """
+
+    selects, parameters = [], []
+    for number, schema in enumerate(schemas):
+        for table_name in ("incomes", "expenses"):
+            if start_period:
+                selects.append(f"SELECT {number}, '{table_name}', coalesce(sum(actual), 0), coalesce(sum(budget), 0) "
+                               f"FROM {schema}.{table_name}_periods WHERE period BETWEEN ? AND ?")
+                parameters += [start_period, end_period or start_period]
+            else:
+                selects.append(f"SELECT {number}, '{table_name}', coalesce(sum(actual), 0), coalesce(sum(budget), 0) "
+                               f"FROM {schema}.{table_name}")
+
+    return " UNION ALL ".join(selects), parameters
+
+
+def migrate_shard(db_path, schema_version):
+    """ Runs the pending migrations of a shard whose schema is older than the app's. Opening a
+    Tracker migrates its database, so only shards that need it are opened that way.
+    :param int schema_version: The shard's user_version
+    :returns: True when the shard was migrated
+    """
+
+    if schema_version >= tracker_app.migrations[-1][0]:
+        return False
+
+    with Tracker(db_path) as tracker:
+        tracker.connect()
+    return True
+
+
+def shard_totals(db_path, start_period=None, end_period=None):
+    """ Reads the income and expense totals of one shard. Runs in a worker process, so it opens
+    its own read-only connection and returns plain integers (cents) that are cheap to send back.
+    A shard with pending migrations is migrated first, in the worker.
+    :returns: (income actual, income budget, expense actual, expense budget) in cents
+    """
+
+    connection = sqlite3.connect(f"file:{urllib.parse.quote(os.path.abspath(db_path))}?mode=ro", uri=True)
+    try:
+        migrate_shard(db_path, connection.execute("PRAGMA user_version").fetchone()[0])
+        totals = {table_name: (actual, budget)
+                  for _, table_name, actual, budget in connection.execute(*totals_query(["main"], start_period, end_period))}
+    finally:
+        connection.close()
+
+    return (*totals["incomes"], *totals["expenses"])
+
+
+def attached_totals(db_paths, start_period=None, end_period=None):
+    """ Reads the totals of several shards with one connection, ATTACHing them in batches and
+    totalling each batch in a single UNION ALL query. Shards with pending migrations are migrated
+    once attached.
+    :returns: List of (income actual, income budget, expense actual, expense budget) in cents, in db_paths order
+    """
+
+    results = []
+    connection = sqlite3.connect(":memory:")
+
+    try:
+        for batch_start in range(0, len(db_paths), attach_batch_size):
+            batch = db_paths[batch_start:batch_start + attach_batch_size]
+            for number, db_path in enumerate(batch):
+                connection.execute(f"ATTACH DATABASE ? AS shard{number}", (db_path,))
+                migrate_shard(db_path, connection.execute(f"PRAGMA shard{number}.user_version").fetchone()[0])
+
+            query, parameters = totals_query([f"shard{number}" for number in range(len(batch))], start_period, end_period)
+
+            batch_totals = [{} for db_path in batch]
+            for number, table_name, actual, budget in connection.execute(query, parameters):
+                batch_totals[number][table_name] = (actual, budget)
+            results += [(*totals["incomes"], *totals["expenses"]) for totals in batch_totals]
+
+            for number in range(len(batch)):
+                connection.execute(f"DETACH DATABASE shard{number}")
+    finally:
+        connection.close()
+
+    return results
+
+
+def consolidated_summary(router, tenants=None, start_period=None, end_period=None, method="auto", workers=None):
+    """ Computes budget_summary figures for every tenant and for all tenants together.
+    :param TenantRouter router: Router whose tenants are summarised
+    :param list tenants: Tenants to include, defaults to all
+    :param str method: 'attach' (one connection, batches of attached shards), 'process' (process
+                       pool, one shard per task) or 'auto' (attach for up to one batch, else process)
+    :param int workers: Worker processes for the 'process' method, defaults to the number of cores
+    :raises ValueError: Raised for an unknown method or invalid tenant name
+    :returns: Dictionary with per-tenant summaries under 'tenants' and the consolidated summary under 'total'
+    """
+
+    tenants = router.tenants() if tenants is None else list(tenants)
+    db_paths = [router.path(tenant) for tenant in tenants]
+
+    if method == "auto":
+        method = "attach" if len(db_paths) <= attach_batch_size else "process"
+
+    if method == "attach":
+        shard_results = attached_totals(db_paths, start_period, end_period)
+    elif method == "process":
+        workers = workers or os.cpu_count() or 1
+        chunk_size = max(1, len(db_paths) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            shard_results = list(executor.map(shard_totals, db_paths, [start_period] * len(db_paths),
+                                              [end_period] * len(db_paths), chunksize=chunk_size))
+    else:
+        raise ValueError(f"Unknown method {method}. Choose from: auto, attach, process.")
+
+    summaries = {tenant: summary_figures(*(Money(cents) for cents in totals))
+                 for tenant, totals in zip(tenants, shard_results)}
+    grand_totals = [Money(sum(column)) for column in zip(*shard_results)] or [Money()] * 4
+
+    return {"tenants": summaries, "total": summary_figures(*grand_totals)}
+
+
+def print_consolidated_summary(result):
+    """ Prints the consolidated summary, one row per tenant and a total row. """
+
+    columns = ["total_income", "budget_income", "total_expenses", "budget_expenses", "savings_variance"]
+    table = [[tenant] + [summary[column] for column in columns] for tenant, summary in result["tenants"].items()]
+    table.append(["TOTAL"] + [result["total"][column] for column in columns])
+
+    print(render_table(table, headers=["TENANT", "INCOME", "INCOME TARGET", "EXPENSES", "BUDGET", "SAVINGS VARIANCE"], floatfmt=".2f"))
+
+
+##############################################################################################################
+# MAIN
+
+def main(argv=None):
+    """ Lists, creates and opens tenants, and prints consolidated summaries, from the command line. """
+
+    parser = argparse.ArgumentParser(description="Multi-tenant budget tracker.")
+    parser.add_argument("command", choices=["list", "create", "menu", "summary"])
+    parser.add_argument("tenant", nargs="?", help="Tenant name (create, menu)")
+    parser.add_argument("--dir", default=tenants_dir, help="Directory of tenant databases")
+    parser.add_argument("--period", help="Month, range (YYYY-MM:YYYY-MM), year or 'ytd' (summary)")
+    parser.add_argument("--method", default="auto", choices=["auto", "attach", "process"], help="How shards are read (summary)")
+    parser.add_argument("--workers", type=int, help="Worker processes (summary, process method)")
+    args = parser.parse_args(argv)
+
+    with TenantRouter(args.dir) as router:
+        try:
+            if args.command == "list":
+                print("\n".join(router.tenants()))
+
+            elif args.command == "summary":
+                start_period, end_period = period_range(args.period) if args.period else (None, None)
+                print_consolidated_summary(consolidated_summary(router, None, start_period, end_period, args.method, args.workers))
+
+            elif not args.tenant:
+                parser.error(f"{args.command} needs a tenant name.")
+
+            elif args.command == "create":
+                router.create(args.tenant)
+                print(f"Created tenant {args.tenant}.")
+
+            else:
+                return tracker_app.main([], router.tracker(args.tenant))
+
+        except (ValueError, LookupError, FileExistsError) as error_msg:
+            print(error_msg)
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
+
+
+##############################################################################################################
+# END OF CODE